@@ -0,0 +1,80 @@
+"""
+Coalesced activity tracking for the inactivity logout.
+
+The inactivity middleware used to save the whole user row on every request
+just to move last_activity forward. The exact time of a user's latest
+request now lives in the cache, and the row's last_activity is written, on
+its own, at most once per LAST_ACTIVITY_WRITE_INTERVAL. The stored value can
+therefore trail the real one by up to that interval (and the cache may be
+cold or per process), so a user counts as inactive only once
+INACTIVITY_TIMEOUT plus the interval has passed since the latest time known:
+logouts may come up to one interval late, never early.
+
+Users who simply stop making requests are handled by sweep(), which
+releases the device lock of every inactive user with one UPDATE. The
+middleware runs it at most once per INACTIVITY_SWEEP_INTERVAL, and
+`manage.py sweep_inactive_users` runs it from a scheduler.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import CustomUser
+
+ACTIVITY_CACHE_PREFIX = "accounts:last_activity:"
+SWEEP_CACHE_KEY = "accounts:inactivity_sweep"
+
+
+def cache_key(user_id):
+    return f"{ACTIVITY_CACHE_PREFIX}{user_id}"
+
+
+def inactive_after():
+    """Time since the latest known activity after which a user is inactive."""
+    return settings.INACTIVITY_TIMEOUT + settings.LAST_ACTIVITY_WRITE_INTERVAL
+
+
+def last_seen(user):
+    """The latest of the cached and the stored activity time, or None."""
+    cached = cache.get(cache_key(user.pk))
+    stored = user.last_activity
+    if cached is None or (stored is not None and stored > cached):
+        return stored
+    return cached
+
+
+def is_inactive(user, now=None):
+    seen = last_seen(user)
+    return seen is not None and (now or timezone.now()) - seen > inactive_after()
+
+
+def touch(user, now=None):
+    """
+    Record a request by `user`, writing last_activity to the user row only
+    if the stored value is at least LAST_ACTIVITY_WRITE_INTERVAL old.
+    """
+    now = now or timezone.now()
+    cache.set(cache_key(user.pk), now, inactive_after().total_seconds())
+    if user.last_activity is None or now - user.last_activity >= settings.LAST_ACTIVITY_WRITE_INTERVAL:
+        user.last_activity = now
+        user.save(update_fields=["last_activity"])
+
+
+def forget(user):
+    cache.delete(cache_key(user.pk))
+
+
+def sweep(now=None):
+    """Release the device lock of every inactive user in one UPDATE; returns how many."""
+    now = now or timezone.now()
+    return CustomUser.objects.filter(
+        last_ip_address__isnull=False,
+        last_activity__lt=now - inactive_after(),
+    ).update(last_ip_address=None, last_login_device=None, last_logout_device=now)
+
+
+def sweep_if_due(now=None):
+    """sweep(), unless one already ran within INACTIVITY_SWEEP_INTERVAL."""
+    if cache.add(SWEEP_CACHE_KEY, True, settings.INACTIVITY_SWEEP_INTERVAL.total_seconds()):
+        return sweep(now)
+    return 0
@@ -0,0 +1,184 @@
+"""
+Single-device login registry.
+
+An account may be used from one device, identified by its IP address, at a
+time. The login view used to read the device columns of the user row and
+save the whole row back, so two devices logging in together could both
+pass the check. The holder of each account is now kept in a DeviceStore,
+chosen by the DEVICE_STORE setting, whose compare_and_set() is atomic:
+of two devices claiming a free account at once, exactly one succeeds.
+
+    FileDeviceStore    one record file per user, shared by the worker
+                       processes of a host (the default)
+    MemoryDeviceStore  a dict in this process, for a single process
+
+The request middleware asks holder(), which reads only the store. The user
+row's last_ip_address/last_login_device stay the durable copy: claims and
+releases write them through with update_fields, and a store that has no
+record for a user (after a restart, or a new host) falls back to the row
+that AuthenticationMiddleware has already loaded. A holder whose user has
+gone inactive gives way to the next claim, so the bulk release of
+accounts.activity.sweep() needs no change to the store.
+"""
+import fcntl
+import json
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import activity
+
+# The device holding an account: its IP address and the login time as a timestamp
+Device = namedtuple("Device", ["ip", "since"])
+
+# Returned by DeviceStore.get() for a user it has no record of
+MISSING = object()
+
+DEVICE_FIELDS = ["last_ip_address", "last_login_device", "last_logout_device", "last_activity"]
+
+
+class MemoryDeviceStore:
+    """Holders in a dict of this process."""
+
+    def __init__(self, location=None):
+        self.devices = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        return self.devices.get(user_id, MISSING)
+
+    def compare_and_set(self, user_id, expected, device):
+        """Record `device` (None: no holder) if the record is still `expected`."""
+        with self.lock:
+            if self.get(user_id) != expected:
+                return False
+            self.devices[user_id] = device
+            return True
+
+    def set(self, user_id, device):
+        with self.lock:
+            self.devices[user_id] = device
+
+
+class FileDeviceStore:
+    """
+    One JSON record per user in the `location` directory. compare_and_set()
+    holds an exclusive flock() on the user's lock file while it reads and
+    replaces the record, so it is atomic across processes and threads.
+    """
+
+    def __init__(self, location):
+        self.location = location
+        os.makedirs(location, exist_ok=True)
+
+    def path(self, user_id):
+        return os.path.join(self.location, f"{user_id}.json")
+
+    def get(self, user_id):
+        try:
+            with open(self.path(user_id)) as file:
+                record = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return MISSING
+        return Device(*record) if record else None
+
+    def compare_and_set(self, user_id, expected, device):
+        """Record `device` (None: no holder) if the record is still `expected`."""
+        with self.locked(user_id):
+            if self.get(user_id) != expected:
+                return False
+            self.write(user_id, device)
+            return True
+
+    def set(self, user_id, device):
+        with self.locked(user_id):
+            self.write(user_id, device)
+
+    def write(self, user_id, device):
+        path = self.path(user_id)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporary, "w") as file:
+            json.dump(list(device) if device else None, file)
+        os.replace(temporary, path)
+
+    @contextmanager
+    def locked(self, user_id):
+        """
+        Hold the user's lock. The kernel drops a flock() when its holder
+        closes the file or dies, so a lock is never left behind by a dead
+        process and never taken from a live one, however slow.
+        """
+        descriptor = os.open(f"{self.path(user_id)}.lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(descriptor, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(descriptor)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def store():
+    """The DeviceStore configured by DEVICE_STORE."""
+    backend = settings.DEVICE_STORE["BACKEND"]
+    location = settings.DEVICE_STORE.get("LOCATION")
+    with _stores_lock:
+        if (backend, location) not in _stores:
+            _stores[backend, location] = import_string(backend)(location)
+        return _stores[backend, location]
+
+
+def stored_device(user):
+    """The holder recorded on the user row."""
+    if not user.last_ip_address:
+        return None
+    since = user.last_login_device.timestamp() if user.last_login_device else None
+    return Device(user.last_ip_address, since)
+
+
+def holder(user):
+    """The device holding `user`'s account, or None."""
+    device = store().get(user.pk)
+    if device is MISSING:
+        device = stored_device(user)
+        store().compare_and_set(user.pk, MISSING, device)
+    return device
+
+
+def claim(user, ip, now=None):
+    """
+    Make the device at `ip` the holder of `user`'s account. Refused, by
+    returning False, while another device holds it and the user is active.
+    """
+    now = now or timezone.now()
+    current = holder(user)
+    if current is not None and current.ip != ip and not activity.is_inactive(user, now):
+        return False
+    if not store().compare_and_set(user.pk, current, Device(ip, now.timestamp())):
+        return False
+    user.last_ip_address = ip
+    user.last_login_device = now
+    user.last_logout_device = None
+    user.last_activity = now
+    user.save(update_fields=DEVICE_FIELDS)
+    return True
+
+
+def release(user, now=None):
+    """Free `user`'s account for any device."""
+    now = now or timezone.now()
+    store().set(user.pk, None)
+    user.last_ip_address = None
+    user.last_login_device = None
+    user.last_logout_device = now
+    user.last_activity = None
+    user.save(update_fields=DEVICE_FIELDS)
+    activity.forget(user)
+
@@ -0,0 +1,73 @@
+"""
+Count django_session queries per --requests requests of one logged-in
+browser, for the database session engine used before and for
+accounts.sessions.
+
+Each request goes through SessionMiddleware to a view that reads the
+session like an authenticated page, and the session cookie of each
+response is sent with the next request. The first request stores the
+login. Both engines run with SESSION_SAVE_EVERY_REQUEST, as the site does,
+and everything they write is rolled back afterwards.
+
+    python manage.py benchmark_sessions
+    python manage.py benchmark_sessions --requests 5000
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+ENGINES = [
+    ("db (before)", "django.contrib.sessions.backends.db"),
+    ("accounts.sessions", "accounts.sessions"),
+]
+
+
+def page(request):
+    if "_auth_user_id" not in request.session:
+        request.session["_auth_user_id"] = "1"
+    return HttpResponse(request.session["_auth_user_id"])
+
+
+def browse(requests):
+    """Run `requests` requests of one browser; returns (queries, seconds)."""
+    middleware = SessionMiddleware(page)
+    factory = RequestFactory()
+    cookie = None
+    started = time.perf_counter()
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(requests):
+            request = factory.get("/")
+            if cookie:
+                request.COOKIES[settings.SESSION_COOKIE_NAME] = cookie
+            response = middleware(request)
+            cookie = response.cookies[settings.SESSION_COOKIE_NAME].value
+    return [query["sql"] for query in queries if "django_session" in query["sql"]], time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = "Compare django_session reads and writes of the old and the low-write session engine."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000,
+                            help="Requests made by the browser.")
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+        self.stdout.write(f"{'engine':<20} {'writes':>7} {'reads':>7} {'ms':>9}")
+        for name, engine in ENGINES:
+            with override_settings(SESSION_ENGINE=engine, SESSION_SAVE_EVERY_REQUEST=True):
+                with transaction.atomic():
+                    queries, seconds = browse(requests)
+                    transaction.set_rollback(True)
+            writes = sum(1 for sql in queries if not sql.startswith("SELECT"))
+            self.stdout.write(
+                f"{name:<20} {writes * 1000 / requests:>7.1f} {(len(queries) - writes) * 1000 / requests:>7.1f} "
+                f"{seconds * 1000:>9.1f}"
+            )
+        self.stdout.write("writes and reads per 1000 requests")
@@ -0,0 +1,19 @@
+"""
+Release the device lock of every user idle past the inactivity timeout.
+
+The inactivity middleware already sweeps every INACTIVITY_SWEEP_INTERVAL
+while requests come in; run this from a scheduler so accounts are freed on
+a quiet site too.
+
+    python manage.py sweep_inactive_users
+"""
+from django.core.management.base import BaseCommand
+
+from accounts.activity import sweep
+
+
+class Command(BaseCommand):
+    help = "Release the device lock of users idle past the inactivity timeout."
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS(f"Released {sweep()} inactive user(s)."))
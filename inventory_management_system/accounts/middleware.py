@@ -1,51 +1,40 @@
 from django.utils import timezone
 from django.contrib.auth import logout
+from . import activity, devices
 from .views import get_client_ip
 
 
-MIDDLEWARE_SESSION_TIMEOUT = 10 * 60
-
 class InactivityTimeoutMiddleware:
+    """
+    Log out users idle for longer than INACTIVITY_TIMEOUT, or seen from a
+    different IP address than the device holding the account. Activity goes
+    through accounts.activity, which writes the user row at most once per
+    LAST_ACTIVITY_WRITE_INTERVAL instead of on every request, and the
+    holder comes from the accounts.devices store without a query.
+    """
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        # print("🔴 Middleware called")
         user = request.user
-        # print(f"🔴 User: {user}")
-        if user.is_authenticated:
-            # print("🔴 User is authenticated")
+        if user.is_authenticated and user.last_activity:
             current_ip = get_client_ip(request)
             now = timezone.now()
-            last_activity = user.last_activity
-            
-            if last_activity:
-                try:
-                    # print("🔴 Last activity is not None")
-                    elapsed = (now - last_activity).total_seconds()
-                    # print(f"🔴 Elapsed time: {elapsed} seconds")
-                    if elapsed > MIDDLEWARE_SESSION_TIMEOUT:
-                        # print("🔴 Elapsed time is greater than session timeout")
-                        # Reset device info
-                        user.last_ip_address = None
-                        user.last_login_device = None
-                        user.last_logout_device = now
-                        user.save()
-                        logout(request)
-                        # print("✅ Logged out due to inactivity + reset IP")
-                    else:
-                        # print("🔴 Elapsed time is less than session timeout")
-                        user.last_activity = now
-                        # print(f"🔴 Last activity: {user.last_activity}")
-                        user.save()
+            try:
+                if activity.is_inactive(user, now):
+                    # Reset device info
+                    devices.release(user, now)
+                    logout(request)
+                else:
+                    activity.touch(user, now)
 
-                    if current_ip != user.last_ip_address:
-                        # print("🔴 Current IP is different from last IP")
-                        logout(request)
-                        # print("✅ Logged out due to IP change")
-                except Exception as e:
-                    print("❌ Middleware error:", e)
+                device = devices.holder(user)
+                if device is None or current_ip != device.ip:
+                    logout(request)
+            except Exception as e:
+                print("❌ Middleware error:", e)
 
-            # Always update activity time
+            # Release the devices of users who never came back
+            activity.sweep_if_due(now)
 
         return self.get_response(request)
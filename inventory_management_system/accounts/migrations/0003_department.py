@@ -0,0 +1,100 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The departments that were hard-coded as choices in the user forms.
+INITIAL_DEPARTMENTS = [
+    "Applied Mechanics",
+    "Automobile Engineering",
+    "Civil Engineering",
+    "Computer Technology",
+    "Dress Desigining and Garments Manufacturing",
+    "Electrical Engineering",
+    "Electronics and Telecommunication Engineering",
+    "Exam Section",
+    "Gymkhana",
+    "Hostel Boys",
+    "Hostel Girls",
+    "Information Technology",
+    "Interior Desigining & Decoration",
+    "Library",
+    "Mechanical Engineering",
+    "Mechatronics engineering",
+    "Office",
+    "Plastic Engineering",
+    "Science (Chemistry)",
+    "Science (Physics)",
+    "Workshop",
+]
+
+
+def link_user_departments(apps, schema_editor):
+    Department = apps.get_model("accounts", "Department")
+    CustomUser = apps.get_model("accounts", "CustomUser")
+
+    names = set(INITIAL_DEPARTMENTS)
+    names.update(
+        CustomUser.objects.exclude(department__isnull=True)
+        .exclude(department="")
+        .values_list("department", flat=True)
+    )
+    for name in sorted(names):
+        department, _ = Department.objects.get_or_create(name=name)
+        CustomUser.objects.filter(department=name).update(department_ref=department)
+
+
+def restore_user_departments(apps, schema_editor):
+    Department = apps.get_model("accounts", "Department")
+    CustomUser = apps.get_model("accounts", "CustomUser")
+    for department in Department.objects.all():
+        CustomUser.objects.filter(department_ref=department).update(department=department.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_customuser_last_activity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Department",
+            fields=[
+                ("department_id", models.SmallAutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="customuser",
+            name="department_ref",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="accounts.department",
+            ),
+        ),
+        migrations.RunPython(link_user_departments, restore_user_departments),
+        migrations.RemoveField(
+            model_name="customuser",
+            name="department",
+        ),
+        migrations.RenameField(
+            model_name="customuser",
+            old_name="department_ref",
+            new_name="department",
+        ),
+        migrations.AlterField(
+            model_name="customuser",
+            name="department",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="users",
+                to="accounts.department",
+            ),
+        ),
+    ]
@@ -1,6 +1,58 @@
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.cache import cache
 from django.db import models
 
+DEPARTMENT_CHOICES_CACHE_KEY = "accounts:department_choices"
+DEPARTMENT_CHOICES_TIMEOUT = 300
+
+# Department lookup table
+class Department(models.Model):
+    """
+    A college department. DDSR rows and department users reference it by a
+    small integer key instead of repeating the department name.
+    """
+    department_id = models.SmallAutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def choices(cls):
+        """
+        (department_id, name) pairs ordered by name, served from the cache.
+        The cache key carries the cached Department data version, so a
+        department saved by any worker process replaces the choices of every
+        process within seconds, usually without a query.
+        """
+        # Imported here: inventory.models imports this module
+        from inventory.data_version import cached_version
+
+        key = f"{DEPARTMENT_CHOICES_CACHE_KEY}:{cached_version(cls)}"
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(cls.objects.order_by("name").values_list("department_id", "name"))
+            cache.set(key, choices, DEPARTMENT_CHOICES_TIMEOUT)
+        return choices
+
+    @classmethod
+    def names(cls):
+        """{department_id: name} from the cached choices."""
+        return dict(cls.choices())
+
+    @classmethod
+    def name_for(cls, department_id, names=None):
+        """
+        Name of a department from the cached choices, or None if unknown.
+        Pass `names` from names() when looking up many departments.
+        """
+        try:
+            department_id = int(department_id)
+        except (TypeError, ValueError):
+            return None
+        return (cls.names() if names is None else names).get(department_id)
+
+
 # Custom User Manager
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -26,7 +78,13 @@ class CustomUser(AbstractUser):
         ('department', 'Department'),
     ]
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='department')
-    department = models.CharField(max_length=255, blank=True, null=True)
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.PROTECT,
+        related_name="users",
+        blank=True,
+        null=True,
+    )
     last_ip_address = models.GenericIPAddressField(null=True, blank=True)  # To track the last IP address
     last_login_device = models.DateTimeField(null=True, blank=True)  # To track when the device was last used
     last_logout_device = models.DateTimeField(null=True, blank=True)  # To track when the device was last used
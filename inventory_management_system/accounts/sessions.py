@@ -0,0 +1,45 @@
+"""
+Low-write session engine: SESSION_ENGINE = "accounts.sessions".
+
+With SESSION_SAVE_EVERY_REQUEST the database backend rewrote the
+django_session row on every request just to push its expiry forward, and
+nothing ever deleted expired rows. This store reads through the cache like
+cached_db, but a save only reaches the database when the session data
+changed or SESSION_REFRESH_FRACTION of the session's age has passed since
+the row was last written. The browser cookie is still refreshed on every
+request. Expired rows are deleted at most once per SESSION_CLEANUP_INTERVAL
+by whichever request gets there first.
+`manage.py benchmark_sessions` counts the session queries of both engines.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core.cache import cache
+
+# When the row was last written, kept in the session data itself
+WRITTEN_KEY = "_session_written"
+CLEANUP_CACHE_KEY = "accounts:session_cleanup"
+
+
+class SessionStore(CachedDBStore):
+    def refresh_due(self):
+        """Whether enough of the session's age has passed to write its expiry again."""
+        written = self._session.get(WRITTEN_KEY)
+        if written is None:
+            return True
+        return time.time() - written >= self.get_expiry_age() * settings.SESSION_REFRESH_FRACTION
+
+    def save(self, must_create=False):
+        if self.session_key is not None and not must_create and not self.modified and not self.refresh_due():
+            return
+        # Set on the loaded data directly so the session does not count as modified
+        self._session[WRITTEN_KEY] = time.time()
+        super().save(must_create)
+        self.clear_expired_if_due()
+
+    @classmethod
+    def clear_expired_if_due(cls):
+        """clear_expired(), unless it already ran within SESSION_CLEANUP_INTERVAL."""
+        if cache.add(CLEANUP_CACHE_KEY, True, settings.SESSION_CLEANUP_INTERVAL.total_seconds()):
+            cls.clear_expired()
@@ -1,3 +1,271 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.data_version import version_cache_key, version_name
+from inventory.models import DataVersion
+
+from . import activity, devices
+from .activity import sweep
+from .sessions import CLEANUP_CACHE_KEY, WRITTEN_KEY, SessionStore
+from .models import Department
+
+
+def use_device_store(test):
+    """Give `test` an empty FileDeviceStore in a temporary directory."""
+    location = tempfile.TemporaryDirectory()
+    test.addCleanup(location.cleanup)
+    settings_override = override_settings(DEVICE_STORE={
+        "BACKEND": "accounts.devices.FileDeviceStore", "LOCATION": location.name,
+    })
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+class DepartmentChoicesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_choices_are_cached_until_a_department_changes(self):
+        choices = Department.choices()
+        self.assertIn("Library", dict(choices).values())
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Department.choices(), choices)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Department.objects.create(name="Canteen")
+        self.assertIn("Canteen", dict(Department.choices()).values())
+
+    def test_other_processes_see_a_new_department_once_their_version_expires(self):
+        choices = Department.choices()
+        # Another process adds a department and bumps the shared version
+        Department.objects.bulk_create([Department(name="Canteen")])
+        DataVersion.objects.update_or_create(name=version_name(Department), defaults={"version": 99})
+
+        self.assertEqual(Department.choices(), choices)
+        cache.delete(version_cache_key(version_name(Department)))  # VERSION_CACHE_TIMEOUT passes
+        self.assertIn("Canteen", dict(Department.choices()).values())
+
+    def test_name_for_ignores_unknown_ids(self):
+        library = Department.objects.get(name="Library")
+        self.assertEqual(Department.name_for(str(library.pk)), "Library")
+        self.assertIsNone(Department.name_for("not-a-number"))
+        self.assertIsNone(Department.name_for(None))
+
+
+class InactivityTrackingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Keep the opportunistic sweep out of the requests under test
+        cache.add(activity.SWEEP_CACHE_KEY, True)
+        use_device_store(self)
+        self.user = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin",
+            last_ip_address="127.0.0.1",
+        )
+        self.client.force_login(self.user)
+        self.url = reverse("inventory:admin_dashboard")
+
+    def last_active(self, ago):
+        get_user_model().objects.filter(pk=self.user.pk).update(last_activity=timezone.now() - ago)
+
+    def user_writes(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        writes = [query["sql"] for query in queries if query["sql"].startswith('UPDATE "accounts_customuser"')]
+        return response, writes
+
+    def test_activity_is_written_at_most_once_per_interval(self):
+        self.last_active(timedelta(seconds=10))
+        response, writes = self.user_writes()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(writes, [])
+
+        self.last_active(timedelta(minutes=2))
+        _, writes = self.user_writes()
+        self.assertEqual(len(writes), 1)
+        self.assertIn('SET "last_activity"', writes[0])
+        self.assertNotIn("email", writes[0])
+
+    def test_cached_activity_keeps_an_idle_looking_user_logged_in(self):
+        # The row trails the cache by up to LAST_ACTIVITY_WRITE_INTERVAL
+        self.last_active(timedelta(minutes=10, seconds=30))
+        cache.set(activity.cache_key(self.user.pk), timezone.now() - timedelta(minutes=1))
+
+        response, _ = self.user_writes()
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_inactive_user_is_logged_out_and_device_released(self):
+        self.last_active(timedelta(minutes=15))
+
+        response, _ = self.user_writes()
+
+        self.assertEqual(response.status_code, 302)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_ip_address)
+        self.assertIsNotNone(self.user.last_logout_device)
+
+    def test_sweep_releases_inactive_users_in_one_update(self):
+        self.last_active(timedelta(minutes=15))
+        active = get_user_model().objects.create_user(
+            email="active@example.com", password="secret",
+            last_ip_address="10.0.0.2", last_activity=timezone.now(),
+        )
+
+        with self.assertNumQueries(1):
+            self.assertEqual(sweep(), 1)
+
+        self.user.refresh_from_db()
+        active.refresh_from_db()
+        self.assertIsNone(self.user.last_ip_address)
+        self.assertEqual(active.last_ip_address, "10.0.0.2")
+
+
+class LowWriteSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(self.user)
+        self.url = reverse("inventory:admin_dashboard")
+
+    def session_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        return [query["sql"] for query in queries if "django_session" in query["sql"]]
+
+    def test_unchanged_sessions_are_not_written(self):
+        self.client.get(self.url)
+
+        for _ in range(5):
+            self.assertEqual(self.session_queries(), [])
+
+    def test_expiry_is_refreshed_once_enough_of_it_has_passed(self):
+        self.client.get(self.url)
+        written = SessionStore(self.client.session.session_key).load()[WRITTEN_KEY]
+        refresh_after = settings.SESSION_COOKIE_AGE * settings.SESSION_REFRESH_FRACTION
+
+        with mock.patch("accounts.sessions.time.time", return_value=written + refresh_after - 60):
+            self.assertEqual(self.session_queries(), [])
+        with mock.patch("accounts.sessions.time.time", return_value=written + refresh_after):
+            queries = self.session_queries()
+
+        # Plus the expired-session cleanup, also due by then
+        self.assertEqual(len([sql for sql in queries if sql.startswith('UPDATE "django_session"')]), 1)
+
+    def test_expired_sessions_are_cleared_periodically(self):
+        Session.objects.create(
+            session_key="expired", session_data="", expire_date=timezone.now() - timedelta(days=1)
+        )
+        cache.add(CLEANUP_CACHE_KEY, True)
+        self.client.force_login(self.user)
+        self.assertTrue(Session.objects.filter(session_key="expired").exists())
+
+        cache.delete(CLEANUP_CACHE_KEY)
+        self.client.force_login(self.user)
+        self.assertFalse(Session.objects.filter(session_key="expired").exists())
+
+
+class DeviceRegistryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache.add(activity.SWEEP_CACHE_KEY, True)
+        use_device_store(self)
+        self.user = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.url = reverse("inventory:admin_dashboard")
+
+    def log_in(self, ip):
+        client = Client(REMOTE_ADDR=ip)
+        response = client.post(reverse("accounts:login"), {"email": "admin@example.com", "password": "secret"})
+        return client, response
+
+    def test_one_device_at_a_time(self):
+        first, response = self.log_in("10.0.0.1")
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+
+        _, refused = self.log_in("10.0.0.2")
+        self.assertRedirects(refused, reverse("accounts:login"), fetch_redirect_response=False)
+        self.assertEqual(first.get(self.url).status_code, 200)
+
+        first.get(reverse("accounts:logout"))
+        _, response = self.log_in("10.0.0.2")
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+
+    def test_an_inactive_device_gives_way(self):
+        self.log_in("10.0.0.1")
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            last_activity=timezone.now() - timedelta(minutes=15)
+        )
+        cache.delete(activity.cache_key(self.user.pk))
+
+        _, response = self.log_in("10.0.0.2")
+
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertEqual(devices.store().get(self.user.pk).ip, "10.0.0.2")
+
+    def test_requests_check_the_store_and_fall_back_to_the_user_row(self):
+        client, _ = self.log_in("10.0.0.1")
+        # The store decides while it has a record...
+        get_user_model().objects.filter(pk=self.user.pk).update(last_ip_address="10.0.0.9")
+        self.assertEqual(client.get(self.url).status_code, 200)
+
+        # ...and the durable user row when it has none
+        os.remove(devices.store().path(self.user.pk))
+        self.assertEqual(client.get(self.url).status_code, 302)
+
+    def test_concurrent_claims_have_one_winner(self):
+        store = devices.store()
+        results = []
+
+        def claim(number):
+            results.append(store.compare_and_set(self.user.pk, devices.MISSING, devices.Device(f"10.0.0.{number}", 0)))
+
+        threads = [threading.Thread(target=claim, args=(number,)) for number in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 1)
+
+    def test_a_held_lock_is_never_broken(self):
+        store = devices.store()
+        lock = f"{store.path(self.user.pk)}.lock"
+        results = []
+        contender = threading.Thread(target=lambda: results.append(
+            store.compare_and_set(self.user.pk, devices.MISSING, devices.Device("10.0.0.2", 0))
+        ))
+
+        with store.locked(self.user.pk):
+            # However old the lock file looks, its holder keeps it
+            os.utime(lock, (0, 0))
+            contender.start()
+            contender.join(0.2)
+            self.assertTrue(contender.is_alive())
+            store.write(self.user.pk, devices.Device("10.0.0.1", 0))
+        contender.join()
+
+        self.assertEqual(results, [False])
+        self.assertEqual(store.get(self.user.pk).ip, "10.0.0.1")
+
+        # A lock file left by a dead process holds nothing
+        os.utime(lock, None)
+        self.assertTrue(store.compare_and_set(self.user.pk, store.get(self.user.pk), None))
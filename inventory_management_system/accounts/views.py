@@ -1,14 +1,12 @@
 from django.shortcuts import render, redirect
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
-from django.utils import timezone
-from datetime import timedelta
 from django.urls import reverse
 from django.http import HttpResponseRedirect
+from . import devices
 from .forms import LoginForm
 from django.utils.cache import add_never_cache_headers
 
-MAX_INACTIVE_TIME = timedelta(minutes=10)  # 5 minutes in seconds
 
 def get_client_ip(request):
     x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -43,33 +41,11 @@ def login_view(request):
             print(f"🔴 User: {user}")
             
             if user is not None:
-                # Get current device info
-                current_ip = get_client_ip(request)
-                print(current_ip)
-                print(user.last_ip_address)
-                print(user.last_login_device)
-                print(user.last_activity)
-
-                last_seen = user.last_activity
-                if last_seen and timezone.now() - last_seen > MAX_INACTIVE_TIME:
-                    user.last_activity = None
-                    user.last_ip_address = None
-                    user.last_login_device = None
-                    user.last_logout_device = timezone.now()
-                    user.save()
-                    logout(request)
-                # Check if user is already logged in from another device
-                if user.last_ip_address and user.last_ip_address != current_ip:
+                # One device per account; the claim is atomic
+                if not devices.claim(user, get_client_ip(request)):
                     messages.error(request, "This account is already logged in from another device.")
                     return redirect("accounts:login")
                 
-                # Update user's device information
-                user.last_ip_address = current_ip
-                user.last_login_device = timezone.now()
-                user.last_logout_device = None
-                user.last_activity = timezone.now()
-                user.save()
-                
                 # Login the user
                 login(request, user)
                 
@@ -91,12 +67,7 @@ def login_view(request):
 def logout_view(request):
     if request.user.is_authenticated:
         # Clear device information on logout
-        user = request.user
-        user.last_ip_address = None
-        user.last_login_device = None
-        user.last_activity = None
-        user.last_logout_device = timezone.now()
-        user.save()
+        devices.release(request.user)
     
     logout(request)
     messages.success(request, "Logged out successfully!")
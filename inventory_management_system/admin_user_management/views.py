@@ -1,5 +1,6 @@
 from django.shortcuts import render , redirect
-from .forms import DepartmentUserCreationForm , DEPARTMENT_CHOICES
+from .forms import DepartmentUserCreationForm
+from accounts.models import Department
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.urls import reverse 
@@ -35,7 +36,6 @@ def add_department_user(request):
             department_user = form.save(commit=False)
             department_user.set_password(form.cleaned_data["password"])
             department_user.role = "department"
-            department_user.department = form.cleaned_data["department"]
             department_user.save()
             messages.success(request, "Department user added successfully!")
             return redirect_with_no_cache("inventory:admin_dashboard")
@@ -46,7 +46,7 @@ def add_department_user(request):
 
 @user_passes_test(is_admin)
 def manage_users(request):
-    users = get_user_model().objects.filter(role='department')
+    users = get_user_model().objects.filter(role='department').select_related('department')
     return render(request, "admin_user_management/manage_users.html", {'users': users})
 
 @user_passes_test(is_admin)
@@ -55,13 +55,16 @@ def edit_user(request, user_id):
 
     if request.method == 'POST':
         department = request.POST.get('department')
+        if not Department.name_for(department):
+            messages.error(request, 'Please select a valid department.')
+            return redirect('admin_user_management:edit_user', user_id=user.id)
         password = request.POST.get('password')
         is_active = request.POST.get('is_active') == 'on'
         
         print(department)
         print(is_active)
 
-        user.department = department
+        user.department_id = int(department)
         user.is_active = is_active
         
         if password != '':
@@ -74,7 +77,7 @@ def edit_user(request, user_id):
     
     return render(request, 'admin_user_management/edit_user.html', {
         'user': user,
-        'departments': DEPARTMENT_CHOICES  # Using the imported DEPARTMENT_CHOICES
+        'departments': Department.choices()
     })
 
 @user_passes_test(is_admin)
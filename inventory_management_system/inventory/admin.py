@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CDSR, DDSR , ConsumeCDSR,ConsumeDDSR , WriteOff
+from .models import CDSR, DDSR , ConsumeCDSR,ConsumeDDSR , WriteOff, ExportJob, ListColumns, AllocationEntry, UnlinkedDDSR
 
 # Register your models here.
 admin.site.register(CDSR)
@@ -7,3 +7,28 @@ admin.site.register(DDSR)
 admin.site.register(ConsumeCDSR)
 admin.site.register(ConsumeDDSR)
 admin.site.register(WriteOff)
+admin.site.register(ExportJob)
+admin.site.register(ListColumns)
+
+
+@admin.register(UnlinkedDDSR)
+class UnlinkedDDSRAdmin(admin.ModelAdmin):
+    """Allocations left without an item by migration 0003, to link by hand."""
+    list_display = ("ddsr", "cdsr_table_id", "cdsr_name", "product_description", "supplier_name", "cost_unit")
+    search_fields = ("cdsr_name", "product_description", "supplier_name")
+
+
+@admin.register(AllocationEntry)
+class AllocationEntryAdmin(admin.ModelAdmin):
+    """The ledger is append-only; the admin only shows it."""
+    list_display = ("created_at", "action", "cdsr", "department", "quantity", "balance", "user")
+    list_filter = ("action",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
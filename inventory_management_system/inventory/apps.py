@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "inventory"
+
+    def ready(self):
+        from accounts.models import Department
+        from register_management.models import Register
+        from .data_version import track
+        from django.db.models.signals import post_save
+
+        from .models import CDSR, DDSR
+        from .search import reindex_on_save
+
+        track(CDSR, DDSR, Department, Register)
+        post_save.connect(reindex_on_save, sender=CDSR, dispatch_uid="search_reindex_cdsr")
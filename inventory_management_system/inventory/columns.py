@@ -0,0 +1,55 @@
+"""
+Per-user column choice for the inventory list views.
+
+Each user may pick which columns of a list they want to see; the choice is
+stored in ListColumns and applies on every later visit. The list query then
+loads only the chosen columns (plus the primary key and any join they
+need) with only(), and each page is handed to the template as pre-built
+row tuples (see list_table) instead of model instances read cell by cell.
+`manage.py benchmark_columns` compares a full and a projected page.
+"""
+from .models import CDSR, DDSR, ListColumns
+
+# {list name: (display columns, display column -> ORM lookup)}
+LISTS = {
+    "inventory": (CDSR.display_fields(), lambda name: name),
+    "department_inventory": (DDSR.display_fields(), DDSR.lookup_for),
+}
+
+
+def chosen_columns(user, list_name):
+    """The columns `user` chose for `list_name`, in list order; all of them by default."""
+    fields = LISTS[list_name][0]
+    saved = (
+        ListColumns.objects.filter(user=user, list_name=list_name)
+        .values_list("columns", flat=True)
+        .first()
+    )
+    columns = [field for field in fields if field in (saved or ())]
+    return columns or list(fields)
+
+
+def save_columns(user, list_name, columns):
+    """Store the valid subset of `columns`; an empty choice resets to all columns."""
+    fields = LISTS[list_name][0]
+    columns = [field for field in fields if field in columns]
+    if columns and len(columns) < len(fields):
+        ListColumns.objects.update_or_create(
+            user=user, list_name=list_name, defaults={"columns": columns}
+        )
+    else:
+        ListColumns.objects.filter(user=user, list_name=list_name).delete()
+    return columns or list(fields)
+
+
+def project(queryset, lookups):
+    """
+    `queryset` loading only the columns behind `lookups`, with the relations
+    those lookups cross joined in and every other join dropped.
+    """
+    relations = sorted({lookup.rsplit("__", 1)[0] for lookup in lookups if "__" in lookup})
+    queryset = queryset.select_related(None)
+    if relations:
+        queryset = queryset.select_related(*relations)
+    return queryset.only(*relations, *lookups)
+
@@ -0,0 +1,110 @@
+"""
+Row counts for the numbered list pages.
+
+Paginator counts whatever queryset it is given, annotations and all. The
+list views instead pass the bare filtered queryset to count, and the result
+is cached per query until the data version of a table it reads changes.
+When the database's own row estimate says the count would have to scan more
+than EXACT_COUNT_LIMIT rows, that estimate is used instead of COUNT(*).
+"""
+import hashlib
+import json
+
+from django.apps import apps
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .data_version import current
+
+COUNT_CACHE_TIMEOUT = 600
+
+# Above this many estimated rows the estimate itself is shown.
+EXACT_COUNT_LIMIT = 100_000
+
+
+def models_in(queryset):
+    """Models whose tables the queryset's SQL reads."""
+    models_by_table = {model._meta.db_table: model for model in apps.get_models()}
+    models = [queryset.model]
+    for join in queryset.query.alias_map.values():
+        model = models_by_table.get(join.table_name)
+        if model is not None and model not in models:
+            models.append(model)
+    return models
+
+
+def count_cache_key(queryset):
+    sql, params = queryset.query.sql_with_params()
+    versions = current(*models_in(queryset))
+    payload = json.dumps([queryset.db, sql, [str(param) for param in params], versions])
+    return "inventory:count:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def estimated_count(queryset):
+    """
+    The planner's row estimate for `queryset`, or None when the backend has
+    none (SQLite) or the plan cannot be read.
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.values("pk").query.sql_with_params()
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == "mysql":
+                cursor.execute(f"EXPLAIN {sql}", params)
+                columns = [column[0] for column in cursor.description]
+                estimate = 1
+                for row in cursor.fetchall():
+                    plan = dict(zip(columns, row))
+                    estimate *= (plan["rows"] or 0) * float(plan["filtered"] or 100) / 100
+                return int(estimate)
+            if connection.vendor == "postgresql":
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]["Plan"]["Plan Rows"])
+    except Exception:
+        return None
+    return None
+
+
+def cached_count(queryset):
+    """
+    (count, is_estimate) for `queryset`, from the cache when the tables it
+    reads are unchanged since the count was taken.
+    """
+    queryset = queryset.order_by()
+    key = count_cache_key(queryset)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    estimate = estimated_count(queryset)
+    if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+        result = (estimate, True)
+    else:
+        result = (queryset.count(), False)
+    cache.set(key, result, COUNT_CACHE_TIMEOUT)
+    return result
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose count comes from cached_count() of `count_queryset`."""
+
+    def __init__(self, object_list, per_page, count_queryset=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_queryset = object_list if count_queryset is None else count_queryset
+
+    @cached_property
+    def count_and_estimate(self):
+        return cached_count(self.count_queryset)
+
+    @cached_property
+    def count(self):
+        return self.count_and_estimate[0]
+
+    @property
+    def count_is_estimate(self):
+        return self.count_and_estimate[1]
@@ -0,0 +1,115 @@
+"""
+Streaming CSV export shared by the list views.
+
+Rows are read with a chunked values_list().iterator(), so no model instances
+are built, and they are written straight into a StreamingHttpResponse. The
+memory held by an export therefore stays flat however many rows it has.
+Adding `compress=gzip` to the export URL sends a .csv.gz file instead, and
+`background=1` hands the export to a background job (see export_jobs).
+"""
+import csv
+import zlib
+from datetime import datetime
+
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Rows are joined into blocks of roughly this many characters before they
+# are handed to the server, instead of one write per CSV line.
+STREAM_BLOCK_SIZE = 64 * 1024
+
+GZIP_LEVEL = 6
+
+
+class Echo:
+    """File-like object whose write() returns the text instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def header_row(fields):
+    return [field.replace('_', ' ').title() for field in fields]
+
+
+def csv_lines(queryset, fields, lookups=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the header and one CSV line per row of `queryset`.
+
+    `lookups` are the ORM paths read for each column (e.g. "cdsr__supplier"
+    for a joined column) and default to the field names themselves.
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(header_row(fields))
+    rows = queryset.values_list(*(lookups or fields)).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def blocks(lines, block_size=STREAM_BLOCK_SIZE):
+    """Group CSV lines into encoded blocks of about `block_size` characters."""
+    pending = []
+    size = 0
+    for line in lines:
+        pending.append(line)
+        size += len(line)
+        if size >= block_size:
+            yield ''.join(pending).encode('utf-8')
+            pending = []
+            size = 0
+    if pending:
+        yield ''.join(pending).encode('utf-8')
+
+
+def gzip_blocks(chunks, level=GZIP_LEVEL):
+    """Compress a stream of byte blocks into a single gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def csv_stream(queryset, fields, lookups=None, compress=False):
+    """Byte blocks of the CSV export of `queryset`, gzipped if `compress`."""
+    stream = blocks(csv_lines(queryset, fields, lookups))
+    if compress:
+        stream = gzip_blocks(stream)
+    return stream
+
+
+def export_csv(request, queryset, fields, name, lookups=None):
+    """
+    Stream `queryset` as a CSV attachment called `<name>_<timestamp>.csv`.
+
+    The queryset's filters and ordering are kept as they are. Passing
+    `compress=gzip` in the query string sends a gzipped file, and passing
+    `background=1` starts an export job and redirects to its status page.
+    """
+    compress = request.GET.get('compress') == 'gzip'
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    filename = f"{name}_{timestamp}.csv"
+
+    if request.GET.get('background'):
+        # Imported here because export_jobs builds on this module
+        from .export_jobs import start_export_job
+
+        job = start_export_job(request.user, queryset, fields, f"{name}_{timestamp}", lookups)
+        return redirect('inventory:export_status', job_id=job.job_id)
+
+    if compress:
+        response = StreamingHttpResponse(
+            csv_stream(queryset, fields, lookups, compress=True),
+            content_type='application/gzip',
+        )
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(
+            csv_stream(queryset, fields, lookups),
+            content_type='text/csv',
+        )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,214 @@
+"""
+Dashboard statistics for the admin and department dashboards.
+
+Every number shown on a dashboard is computed here with a fixed number of
+aggregate queries, so the cost of a dashboard load does not grow with the
+size of the CDSR/DDSR tables.
+"""
+from datetime import date, datetime, timedelta
+
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from accounts.models import Department
+
+from .models import CDSR, DDSR
+
+MONTHS_IN_SERIES = 7
+
+
+def add_months(day, months):
+    """Return the first day of the month `months` away from `day`'s month."""
+    month_index = day.year * 12 + (day.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def month_starts(months=MONTHS_IN_SERIES, today=None):
+    """First day of each of the last `months` calendar months, oldest first."""
+    today = today or timezone.localdate()
+    return [add_months(today, -i) for i in range(months - 1, -1, -1)]
+
+
+def monthly_series(queryset, date_field, months=MONTHS_IN_SERIES, today=None):
+    """
+    Count rows of `queryset` per calendar month for the last `months` months.
+
+    Runs a single GROUP BY over a closed date range on `date_field`, so the
+    database can answer it from an index instead of one COUNT per month.
+    Returns a (labels, counts) pair with month names and integer counts.
+    """
+    starts = month_starts(months, today)
+    range_end = add_months(starts[-1], 1)
+
+    rows = (
+        queryset.filter(**{
+            f"{date_field}__gte": starts[0],
+            f"{date_field}__lt": range_end,
+        })
+        .annotate(month=TruncMonth(date_field))
+        .values("month")
+        .annotate(count=Count("pk"))
+        .order_by()
+    )
+
+    counts = {}
+    for row in rows:
+        month = row["month"]
+        if isinstance(month, datetime):
+            month = month.date()
+        counts[month] = row["count"]
+
+    labels = [start.strftime("%B") for start in starts]
+    data = [int(counts.get(start, 0)) for start in starts]
+    return labels, data
+
+
+def admin_dashboard_stats(today=None):
+    """
+    Collect every figure shown on the admin dashboard.
+
+    Uses four queries in total: one aggregate over CDSR, one aggregate over
+    DDSR, the department distribution and the monthly allocation series.
+    """
+    today = today or timezone.localdate()
+    month_start = add_months(today, 0)
+
+    cdsr_stats = CDSR.objects.aggregate(
+        total_items=Count("cdsr_id"),
+        active_items=Count("cdsr_id", filter=Q(writeoff_status__isnull=True)),
+        total_value=Sum("total_cost"),
+        yearly_value=Sum("total_cost", filter=Q(purchase_year=str(today.year))),
+    )
+
+    ddsr_stats = DDSR.objects.aggregate(
+        total_allocations=Count("cdsr__product_description", distinct=True),
+        total_departments=Count("department", distinct=True),
+        monthly_allocations=Count(
+            "ddsr_id",
+            filter=Q(
+                date_of_receive__gte=month_start,
+                date_of_receive__lt=add_months(month_start, 1),
+            ),
+        ),
+    )
+
+    department_rows = (
+        DDSR.objects.values("department")
+        .annotate(count=Count("ddsr_id"))
+        .values_list("department", "count")
+        .order_by("-count")
+    )
+    department_labels = []
+    department_data = []
+    names = Department.names()
+    for department_id, count in department_rows:
+        department_labels.append(names.get(department_id))
+        department_data.append(count)
+
+    monthly_labels, monthly_data = monthly_series(
+        DDSR.objects.all(), "date_of_receive", today=today
+    )
+
+    return {
+        "total_items": cdsr_stats["total_items"],
+        "active_items": cdsr_stats["active_items"],
+        "total_value": cdsr_stats["total_value"] or 0,
+        "yearly_value": cdsr_stats["yearly_value"] or 0,
+        "total_allocations": ddsr_stats["total_allocations"],
+        "total_departments": ddsr_stats["total_departments"],
+        "active_departments": ddsr_stats["total_departments"],
+        "monthly_allocations": ddsr_stats["monthly_allocations"],
+        "department_labels": department_labels,
+        "department_data": department_data,
+        "monthly_labels": monthly_labels,
+        "monthly_data": monthly_data,
+    }
+
+
+def percent(part, whole):
+    return round((part / whole * 100) if whole > 0 else 0, 1)
+
+
+def department_dashboard_stats(department, today=None):
+    """
+    Collect every figure shown on a department dashboard in one query.
+
+    DDSR rows of the department are grouped by product category, and each
+    group carries conditional aggregates for the 30-day and one-year splits
+    and for every month of the series. The handful of category rows are
+    then folded together in Python, so the database is scanned once and no
+    DDSR rows are loaded into memory.
+    """
+    today = today or timezone.localdate()
+    last_month = today - timedelta(days=30)
+    last_year = today - timedelta(days=365)
+    starts = month_starts(today=today)
+    month_ends = starts[1:] + [add_months(starts[-1], 1)]
+
+    month_counts = {
+        f"month_{index}": Count(
+            "ddsr_id",
+            filter=Q(date_of_receive__gte=start, date_of_receive__lt=end),
+        )
+        for index, (start, end) in enumerate(zip(starts, month_ends))
+    }
+
+    rows = (
+        DDSR.objects.filter(department=department)
+        .values(category=F("cdsr__product_category"))
+        .annotate(
+            item_count=Count("ddsr_id"),
+            quantity=Sum("accepted_product_quantity"),
+            value=Sum("total_cost"),
+            new_items=Count("ddsr_id", filter=Q(date_of_receive__gte=last_month)),
+            old_quantity=Sum(
+                "accepted_product_quantity", filter=Q(date_of_receive__lt=last_month)
+            ),
+            last_year_value=Sum("total_cost", filter=Q(date_of_receive__lt=last_year)),
+            **month_counts,
+        )
+        .order_by("category")
+    )
+
+    totals = {
+        "item_count": 0,
+        "quantity": 0,
+        "value": 0,
+        "new_items": 0,
+        "old_quantity": 0,
+        "last_year_value": 0,
+    }
+    monthly_data = [0] * len(starts)
+    category_labels = []
+    category_data = []
+
+    for row in rows:
+        for key in totals:
+            totals[key] += row[key] or 0
+        for index in range(len(starts)):
+            monthly_data[index] += row[f"month_{index}"]
+        if row["item_count"] > 0:
+            category_labels.append(row["category"])
+            category_data.append(row["item_count"])
+
+    total_items = totals["item_count"]
+    total_quantity = totals["quantity"]
+    total_value = totals["value"]
+    last_year_value = totals["last_year_value"]
+
+    return {
+        "total_items": total_items,
+        "total_quantity": total_quantity,
+        "total_value": total_value,
+        "recent_allocations": totals["new_items"],
+        "new_items_percent": percent(totals["new_items"], total_items),
+        "quantity_percent": percent(
+            total_quantity, totals["old_quantity"] + total_quantity
+        ),
+        "value_percent": percent(total_value - last_year_value, last_year_value),
+        "category_labels": category_labels,
+        "category_data": category_data,
+        "monthly_labels": [start.strftime("%B") for start in starts],
+        "monthly_data": monthly_data,
+    }
@@ -0,0 +1,112 @@
+"""
+Per-table write counters shared by every worker process.
+
+Each CDSR, DDSR, Department and Register write bumps the DataVersion row of its table
+once the writer's transaction commits (transaction.on_commit), so a rolled
+back write leaves the version alone and the row lock of the increment is
+not held for the rest of the writer's transaction, where it would serialize
+every concurrent write to the table. Between the commit and the bump a
+reader can still be served a result of the previous version.
+Results built from those tables (export files, cached counts) store the
+versions they were computed from and are reused only while they still match.
+Bulk `QuerySet.update()` calls skip the signals and must call bump() themselves.
+`QuerySet.delete()` sends a signal per row; inside coalesced() the bumps of a
+many-row write are collected and each table is bumped once at the end.
+
+cached_version() serves a version from the default cache for lookups made
+on every request (the department and register choices). The process that
+bumps a version drops its cached copy at once; other processes see the new
+version within VERSION_CACHE_TIMEOUT seconds.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+
+from .models import DataVersion
+
+VERSION_CACHE_TIMEOUT = 5
+
+_pending = threading.local()
+
+
+def version_name(model):
+    return model._meta.label_lower
+
+
+def version_cache_key(name):
+    return f"inventory:data_version:{name}"
+
+
+def bump(*models):
+    """Record a write to each of the given models' tables, once it commits."""
+    pending = getattr(_pending, "models", None)
+    if pending is not None:
+        pending.update(dict.fromkeys(models))
+        return
+    transaction.on_commit(lambda: increment(models))
+
+
+def increment(models):
+    for model in models:
+        name = version_name(model)
+        updated = DataVersion.objects.filter(name=name).update(version=F("version") + 1)
+        if not updated:
+            _, created = DataVersion.objects.get_or_create(name=name, defaults={"version": 1})
+            if not created:
+                DataVersion.objects.filter(name=name).update(version=F("version") + 1)
+        cache.delete(version_cache_key(name))
+
+
+@contextmanager
+def coalesced():
+    """
+    Bump each table written inside the block once, when the block ends,
+    instead of on every row. Use it inside the writes' transaction; the
+    bumps still wait for it to commit.
+    """
+    if getattr(_pending, "models", None) is not None:
+        yield
+        return
+    _pending.models = {}
+    try:
+        yield
+        models = list(_pending.models)
+    finally:
+        _pending.models = None
+    bump(*models)
+
+
+def current(*models):
+    """Versions of the given models' tables, in the order given."""
+    names = [version_name(model) for model in models]
+    versions = dict(
+        DataVersion.objects.filter(name__in=names).values_list("name", "version")
+    )
+    return tuple(versions.get(name, 0) for name in names)
+
+
+def cached_version(model):
+    """The version of `model`'s table, read from the cache when it can be."""
+    key = version_cache_key(version_name(model))
+    version = cache.get(key)
+    if version is None:
+        version = current(model)[0]
+        cache.set(key, version, VERSION_CACHE_TIMEOUT)
+    return version
+
+
+def bump_on_write(sender, **kwargs):
+    if kwargs.get("raw"):
+        return
+    bump(sender)
+
+
+def track(*models):
+    """Bump the version of each model's table whenever a row is saved or deleted."""
+    for model in models:
+        post_save.connect(bump_on_write, sender=model, dispatch_uid=f"data_version_save_{version_name(model)}")
+        post_delete.connect(bump_on_write, sender=model, dispatch_uid=f"data_version_delete_{version_name(model)}")
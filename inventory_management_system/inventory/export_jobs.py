@@ -0,0 +1,243 @@
+"""
+Background CSV export jobs.
+
+A job streams the same CSV as csv_export, gzipped, into a file under
+settings.EXPORT_ROOT from a small thread pool, so no request worker is held
+for the length of the download. Files are named after the job signature: a
+hash of the export query, its columns and the data versions of the tables
+it reads. An identical export requested while the data is unchanged reuses
+the finished (or still running) job instead of writing the file again.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from .csv_export import blocks, csv_lines, gzip_blocks
+from .data_version import current
+from .models import ExportJob
+
+# Progress is written back to the job row every this many rows.
+PROGRESS_EVERY = 5000
+
+# A pending/running job older than this is assumed lost (e.g. the process
+# running it restarted) and is not reused.
+STALE_AFTER = timedelta(hours=1)
+
+RANGE_BLOCK_SIZE = 64 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def models_for(queryset, lookups):
+    """The queryset's model plus every model its column lookups join to."""
+    models = [queryset.model]
+    for lookup in lookups:
+        model = queryset.model
+        for part in lookup.split("__")[:-1]:
+            model = model._meta.get_field(part).related_model
+            if model not in models:
+                models.append(model)
+    return models
+
+
+def export_signature(queryset, fields, lookups):
+    sql, params = queryset.query.sql_with_params()
+    versions = current(*models_for(queryset, lookups))
+    payload = json.dumps(
+        [sql, [str(param) for param in params], fields, lookups, versions]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def reusable_job(signature):
+    """The newest job with this signature whose file is, or will be, usable."""
+    job = (
+        ExportJob.objects.filter(signature=signature)
+        .exclude(status=ExportJob.FAILED)
+        .order_by("-job_id")
+        .first()
+    )
+    if job is None:
+        return None
+    if job.status == ExportJob.DONE:
+        return job if os.path.exists(job.file_path) else None
+    return job if job.created_at >= timezone.now() - STALE_AFTER else None
+
+
+def start_export_job(user, queryset, fields, name, lookups=None):
+    """
+    Return an export job for `queryset`, reusing an identical one if possible.
+
+    A new job is handed to the worker pool once its row is committed.
+    """
+    lookups = list(lookups or fields)
+    prune_expired_jobs()
+    signature = export_signature(queryset, fields, lookups)
+    filename = f"{name}.csv.gz"
+
+    existing = reusable_job(signature)
+    if existing is not None:
+        if existing.user_id == user.pk:
+            return existing
+        if existing.status == ExportJob.DONE:
+            return ExportJob.objects.create(
+                user=user,
+                name=filename,
+                signature=signature,
+                status=ExportJob.DONE,
+                total_rows=existing.total_rows,
+                rows_written=existing.rows_written,
+                file_size=existing.file_size,
+                finished_at=timezone.now(),
+            )
+
+    job = ExportJob.objects.create(user=user, name=filename, signature=signature)
+    transaction.on_commit(
+        lambda: submit(run_export_job, job.job_id, queryset, fields, lookups)
+    )
+    return job
+
+
+def submit(function, *args):
+    """Run `function` on the export pool, or inline if it has no workers."""
+    global _executor
+    workers = settings.EXPORT_JOB_WORKERS
+    if workers <= 0:
+        function(*args)
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export-job")
+    _executor.submit(function, *args)
+
+
+def counted(lines, job):
+    """Pass CSV lines through, recording how many data rows have gone by."""
+    rows = -1  # the first line is the header
+    for line in lines:
+        yield line
+        rows += 1
+        if rows and rows % PROGRESS_EVERY == 0:
+            ExportJob.objects.filter(pk=job.pk).update(rows_written=rows)
+    job.rows_written = max(rows, 0)
+
+
+def run_export_job(job_id, queryset, fields, lookups):
+    job = ExportJob.objects.get(pk=job_id)
+    temporary_path = f"{job.file_path}.{job.job_id}.tmp"
+    try:
+        job.status = ExportJob.RUNNING
+        job.total_rows = queryset.count()
+        job.save(update_fields=["status", "total_rows"])
+
+        os.makedirs(settings.EXPORT_ROOT, exist_ok=True)
+        with open(temporary_path, "wb") as output:
+            lines = counted(csv_lines(queryset, fields, lookups), job)
+            for chunk in gzip_blocks(blocks(lines)):
+                output.write(chunk)
+        os.replace(temporary_path, job.file_path)
+
+        job.status = ExportJob.DONE
+        job.file_size = os.path.getsize(job.file_path)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "rows_written", "file_size", "finished_at"])
+    except Exception as exc:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        ExportJob.objects.filter(pk=job_id).update(
+            status=ExportJob.FAILED, error=str(exc), finished_at=timezone.now()
+        )
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+def prune_expired_jobs():
+    """Delete jobs past EXPORT_JOB_RETENTION and files no other job uses."""
+    cutoff = timezone.now() - settings.EXPORT_JOB_RETENTION
+    expired = ExportJob.objects.filter(created_at__lt=cutoff)
+    signatures = set(expired.values_list("signature", flat=True))
+    if not signatures:
+        return
+    in_use = set(
+        ExportJob.objects.filter(created_at__gte=cutoff, signature__in=signatures)
+        .values_list("signature", flat=True)
+    )
+    expired.delete()
+    for signature in signatures - in_use:
+        path = os.path.join(settings.EXPORT_ROOT, f"{signature}.csv.gz")
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, inclusive, or None to send the
+    whole file. Raises ValueError when the range cannot be satisfied.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError("Unsatisfiable range")
+    return start, end
+
+
+def file_blocks(path, start, length):
+    with open(path, "rb") as source:
+        source.seek(start)
+        while length > 0:
+            data = source.read(min(RANGE_BLOCK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def ranged_file_response(request, path, filename, etag, content_type):
+    """
+    Serve a file that never changes once written, honouring a single HTTP
+    Range (and If-Range against `etag`) so interrupted downloads can resume.
+    """
+    size = os.path.getsize(path)
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE")
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if range_header and (not if_range or if_range == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    response = StreamingHttpResponse(
+        file_blocks(path, start, length),
+        content_type=content_type,
+        status=206 if byte_range else 200,
+    )
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Content-Length"] = str(length)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
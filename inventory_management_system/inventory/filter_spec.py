@@ -0,0 +1,157 @@
+"""
+Filter rows and column sorting for the list views.
+
+The filter bar sends `filter_field`/`filter_value` pairs and the column
+headers send `sort_by`/`order`. A FilterSpec knows the type of every column
+a list may filter or sort on and compiles each value into a lookup that
+suits it, so numbers and dates become exact or range comparisons an index
+can serve instead of string LIKE scans. Unknown columns and malformed
+values are reported back as FilterError messages and never reach the
+database.
+
+Value syntax, for every column type:
+
+    5          exact (text columns: contains)
+    5..10      inclusive range; either end may be left open ("5..", "..10")
+    >5 >=5 <5 <=5
+    =abc       exact, ignoring case (text)
+    abc*       starts with, ignoring case (text)
+"""
+import re
+
+from django.db import models
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+
+from .models import CDSR, DDSR
+
+TEXT = "text"
+INTEGER = "integer"
+DATE = "date"
+
+COMPARISON = re.compile(r"^(>=|<=|>|<)\s*(.+)$")
+COMPARISON_LOOKUPS = {">": "gt", ">=": "gte", "<": "lt", "<=": "lte"}
+
+
+class FilterError(ValueError):
+    pass
+
+
+def field_kind(field):
+    if isinstance(field, models.DateField):
+        return DATE
+    if isinstance(field, models.IntegerField):
+        return INTEGER
+    if isinstance(field, (models.CharField, models.TextField)):
+        return TEXT
+    return None
+
+
+class FilterSpec:
+    """The filterable and sortable columns of one list, by display name."""
+
+    def __init__(self, columns, default_sort):
+        # {display name: (ORM lookup, kind)}
+        self.columns = columns
+        self.default_sort = default_sort
+
+    @classmethod
+    def for_model(cls, model, names, lookup_for=None, default_sort=None):
+        """
+        Spec for the display columns `names` of `model`. `lookup_for` maps a
+        display name to its ORM path when it is not a field of `model`.
+        """
+        columns = {}
+        for name in names:
+            lookup = lookup_for(name) if lookup_for else name
+            field = model
+            target = None
+            for part in lookup.split("__"):
+                target = field._meta.get_field(part)
+                field = target.related_model
+            kind = field_kind(target)
+            if kind is not None:
+                columns[name] = (lookup, kind)
+        return cls(columns, default_sort or model._meta.pk.name)
+
+    def column(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise FilterError(f"Unknown column: {name}")
+
+    def parse(self, name, kind, value):
+        if kind == INTEGER:
+            try:
+                return int(value)
+            except ValueError:
+                raise FilterError(f"{name} expects a whole number, not {value!r}")
+        if kind == DATE:
+            try:
+                parsed = parse_date(value)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise FilterError(f"{name} expects a date as YYYY-MM-DD, not {value!r}")
+            return parsed
+        return value
+
+    def compile(self, name, value):
+        """Q for one filter row."""
+        lookup, kind = self.column(name)
+        value = value.strip()
+
+        comparison = COMPARISON.match(value)
+        if comparison and kind != TEXT:
+            operator, operand = comparison.groups()
+            return Q(**{f"{lookup}__{COMPARISON_LOOKUPS[operator]}": self.parse(name, kind, operand.strip())})
+
+        if ".." in value and kind != TEXT:
+            low, high = (part.strip() for part in value.split("..", 1))
+            if not low and not high:
+                raise FilterError(f"{name} range needs at least one end")
+            condition = Q()
+            if low:
+                condition &= Q(**{f"{lookup}__gte": self.parse(name, kind, low)})
+            if high:
+                condition &= Q(**{f"{lookup}__lte": self.parse(name, kind, high)})
+            return condition
+
+        if kind != TEXT:
+            return Q(**{lookup: self.parse(name, kind, value)})
+        if value.startswith("=") and len(value) > 1:
+            return Q(**{f"{lookup}__iexact": value[1:]})
+        if value.endswith("*") and len(value) > 1:
+            return Q(**{f"{lookup}__istartswith": value[:-1]})
+        return Q(**{f"{lookup}__icontains": value})
+
+    def filters(self, names, values):
+        """
+        (Q, errors) for the filter rows given as parallel lists; rows with
+        an empty column or value are skipped, invalid ones are reported.
+        """
+        condition = Q()
+        errors = []
+        for name, value in zip(names, values):
+            if not name or not value.strip():
+                continue
+            try:
+                condition &= self.compile(name, value)
+            except FilterError as error:
+                errors.append(str(error))
+        return condition, errors
+
+    def order_by(self, name, order="asc"):
+        """(order_by string, error) for a sortable column, or the default sort."""
+        error = None
+        if name not in self.columns:
+            if name:
+                error = f"Cannot sort by unknown column: {name}"
+            name = self.default_sort
+        lookup = self.columns[name][0] if name in self.columns else name
+        return (f"-{lookup}" if order == "desc" else lookup), error
+
+
+CDSR_FILTERS = FilterSpec.for_model(CDSR, CDSR.display_fields())
+
+DDSR_FILTERS = FilterSpec.for_model(DDSR, DDSR.display_fields(), DDSR.lookup_for)
@@ -1,5 +1,6 @@
 from django import forms
 from .models import CDSR
+from register_management.models import Register
 
 # Register Choices
 REGISTER_CHOICES = [
@@ -18,7 +19,7 @@ REGISTER_CHOICES = [
 class ItemForm(forms.ModelForm):
     class Meta:
         model = CDSR
-        fields = '__all__'
+        exclude = ['register']
         widgets = {
             'date_of_purchase': forms.DateInput(attrs={'type': 'date'}),
         }
@@ -28,9 +29,9 @@ class ItemForm(forms.ModelForm):
         if self.instance and self.instance.date_of_purchase:
             self.fields['date_of_purchase'].initial = self.instance.date_of_purchase.strftime('%Y-%m-%d')
         
-        # Get all unique register names from the database
-        register_names = CDSR.objects.values_list('cdsr_name', flat=True).distinct()
-        register_choices = [(name, name) for name in register_names if name]
+        # All register names, including registers that have no items yet,
+        # from the cache kept by Register
+        register_choices = Register.choices()
         
         # Initialize cdsr_name field with choices
         self.fields['cdsr_name'] = forms.ChoiceField(
@@ -0,0 +1,255 @@
+"""
+Keyset (seek) pagination for the list views.
+
+Pages are ordered by the active sort column with the primary key as a
+tiebreaker, and each page is fetched with a WHERE on the last row seen
+instead of an OFFSET, so page 500 costs the same as page 1 and no COUNT(*)
+is needed. The position is carried in opaque, signed `cursor` values.
+
+Asking for `?page=N` still uses a Paginator, which keeps the page number UI
+available as a fallback; its count is cached (see counts).
+"""
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import F, Q
+
+from .counts import CachedCountPaginator
+from .result_cache import result_ids, rows_for
+
+KEYSET_PAGE_SIZE = 50
+CURSOR_SALT = "inventory.keyset"
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(direction, value, pk):
+    if value is not None and not isinstance(value, (int, float, str)):
+        value = str(value)
+    return signing.dumps([direction, value, pk], salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(cursor):
+    try:
+        direction, value, pk = signing.loads(cursor, salt=CURSOR_SALT)
+    except (signing.BadSignature, ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    if direction not in ("next", "prev"):
+        raise InvalidCursor(cursor)
+    return direction, value, pk
+
+
+def lookup_is_nullable(model, lookup):
+    """Whether any field along `lookup` (e.g. "cdsr__supplier") allows NULL."""
+    for part in lookup.split("__"):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            # An annotation, such as the search rank
+            return True
+        if field.null:
+            return True
+        model = field.related_model
+    return False
+
+
+def order_expression(lookup, descending):
+    """
+    Order by `lookup` with NULLs first when ascending and last when
+    descending, which is what MySQL and SQLite do natively.
+    """
+    if descending:
+        if connection.features.nulls_order_largest:
+            return F(lookup).desc(nulls_last=True)
+        return F(lookup).desc()
+    if connection.features.nulls_order_largest:
+        return F(lookup).asc(nulls_first=True)
+    return F(lookup).asc()
+
+
+def seek_filter(lookup, pk_name, value, pk, descending, nullable):
+    """Rows strictly after (value, pk) in the order given by order_expression()."""
+    after = "lt" if descending else "gt"
+    if lookup == pk_name:
+        return Q(**{f"{pk_name}__{after}": pk})
+
+    if value is None:
+        # NULLs come first ascending and last descending
+        nulls_after = Q(**{f"{lookup}__isnull": True, f"{pk_name}__{after}": pk})
+        return nulls_after if descending else nulls_after | Q(**{f"{lookup}__isnull": False})
+
+    # `col >= v AND (col > v OR pk > p)` keeps a plain range on the column
+    # that an index on it can serve, unlike the equivalent three-way OR
+    inclusive = "lte" if descending else "gte"
+    condition = Q(**{f"{lookup}__{inclusive}": value}) & (
+        Q(**{f"{lookup}__{after}": value}) | Q(**{f"{pk_name}__{after}": pk})
+    )
+    if descending and nullable:
+        condition |= Q(**{f"{lookup}__isnull": True})
+    return condition
+
+
+class KeysetPage:
+    """One page of rows with opaque cursors to the pages either side."""
+    is_keyset = True
+    paginator = None
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def split_order(queryset, order_by):
+    """(lookup, descending, pk name) of an "field" / "-field" sort."""
+    pk_name = queryset.model._meta.pk.name
+    lookup = order_by.lstrip("-")
+    return (pk_name if lookup == "pk" else lookup), order_by.startswith("-"), pk_name
+
+
+def ordered(queryset, lookup, descending, pk_name):
+    """`queryset` sorted by `lookup` then the primary key, with keyset_value set."""
+    if lookup != pk_name:
+        queryset = queryset.annotate(keyset_value=F(lookup))
+    return queryset.order_by(
+        order_expression(lookup, descending),
+        order_expression(pk_name, descending),
+    )
+
+
+def cursor_key(row, lookup, pk_name):
+    row_pk = getattr(row, pk_name)
+    return (row_pk if lookup == pk_name else row.keyset_value), row_pk
+
+
+def keyset_page(queryset, order_by, cursor=None, per_page=KEYSET_PAGE_SIZE):
+    """
+    Fetch one page of `queryset` ordered by `order_by` ("field" or "-field").
+
+    `cursor` is a value produced for a previous page, or None for the first
+    page. Raises InvalidCursor if it has been tampered with.
+    """
+    lookup, descending, pk_name = split_order(queryset, order_by)
+    direction, value, pk = ("next", None, None) if not cursor else decode_cursor(cursor)
+    backwards = direction == "prev"
+    walk_descending = descending != backwards
+
+    queryset = ordered(queryset, lookup, walk_descending, pk_name)
+    if cursor:
+        nullable = lookup != pk_name and lookup_is_nullable(queryset.model, lookup)
+        queryset = queryset.filter(
+            seek_filter(lookup, pk_name, value, pk, walk_descending, nullable)
+        )
+
+    rows = list(queryset[:per_page + 1])
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    has_next = has_more if not backwards else True
+    has_previous = has_more if backwards else cursor is not None
+    return page_with_cursors(rows, lookup, pk_name, has_next, has_previous)
+
+
+def page_with_cursors(rows, lookup, pk_name, has_next, has_previous):
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = encode_cursor("next", *cursor_key(rows[-1], lookup, pk_name))
+    if rows and has_previous:
+        previous_cursor = encode_cursor("prev", *cursor_key(rows[0], lookup, pk_name))
+    return KeysetPage(rows, next_cursor, previous_cursor)
+
+
+def by_pk(queryset, lookup, pk_name):
+    """
+    The model's rows with `queryset`'s joins, loaded columns and keyset_value
+    but none of its filters, for fetching cached ids. None when the sort is on an annotation
+    of `queryset` (such as the search rank) that only its filters define.
+    """
+    if lookup in queryset.query.annotations:
+        return None
+    rows = queryset.model._default_manager.all()
+    rows.query.select_related = queryset.query.select_related
+    rows.query.deferred_loading = queryset.query.deferred_loading
+    if lookup != pk_name:
+        rows = rows.annotate(keyset_value=F(lookup))
+    return rows
+
+
+def cached_keyset_page(queryset, order_by, cursor=None, per_page=KEYSET_PAGE_SIZE):
+    """
+    keyset_page() served from the cached id list of the whole result (see
+    result_cache), falling back to keyset_page() when it cannot be cached.
+    """
+    lookup, descending, pk_name = split_order(queryset, order_by)
+    direction, _, pk = ("next", None, None) if not cursor else decode_cursor(cursor)
+    sorted_queryset = ordered(queryset, lookup, descending, pk_name)
+    ids = result_ids(sorted_queryset)
+    if ids is None:
+        return keyset_page(queryset, order_by, cursor, per_page)
+
+    start, end = 0, min(per_page, len(ids))
+    if cursor:
+        try:
+            position = ids.index(pk)
+        except ValueError:
+            return keyset_page(queryset, order_by, cursor, per_page)
+        if direction == "prev":
+            start, end = max(position - per_page, 0), position
+        else:
+            start, end = position + 1, min(position + 1 + per_page, len(ids))
+
+    rows = by_pk(queryset, lookup, pk_name)
+    rows = rows_for(sorted_queryset if rows is None else rows, ids[start:end])
+    return page_with_cursors(rows, lookup, pk_name, end < len(ids), start > 0)
+
+
+def paginate(request, queryset, order_by, per_page=KEYSET_PAGE_SIZE, count_queryset=None,
+             cache_results=False):
+    """
+    Page of `queryset` for a list view: numbered when `?page=` is given,
+    otherwise keyset-paginated from `?cursor=`.
+
+    Numbered pages are counted from `count_queryset` when given, which should
+    hold the same rows as `queryset` without its display-only annotations.
+    With `cache_results`, the ordered ids of the whole result are cached and
+    each page fetches only its own rows.
+    """
+    page_number = request.GET.get("page")
+    if page_number:
+        if cache_results:
+            lookup, descending, pk_name = split_order(queryset, order_by)
+            sorted_queryset = ordered(queryset, lookup, descending, pk_name)
+            ids = result_ids(sorted_queryset)
+            if ids is not None:
+                page = Paginator(ids, per_page).get_page(page_number)
+                rows = by_pk(queryset, lookup, pk_name)
+                page.object_list = rows_for(sorted_queryset if rows is None else rows, page.object_list)
+                return page
+        paginator = CachedCountPaginator(queryset.order_by(order_by), per_page, count_queryset)
+        return paginator.get_page(page_number)
+
+    page = cached_keyset_page if cache_results else keyset_page
+    try:
+        return page(queryset, order_by, request.GET.get("cursor"), per_page)
+    except InvalidCursor:
+        return page(queryset, order_by, None, per_page)
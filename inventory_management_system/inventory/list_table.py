@@ -0,0 +1,83 @@
+"""
+Ready-made pieces of the list view tables.
+
+The list templates used to render every cell through the dict_key filter
+and rebuild each sort and pagination link from the filter lists with
+zip_list. The views now hand them the finished pieces instead: header
+labels with their sort links, row tuples of cells that are already
+localized and escaped, and one encoded query string of the current list
+that every page link appends. `manage.py benchmark_list_render` compares
+the two ways of rendering a page.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.template.defaultfilters import title
+from django.utils import dateformat
+from django.utils.formats import get_format, localize
+from django.utils.html import conditional_escape
+
+# Parameters that choose a page or an export rather than the rows listed
+PAGING_PARAMS = ("page", "cursor", "export", "background", "compress")
+
+
+def list_query(request, *exclude):
+    """Encoded query string of the current list, without its paging parameters."""
+    query = request.GET.copy()
+    for name in PAGING_PARAMS + exclude:
+        query.pop(name, None)
+    return query.urlencode()
+
+
+def headers(request, columns, sort_by, order):
+    """(label, sort link, sort direction or None) for each column header."""
+    rest = list_query(request, "sort_by", "order")
+    rest = f"&{rest}" if rest else ""
+    result = []
+    for column in columns:
+        active = column == sort_by
+        link = f"?sort_by={column}&order={'desc' if active and order == 'asc' else 'asc'}{rest}"
+        direction = ("up" if order == "asc" else "down") if active else None
+        result.append((title(column), link, direction))
+    return result
+
+
+def cell(value):
+    """`value` as the template would render it, localized and escaped."""
+    return conditional_escape(localize(value))
+
+
+def cell_formatter():
+    """
+    cell() for one page. The active locale's date format is looked up once,
+    and strings and (without thousand separators) integers skip localize(),
+    which would return them unchanged.
+    """
+    date_format = get_format("DATE_FORMAT")
+    plain_integers = not settings.USE_THOUSAND_SEPARATOR
+
+    def format_cell(value):
+        kind = type(value)
+        if kind is str or (kind is int and plain_integers):
+            return conditional_escape(value)
+        if kind is date:
+            return conditional_escape(dateformat.format(value, date_format))
+        return cell(value)
+
+    return format_cell
+
+
+def row_tuples(items, lookups):
+    """(item, cells) for each item of a page, with cells in column order."""
+    format_cell = cell_formatter()
+    paths = [lookup.split("__") for lookup in lookups]
+    rows = []
+    for item in items:
+        cells = []
+        for path in paths:
+            value = item
+            for part in path:
+                value = getattr(value, part) if value is not None else None
+            cells.append(format_cell(value))
+        rows.append((item, tuple(cells)))
+    return rows
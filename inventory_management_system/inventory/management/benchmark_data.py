@@ -0,0 +1,44 @@
+"""
+Synthetic CDSR rows for the benchmark commands.
+
+The commands call seed_items() inside a transaction they roll back, so
+nothing seeded here outlives the benchmark.
+"""
+from datetime import date
+
+from inventory.models import CDSR
+
+SEED_BATCH_SIZE = 5000
+
+
+def benchmark_item(number):
+    """An unsaved CDSR row of ten units, numbered `number`."""
+    return CDSR(
+        cdsr_name="Benchmark Register",
+        cdsr_no=number,
+        cdsr_pg_no=number // 50,
+        date_of_purchase=date(2025, 1, 1),
+        product_category="Benchmark",
+        product_description=f"Benchmark item {number}",
+        product_quantity=10,
+        remaining_quantity=10,
+        single_cost=100,
+        total_cost=1000,
+        purchase_year="2025",
+        supplier="Benchmark Supplier",
+        writeoff_status="Active",
+    )
+
+
+def seed_items(count, build=benchmark_item, after_batch=None):
+    """
+    Insert `count` rows made by `build(number)` in batches of SEED_BATCH_SIZE.
+
+    `after_batch`, if given, is called with each list of created rows.
+    """
+    for start in range(0, count, SEED_BATCH_SIZE):
+        items = CDSR.objects.bulk_create(
+            [build(number) for number in range(start, min(start + SEED_BATCH_SIZE, count))]
+        )
+        if after_batch is not None:
+            after_batch(items)
@@ -0,0 +1,100 @@
+"""
+Benchmark a 50-row inventory list page with all columns against the same
+page limited to a user's chosen columns.
+
+The command inserts --rows CDSR rows inside a transaction, then times both
+ways of producing one page: the full path (every field loaded, each cell
+rendered through the dict_key filter) and the projected path (only() on the
+chosen columns, cells rendered from row tuples). It reports query and
+render time, best of --repeat runs, and the size of the rendered table. The
+rows are rolled back afterwards.
+
+    python manage.py benchmark_columns
+    python manage.py benchmark_columns --columns cdsr_no product_description supplier
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template import engines
+
+from inventory.columns import project
+from inventory.list_table import row_tuples
+from inventory.management.benchmark_data import seed_items
+from inventory.models import CDSR
+
+DEFAULT_COLUMNS = ["cdsr_no", "date_of_purchase", "product_description", "product_quantity",
+                   "remaining_quantity", "total_cost"]
+
+# The table body of inventory_list.html before and after column projection
+FULL_TEMPLATE = """{% load custom_filters %}{% for item in items %}<tr>
+{% for field in fields %}<td>{{ item|dict_key:field }}</td>
+{% endfor %}</tr>
+{% endfor %}"""
+
+PROJECTED_TEMPLATE = """{% for item, row in rows %}<tr>
+{% for value in row %}<td>{{ value }}</td>
+{% endfor %}</tr>
+{% endfor %}"""
+
+
+def best_time(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    return result, min(timings)
+
+
+class Command(BaseCommand):
+    help = "Compare a full and a column-projected inventory list page."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000,
+                            help="Rows in the table while benchmarking.")
+        parser.add_argument("--page-size", type=int, default=50,
+                            help="Rows on the page.")
+        parser.add_argument("--columns", nargs="+", default=DEFAULT_COLUMNS,
+                            help="Columns the user has chosen.")
+        parser.add_argument("--repeat", type=int, default=20,
+                            help="Runs per measurement; the fastest is reported.")
+
+    def handle(self, *args, **options):
+        fields = CDSR.display_fields()
+        columns = [field for field in fields if field in options["columns"]]
+        page_size = options["page_size"]
+        repeat = options["repeat"]
+        full_template = engines["django"].from_string(FULL_TEMPLATE)
+        projected_template = engines["django"].from_string(PROJECTED_TEMPLATE)
+
+        with transaction.atomic():
+            seed_items(options["rows"])
+            queryset = CDSR.objects.order_by("cdsr_id")
+
+            items, full_query = best_time(lambda: list(queryset[:page_size]), repeat)
+            full_html, full_render = best_time(
+                lambda: full_template.render({"items": items, "fields": fields}), repeat
+            )
+            projected, projected_query = best_time(
+                lambda: list(project(queryset, columns)[:page_size]), repeat
+            )
+            projected_html, projected_render = best_time(
+                lambda: projected_template.render({"rows": row_tuples(projected, columns)}), repeat
+            )
+            transaction.set_rollback(True)
+
+        self.stdout.write(
+            f"{page_size} rows of {options['rows']}; {len(fields)} columns vs {len(columns)}"
+        )
+        self.stdout.write(f"{'':<10} {'query ms':>9} {'render ms':>10} {'total ms':>9} {'html KiB':>9}")
+        for name, query_time, render_time, html in (
+            ("full", full_query, full_render, full_html),
+            ("projected", projected_query, projected_render, projected_html),
+        ):
+            self.stdout.write(
+                f"{name:<10} {query_time * 1000:>9.2f} {render_time * 1000:>10.2f} "
+                f"{(query_time + render_time) * 1000:>9.2f} {len(html) / 1024:>9.1f}"
+            )
+        speedup = (full_query + full_render) / (projected_query + projected_render)
+        self.stdout.write(f"speedup: {speedup:.1f}x")
@@ -0,0 +1,71 @@
+"""
+Benchmark the streaming CSV export at several table sizes.
+
+For each size the command inserts that many CDSR rows inside a transaction,
+streams them through the same code the list views use, and rolls the rows
+back afterwards. It reports rows per second, bytes written and the peak RSS
+of the process (which only ever grows, so sizes are run smallest first).
+
+    python manage.py benchmark_csv_export
+    python manage.py benchmark_csv_export --rows 10000 100000 --gzip
+"""
+import resource
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.csv_export import csv_stream
+from inventory.management.benchmark_data import seed_items
+from inventory.models import CDSR
+
+DEFAULT_ROW_COUNTS = [10_000, 100_000, 1_000_000]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return peak / divisor
+
+
+def run_export(compress):
+    """Stream the whole CDSR table and return (rows, bytes, seconds)."""
+    queryset = CDSR.objects.order_by("cdsr_id")
+    fields = CDSR.display_fields()
+    started = time.perf_counter()
+    size = 0
+    for block in csv_stream(queryset, fields, compress=compress):
+        size += len(block)
+    elapsed = time.perf_counter() - started
+    return queryset.count(), size, elapsed
+
+
+class Command(BaseCommand):
+    help = "Measure CSV export throughput and peak memory at several table sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROW_COUNTS,
+                            help="Row counts to benchmark.")
+        parser.add_argument("--gzip", action="store_true",
+                            help="Benchmark the gzip-compressed export.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'rows':>10} {'seconds':>9} {'rows/s':>10} {'MiB out':>9} "
+            f"{'RSS before':>11} {'RSS peak':>9}"
+        )
+        for count in sorted(options["rows"]):
+            with transaction.atomic():
+                seed_items(count)
+                rss_before = peak_rss_mb()
+                rows, size, elapsed = run_export(options["gzip"])
+                rss_peak = peak_rss_mb()
+                transaction.set_rollback(True)
+
+            self.stdout.write(
+                f"{rows:>10} {elapsed:>9.2f} {rows / elapsed:>10.0f} "
+                f"{size / 1024 / 1024:>9.1f} {rss_before:>10.1f}M {rss_peak:>8.1f}M"
+            )
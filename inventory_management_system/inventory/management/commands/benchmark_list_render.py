@@ -0,0 +1,150 @@
+"""
+Benchmark rendering the inventory list table the old way against the
+pre-built headers, row tuples and list query string of inventory.list_table.
+
+No database is touched: each page is built from unsaved CDSR instances.
+The old path renders every cell through dict_key and rebuilds each sort and
+page link from the filter lists with zip_list; the new path includes the
+time to build its headers, rows and query string in Python. Both render the
+table head, body and the five numbered page links, best of --repeat runs.
+
+    python manage.py benchmark_list_render
+    python manage.py benchmark_list_render --page-sizes 50 200 1000 --repeat 20
+"""
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.test import RequestFactory
+
+from inventory.list_table import headers, list_query, row_tuples
+from inventory.models import CDSR
+
+DEFAULT_PAGE_SIZES = [50, 200, 1000]
+
+# Query string of a list with two filters, a date range, a search and a sort
+LIST_PARAMS = {
+    "sort_by": "supplier",
+    "order": "asc",
+    "filter_field": ["product_category", "supplier"],
+    "filter_value": ["computer", "acme*"],
+    "from_date": "2024-01-01",
+    "to_date": "2025-12-31",
+    "q": "dell laptop",
+    "page": "3",
+}
+
+OLD_LINK = (
+    '{% if sort_by %}&sort_by={{ sort_by }}&order={{ order }}{% endif %}'
+    '{% for field, value in filter_fields|zip_list:filter_values %}&filter_field={{ field }}&filter_value={{ value }}{% endfor %}'
+    '{% if from_date %}&from_date={{ from_date }}{% endif %}{% if to_date %}&to_date={{ to_date }}{% endif %}'
+    '{% if query %}&q={{ query|urlencode }}{% endif %}'
+)
+
+# The table of inventory_list.html before list_table
+OLD_TEMPLATE = (
+    "{% load custom_filters %}<thead><tr>{% for field in fields %}<th>"
+    "<a href=\"?sort_by={{ field }}&order={% if sort_by == field and order == 'asc' %}desc{% else %}asc{% endif %}"
+    "{% for field, value in filter_fields|zip_list:filter_values %}&filter_field={{ field }}&filter_value={{ value }}{% endfor %}"
+    "{% if from_date %}&from_date={{ from_date }}{% endif %}{% if to_date %}&to_date={{ to_date }}{% endif %}"
+    "{% if query %}&q={{ query|urlencode }}{% endif %}\">{{ field|title }}"
+    "{% if sort_by == field %}<i class=\"fas fa-sort-{% if order == 'asc' %}up{% else %}down{% endif %}\"></i>{% endif %}"
+    "</a></th>{% endfor %}</tr></thead>\n<tbody>{% for item in items %}<tr>\n"
+    "{% for field in fields %}<td>{{ item|dict_key:field }}</td>\n{% endfor %}"
+    "<td><a href=\"/inventory/edit-item/{{ item.cdsr_id }}/\">Edit</a></td></tr>\n{% endfor %}</tbody>\n"
+    "{% for num in pages %}<a href=\"?page={{ num }}" + OLD_LINK + "\">{{ num }}</a>{% endfor %}"
+)
+
+NEW_TEMPLATE = (
+    "<thead><tr>{% for label, link, direction in headers %}<th>"
+    "<a href=\"{{ link }}\">{{ label }}"
+    "{% if direction %}<i class=\"fas fa-sort-{{ direction }}\"></i>{% endif %}"
+    "</a></th>{% endfor %}</tr></thead>\n<tbody>{% for item, row in rows %}<tr>\n"
+    "{% for value in row %}<td>{{ value }}</td>\n{% endfor %}"
+    "<td><a href=\"/inventory/edit-item/{{ item.cdsr_id }}/\">Edit</a></td></tr>\n{% endfor %}</tbody>\n"
+    "{% for num in pages %}<a href=\"?page={{ num }}{% if list_query %}&{{ list_query }}{% endif %}\">{{ num }}</a>{% endfor %}"
+)
+
+
+def page_items(count):
+    """`count` unsaved CDSR rows with every display column filled in."""
+    return [
+        CDSR(
+            cdsr_id=number,
+            cdsr_no=number,
+            cdsr_pg_no=number // 50,
+            active_product=1,
+            cdsr_name="C/S DSR/CC",
+            date_of_purchase=date(2025, 1, 1 + number % 28),
+            product_category="Computer",
+            product_description=f"Dell laptop SN{number}",
+            product_quantity=10,
+            product_type="Non-consumable",
+            purchase_authority="Principal",
+            purchase_year="2025",
+            remaining_quantity=number % 10,
+            single_cost=45_000,
+            supplier="Acme Supplies",
+            total_cost=450_000,
+            writeoff_status=None,
+        )
+        for number in range(1, count + 1)
+    ]
+
+
+def best_time(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    return result, min(timings)
+
+
+class Command(BaseCommand):
+    help = "Compare old and pre-built rendering of the inventory list table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-sizes", type=int, nargs="+", default=DEFAULT_PAGE_SIZES,
+                            help="Rows per page to benchmark.")
+        parser.add_argument("--repeat", type=int, default=10,
+                            help="Runs per measurement; the fastest is reported.")
+
+    def handle(self, *args, **options):
+        old_template = engines["django"].from_string(OLD_TEMPLATE)
+        new_template = engines["django"].from_string(NEW_TEMPLATE)
+        request = RequestFactory().get("/inventory/inventory-list/", LIST_PARAMS)
+        fields = CDSR.display_fields()
+        pages = range(1, 6)
+
+        def render_old(items):
+            return old_template.render({
+                "items": items,
+                "fields": fields,
+                "pages": pages,
+                "sort_by": request.GET.get("sort_by", ""),
+                "order": request.GET.get("order", "asc"),
+                "filter_fields": request.GET.getlist("filter_field"),
+                "filter_values": request.GET.getlist("filter_value"),
+                "from_date": request.GET.get("from_date"),
+                "to_date": request.GET.get("to_date"),
+                "query": request.GET.get("q", ""),
+            })
+
+        def render_new(items):
+            return new_template.render({
+                "rows": row_tuples(items, fields),
+                "headers": headers(request, fields, request.GET.get("sort_by", ""), "asc"),
+                "list_query": list_query(request),
+                "pages": pages,
+            })
+
+        self.stdout.write(f"{'rows':>6} {'old ms':>9} {'new ms':>9} {'speedup':>8}")
+        for page_size in options["page_sizes"]:
+            items = page_items(page_size)
+            _, old_time = best_time(lambda: render_old(items), options["repeat"])
+            _, new_time = best_time(lambda: render_new(items), options["repeat"])
+            self.stdout.write(
+                f"{page_size:>6} {old_time * 1000:>9.2f} {new_time * 1000:>9.2f} {old_time / new_time:>7.1f}x"
+            )
@@ -0,0 +1,105 @@
+"""
+Benchmark the list search box against the icontains filter it replaces.
+
+For each size the command inserts that many CDSR rows with varied text
+inside a transaction, indexes them, and times a few queries both ways: the
+old path (`icontains` on each searchable field, every term required) and
+inventory.search. Each timing covers the match count plus the first page of
+50 rows, best of --repeat runs. The rows are rolled back afterwards.
+
+    python manage.py benchmark_search
+    python manage.py benchmark_search --rows 10000 --query "dell laptop"
+"""
+import time
+from datetime import date
+from functools import reduce
+from operator import and_, or_
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from inventory.management.benchmark_data import seed_items
+from inventory.models import CDSR
+from inventory.search import SEARCH_FIELDS, index_items, search, search_terms, uses_fulltext
+
+DEFAULT_ROW_COUNTS = [10_000, 100_000]
+# From a handful of rows (serial number prefix) to half the table
+DEFAULT_QUERIES = ["sn1234", "projector", "dell laptop", "furn", "steel cupboard godrej"]
+PAGE_SIZE = 50
+
+DESCRIPTIONS = ["Dell laptop", "HP desktop", "Epson projector", "Steel cupboard", "Office chair",
+                "Lab microscope", "Oscilloscope", "Whiteboard", "Printer cartridge", "Lathe machine"]
+CATEGORIES = ["Computer", "Electronics", "Furniture", "Laboratory", "Machinery", "Stationery"]
+SUPPLIERS = ["Godrej", "Vision Traders", "Acme Supplies", "Sharma Electronics", "Metro Furniture"]
+AUTHORITIES = ["Principal", "Purchase Committee", "Head of Department"]
+REGISTERS = ["C/S DSR/CC", "C/S DSR/M&E", "C/S DSR/LAB", "C/S DSR/FURN"]
+
+
+def search_item(number):
+    """An unsaved CDSR row cycling through the vocabulary above."""
+    return CDSR(
+        cdsr_name=REGISTERS[number % len(REGISTERS)],
+        date_of_purchase=date(2025, 1, 1),
+        product_category=CATEGORIES[number % len(CATEGORIES)],
+        product_description=f"{DESCRIPTIONS[number % len(DESCRIPTIONS)]} SN{number}",
+        purchase_authority=AUTHORITIES[number % len(AUTHORITIES)],
+        supplier=SUPPLIERS[number % len(SUPPLIERS)],
+        product_quantity=1,
+        remaining_quantity=1,
+        purchase_year="2025",
+    )
+
+
+def icontains_queryset(query):
+    """The old filter-bar path: each term must appear in some searchable field."""
+    return CDSR.objects.filter(reduce(and_, [
+        reduce(or_, [Q(**{f"{field}__icontains": term}) for field in SEARCH_FIELDS])
+        for term in search_terms(query)
+    ]))
+
+
+def best_time(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - started)
+    return result, min(timings)
+
+
+class Command(BaseCommand):
+    help = "Compare the search index with icontains filtering at several table sizes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROW_COUNTS,
+                            help="Row counts to benchmark.")
+        parser.add_argument("--query", nargs="+", default=DEFAULT_QUERIES,
+                            help="Search box queries to time.")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="Runs per query; the fastest is reported.")
+
+    def handle(self, *args, **options):
+        backend = "FULLTEXT" if uses_fulltext() else "token table"
+        self.stdout.write(f"Search backend: {backend}")
+        self.stdout.write(
+            f"{'rows':>8} {'query':<24} {'matches':>8} {'icontains ms':>13} {'search ms':>10} {'speedup':>8}"
+        )
+        for count in sorted(options["rows"]):
+            with transaction.atomic():
+                seed_items(count, build=search_item, after_batch=None if uses_fulltext() else index_items)
+                for query in options["query"]:
+                    old = icontains_queryset(query)
+                    new = search(CDSR.objects.all(), query)
+                    (matches, _), old_time = best_time(
+                        lambda: (old.count(), list(old.order_by("pk")[:PAGE_SIZE])), options["repeat"]
+                    )
+                    (_, _), new_time = best_time(
+                        lambda: (new.count(), list(new.order_by("-search_rank", "pk")[:PAGE_SIZE])),
+                        options["repeat"],
+                    )
+                    self.stdout.write(
+                        f"{count:>8} {query:<24} {matches:>8} {old_time * 1000:>13.1f} "
+                        f"{new_time * 1000:>10.1f} {old_time / new_time:>7.1f}x"
+                    )
+                transaction.set_rollback(True)
@@ -0,0 +1,117 @@
+"""
+Report which view queries each CDSR, DDSR, Register and ledger index serves.
+
+Runs EXPLAIN for a representative query of every list view and dashboard,
+then maps the index names found in the plans back to the views. Indexes no
+query uses are listed separately, since they only add write cost.
+
+    python manage.py index_report
+    python manage.py index_report --department "Workshop" -v 2
+"""
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from accounts.models import Department
+from inventory.activity_feed import activity_queryset
+from inventory.dashboard_stats import add_months, month_starts
+from inventory.models import CDSR, DDSR, AllocationEntry
+from register_management.models import Register
+from stock_management.ledger import department_timeline, item_timeline
+
+
+def view_queries(department, register, item_id):
+    """(view, description, queryset) for the hot query of each view."""
+    today = timezone.localdate()
+    starts = month_starts(today=today)
+    series_range = {
+        "date_of_receive__gte": starts[0],
+        "date_of_receive__lt": add_months(starts[-1], 1),
+    }
+
+    return [
+        ("inventory:admin_dashboard", "monthly allocation series",
+         DDSR.objects.filter(**series_range)
+         .annotate(month=TruncMonth("date_of_receive"))
+         .values("month").annotate(count=Count("pk")).order_by()),
+        ("inventory:admin_dashboard", "recent activity feed",
+         activity_queryset()[:10]),
+        ("inventory:admin_dashboard", "yearly value",
+         CDSR.objects.filter(purchase_year=str(today.year)).values("total_cost")),
+        ("inventory:admin_dashboard", "active items",
+         CDSR.objects.filter(writeoff_status__isnull=True).values("cdsr_id")),
+        ("inventory:department_dashboard", "department statistics",
+         DDSR.objects.filter(department=department, **series_range)),
+        ("inventory:department_dashboard", "recent items",
+         DDSR.objects.filter(department=department).order_by("-date_of_receive")[:10]),
+        ("inventory:department_inventory_list", "date range",
+         DDSR.objects.filter(department=department, date_of_receive__gte=starts[0])),
+        ("inventory:inventory_list", "purchase date range",
+         CDSR.objects.filter(date_of_purchase__gte=starts[0])),
+        ("register_management:manage_stock_by_register", "register totals",
+         Register.objects.order_by("name")),
+        ("register_management:register_inventory_list", "register items",
+         CDSR.objects.filter(register=register)),
+        ("stock_management:cdsr_allocation_list", "allocated filter",
+         CDSR.objects.filter(remaining_quantity=0)),
+        ("stock_management:allocate_form", "item allocations",
+         DDSR.objects.filter(cdsr_id=item_id)),
+        ("stock_management:item_history", "item ledger",
+         item_timeline(item_id)[:25]),
+        ("stock_management:department_history", "department ledger",
+         department_timeline(department.pk if department else None)[:25]),
+    ]
+
+
+def table_indexes(model):
+    """Names of the secondary indexes that exist on the model's table."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+    return sorted(
+        name for name, info in constraints.items()
+        if info["index"] and not info["primary_key"]
+    )
+
+
+class Command(BaseCommand):
+    help = "Show which view queries use each index on the CDSR, DDSR, Register and ledger tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--department", default="Computer Technology",
+                            help="Name of the department used for the department view queries.")
+        parser.add_argument("--register", default="C/S DSR/M&E",
+                            help="Register used for the register view queries.")
+        parser.add_argument("--item-id", type=int, default=1,
+                            help="CDSR id used for the allocation queries.")
+
+    def handle(self, *args, **options):
+        indexes = {model: table_indexes(model) for model in (CDSR, DDSR, Register, AllocationEntry)}
+        served_by = {name: [] for names in indexes.values() for name in names}
+
+        department = Department.objects.filter(name=options["department"]).first()
+        register = Register.objects.filter(name=options["register"]).first()
+        for view, description, queryset in view_queries(department, register, options["item_id"]):
+            plan = queryset.explain()
+            used = [name for name in served_by if re.search(rf"\b{re.escape(name)}\b", plan)]
+            for name in used:
+                served_by[name].append(f"{view} ({description})")
+            if options["verbosity"] > 1:
+                self.stdout.write(f"\n{view} - {description}\n{plan}")
+            if not used:
+                self.stdout.write(self.style.WARNING(
+                    f"No index used by {view} ({description})"
+                ))
+
+        for model, names in indexes.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{model._meta.db_table}"))
+            for name in names:
+                self.stdout.write(f"  {name}")
+                if served_by[name]:
+                    for usage in served_by[name]:
+                        self.stdout.write(f"      {usage}")
+                else:
+                    self.stdout.write(self.style.WARNING("      unused by the sampled queries"))
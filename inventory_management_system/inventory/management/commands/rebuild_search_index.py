@@ -0,0 +1,36 @@
+"""
+Rebuild the SearchToken rows behind the list search box.
+
+Items saved through the ORM are indexed as they are saved; this is for rows
+written around it (bulk loads, raw SQL) or after SEARCH_FIELDS change. On
+MySQL the FULLTEXT index maintains itself and there is nothing to rebuild.
+
+    python manage.py rebuild_search_index
+"""
+from django.core.management.base import BaseCommand
+
+from inventory.models import CDSR
+from inventory.search import SEARCH_FIELDS, index_items, uses_fulltext
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search token index of every CDSR item."
+
+    def handle(self, *args, **options):
+        if uses_fulltext():
+            self.stdout.write("MySQL maintains the FULLTEXT search index itself.")
+            return
+
+        items = CDSR.objects.only("cdsr_id", *SEARCH_FIELDS).order_by("cdsr_id")
+        total = 0
+        last_id = 0
+        while True:
+            batch = list(items.filter(cdsr_id__gt=last_id)[:BATCH_SIZE])
+            if not batch:
+                break
+            index_items(batch)
+            total += len(batch)
+            last_id = batch[-1].cdsr_id
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} items."))
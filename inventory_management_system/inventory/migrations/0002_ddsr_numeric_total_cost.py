@@ -0,0 +1,60 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+from django.db.models.functions import Cast
+
+
+def parse_cost(value):
+    """Convert a legacy varchar cost ('47966', ' 1,200.00 ', 'NULL') to an int."""
+    if value is None:
+        return None
+    cleaned = str(value).strip().replace(",", "")
+    if not cleaned or cleaned.upper() == "NULL":
+        return None
+    try:
+        return int(Decimal(cleaned).to_integral_value())
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def copy_costs_forward(apps, schema_editor):
+    DDSR = apps.get_model("inventory", "DDSR")
+    batch = []
+    for row in DDSR.objects.only("ddsr_id", "total_cost").iterator(chunk_size=2000):
+        row.total_cost_amount = parse_cost(row.total_cost)
+        batch.append(row)
+        if len(batch) >= 2000:
+            DDSR.objects.bulk_update(batch, ["total_cost_amount"])
+            batch = []
+    if batch:
+        DDSR.objects.bulk_update(batch, ["total_cost_amount"])
+
+
+def copy_costs_backward(apps, schema_editor):
+    DDSR = apps.get_model("inventory", "DDSR")
+    DDSR.objects.update(total_cost=Cast("total_cost_amount", models.CharField()))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ddsr",
+            name="total_cost_amount",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(copy_costs_forward, copy_costs_backward),
+        migrations.RemoveField(
+            model_name="ddsr",
+            name="total_cost",
+        ),
+        migrations.RenameField(
+            model_name="ddsr",
+            old_name="total_cost_amount",
+            new_name="total_cost",
+        ),
+    ]
@@ -0,0 +1,134 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# DDSR column -> CDSR column for the values that are now read through the join.
+COPIED_COLUMNS = {
+    "cdsr_name": "cdsr_name",
+    "product_category": "product_category",
+    "product_description": "product_description",
+    "supplier_name": "supplier",
+    "cost_unit": "single_cost",
+}
+
+BATCH_SIZE = 1000
+
+
+def backfill(apps, schema_editor):
+    """
+    Point every DDSR row that can be linked at its CDSR row before the
+    constraint is added.
+
+    Rows without a cdsr_table_id are matched on register, CDSR number, page
+    and description when that identifies exactly one CDSR row. Rows that
+    still reference nothing, or reference a missing CDSR row, are left with
+    a NULL cdsr (the field allows it) rather than blocking the migration.
+    Their copied columns and the id they referred to are kept in
+    UnlinkedDDSR, so nothing is lost when the columns are dropped and the
+    rows can be linked by hand afterwards.
+    """
+    CDSR = apps.get_model("inventory", "CDSR")
+    DDSR = apps.get_model("inventory", "DDSR")
+    UnlinkedDDSR = apps.get_model("inventory", "UnlinkedDDSR")
+
+    unlinked = DDSR.objects.filter(cdsr_table_id__isnull=True)
+    for row in unlinked.iterator():
+        matches = list(
+            CDSR.objects.filter(
+                cdsr_name=row.cdsr_name,
+                cdsr_no=row.cdsr_no,
+                cdsr_pg_no=row.cdsr_page_no,
+                product_description=row.product_description,
+            ).values_list("cdsr_id", flat=True)[:2]
+        )
+        if len(matches) == 1:
+            DDSR.objects.filter(ddsr_id=row.ddsr_id).update(cdsr_table_id=matches[0])
+
+    orphans = DDSR.objects.exclude(cdsr_table_id__in=CDSR.objects.values("cdsr_id"))
+    kept = []
+    for values in orphans.values("ddsr_id", "cdsr_table_id", *COPIED_COLUMNS).iterator():
+        kept.append(UnlinkedDDSR(**values))
+        if len(kept) == BATCH_SIZE:
+            UnlinkedDDSR.objects.bulk_create(kept)
+            kept = []
+    UnlinkedDDSR.objects.bulk_create(kept)
+    # A dangling id would fail the foreign key constraint
+    orphans.update(cdsr_table_id=None)
+
+    count = UnlinkedDDSR.objects.count()
+    if count:
+        print(f"\n  {count} DDSR rows left without a CDSR item, kept in inventory_unlinkedddsr")
+
+
+def restore_copied_columns(apps, schema_editor):
+    CDSR = apps.get_model("inventory", "CDSR")
+    DDSR = apps.get_model("inventory", "DDSR")
+    UnlinkedDDSR = apps.get_model("inventory", "UnlinkedDDSR")
+    for ddsr_column, cdsr_column in COPIED_COLUMNS.items():
+        DDSR.objects.update(**{
+            ddsr_column: models.Subquery(
+                CDSR.objects.filter(cdsr_id=models.OuterRef("cdsr_table_id"))
+                .values(cdsr_column)[:1]
+            )
+        })
+    for values in UnlinkedDDSR.objects.values("ddsr_id", "cdsr_table_id", *COPIED_COLUMNS).iterator():
+        DDSR.objects.filter(ddsr_id=values.pop("ddsr_id")).update(**values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0002_ddsr_numeric_total_cost"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UnlinkedDDSR",
+            fields=[
+                (
+                    "ddsr",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="unlinked",
+                        serialize=False,
+                        to="inventory.ddsr",
+                    ),
+                ),
+                ("cdsr_table_id", models.BigIntegerField(blank=True, null=True)),
+                ("cdsr_name", models.CharField(blank=True, max_length=255, null=True)),
+                ("product_category", models.CharField(blank=True, max_length=255, null=True)),
+                ("product_description", models.CharField(blank=True, max_length=255, null=True)),
+                ("supplier_name", models.CharField(blank=True, max_length=255, null=True)),
+                ("cost_unit", models.CharField(blank=True, max_length=255, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill, restore_copied_columns),
+        # Keep the existing cdsr_table_id column while the field becomes "cdsr".
+        migrations.AlterField(
+            model_name="ddsr",
+            name="cdsr_table_id",
+            field=models.BigIntegerField(blank=True, db_column="cdsr_table_id", null=True),
+        ),
+        migrations.RenameField(
+            model_name="ddsr",
+            old_name="cdsr_table_id",
+            new_name="cdsr",
+        ),
+        migrations.AlterField(
+            model_name="ddsr",
+            name="cdsr",
+            field=models.ForeignKey(
+                blank=True,
+                db_column="cdsr_table_id",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="allocations",
+                to="inventory.cdsr",
+            ),
+        ),
+        migrations.RemoveField(model_name="ddsr", name="cdsr_name"),
+        migrations.RemoveField(model_name="ddsr", name="product_category"),
+        migrations.RemoveField(model_name="ddsr", name="product_description"),
+        migrations.RemoveField(model_name="ddsr", name="supplier_name"),
+        migrations.RemoveField(model_name="ddsr", name="cost_unit"),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0003_ddsr_cdsr_foreign_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="cdsr",
+            index=models.Index(fields=["cdsr_name"], name="cdsr_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="cdsr",
+            index=models.Index(
+                fields=["date_of_purchase"], name="cdsr_purchase_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cdsr",
+            index=models.Index(
+                fields=["purchase_year"], name="cdsr_purchase_year_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="cdsr",
+            index=models.Index(fields=["writeoff_status"], name="cdsr_writeoff_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="cdsr",
+            index=models.Index(
+                fields=["remaining_quantity"], name="cdsr_remaining_qty_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ddsr",
+            index=models.Index(
+                fields=["department", "date_of_receive"], name="ddsr_dept_receive_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ddsr",
+            index=models.Index(fields=["date_of_receive"], name="ddsr_receive_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="ddsr",
+            index=models.Index(
+                fields=["cdsr", "department", "date_of_receive"],
+                name="ddsr_item_dept_receive_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+# Placeholder rows that add_register used to create so an empty register
+# would show up in the register overview.
+DUMMY_ROW = {
+    "product_description": "Register Created",
+    "product_category": "System",
+    "product_type": "System",
+    "product_quantity": 0,
+    "single_cost": 0,
+    "total_cost": 0,
+    "remaining_quantity": 0,
+}
+
+
+def link_registers(apps, schema_editor):
+    CDSR = apps.get_model("inventory", "CDSR")
+    Register = apps.get_model("register_management", "Register")
+
+    names = (
+        CDSR.objects.exclude(cdsr_name__isnull=True)
+        .exclude(cdsr_name="")
+        .values_list("cdsr_name", flat=True)
+        .distinct()
+    )
+    for name in names:
+        register, _ = Register.objects.get_or_create(name=name)
+        CDSR.objects.filter(cdsr_name=name).update(register=register)
+
+    CDSR.objects.filter(**DUMMY_ROW, allocations__isnull=True).delete()
+
+    totals = (
+        CDSR.objects.exclude(register__isnull=True)
+        .values("register")
+        .annotate(item_count=models.Count("cdsr_id"), total_value=models.Sum("total_cost"))
+        .order_by()
+    )
+    for row in totals:
+        Register.objects.filter(pk=row["register"]).update(
+            item_count=row["item_count"], total_value=row["total_value"] or 0
+        )
+
+
+def restore_dummy_rows(apps, schema_editor):
+    CDSR = apps.get_model("inventory", "CDSR")
+    Register = apps.get_model("register_management", "Register")
+    now = django.utils.timezone.now()
+    for register in Register.objects.filter(item_count=0):
+        CDSR.objects.create(
+            cdsr_name=register.name,
+            cdsr_no="0",
+            cdsr_pg_no="0",
+            date_of_purchase=now,
+            purchase_year=str(now.year),
+            **DUMMY_ROW,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0004_secondary_indexes"),
+        ("register_management", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cdsr",
+            name="register",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="items",
+                to="register_management.register",
+            ),
+        ),
+        migrations.RunPython(link_registers, restore_dummy_rows),
+    ]
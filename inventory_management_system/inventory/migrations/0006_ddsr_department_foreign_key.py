@@ -0,0 +1,90 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_ddsr_departments(apps, schema_editor):
+    Department = apps.get_model("accounts", "Department")
+    DDSR = apps.get_model("inventory", "DDSR")
+
+    names = (
+        DDSR.objects.exclude(department__isnull=True)
+        .exclude(department="")
+        .values_list("department", flat=True)
+        .distinct()
+    )
+    for name in list(names):
+        department, _ = Department.objects.get_or_create(name=name)
+        DDSR.objects.filter(department=name).update(department_ref=department)
+
+
+def restore_ddsr_departments(apps, schema_editor):
+    Department = apps.get_model("accounts", "Department")
+    DDSR = apps.get_model("inventory", "DDSR")
+    for department in Department.objects.all():
+        DDSR.objects.filter(department_ref=department).update(department=department.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_department"),
+        ("inventory", "0005_cdsr_register"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="ddsr",
+            name="ddsr_dept_receive_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="ddsr",
+            name="ddsr_item_dept_receive_idx",
+        ),
+        migrations.AddField(
+            model_name="ddsr",
+            name="department_ref",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="accounts.department",
+            ),
+        ),
+        migrations.RunPython(link_ddsr_departments, restore_ddsr_departments),
+        migrations.RemoveField(
+            model_name="ddsr",
+            name="department",
+        ),
+        migrations.RenameField(
+            model_name="ddsr",
+            old_name="department_ref",
+            new_name="department",
+        ),
+        migrations.AlterField(
+            model_name="ddsr",
+            name="department",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="allocations",
+                to="accounts.department",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ddsr",
+            index=models.Index(
+                fields=["department", "date_of_receive"], name="ddsr_dept_receive_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="ddsr",
+            index=models.Index(
+                fields=["cdsr", "department", "date_of_receive"],
+                name="ddsr_item_dept_receive_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:22
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copies of inventory.search as of this migration, so later changes
+# to the search fields or the tokenizer do not change what it does.
+SEARCH_FIELDS = {
+    "product_description": 3,
+    "product_category": 2,
+    "supplier": 2,
+    "cdsr_name": 1,
+    "purchase_authority": 1,
+}
+
+FULLTEXT_INDEX = "cdsr_search_ft"
+
+TOKEN_MAX_LENGTH = 40
+
+WORD = re.compile(r"\w+")
+
+
+def words(text):
+    return [word[:TOKEN_MAX_LENGTH] for word in WORD.findall((text or "").lower())]
+
+
+def item_tokens(values):
+    tokens = {}
+    for field, weight in SEARCH_FIELDS.items():
+        for word in set(words(values.get(field))):
+            tokens[word] = tokens.get(word, 0) + weight
+    return tokens
+
+
+def build_search_index(apps, schema_editor):
+    """FULLTEXT index on MySQL, SearchToken rows for existing items elsewhere."""
+    CDSR = apps.get_model("inventory", "CDSR")
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(
+            f"CREATE FULLTEXT INDEX {FULLTEXT_INDEX} ON {CDSR._meta.db_table} "
+            f"({', '.join(SEARCH_FIELDS)})"
+        )
+        return
+
+    SearchToken = apps.get_model("inventory", "SearchToken")
+    batch = []
+    for values in CDSR.objects.values("cdsr_id", *SEARCH_FIELDS).iterator(chunk_size=2000):
+        batch.extend(
+            SearchToken(cdsr_id=values["cdsr_id"], token=token, weight=weight)
+            for token, weight in item_tokens(values).items()
+        )
+        if len(batch) >= 5000:
+            SearchToken.objects.bulk_create(batch)
+            batch = []
+    SearchToken.objects.bulk_create(batch)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        CDSR = apps.get_model("inventory", "CDSR")
+        schema_editor.execute(f"DROP INDEX {FULLTEXT_INDEX} ON {CDSR._meta.db_table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0007_data_version_export_job"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token", models.CharField(db_index=True, max_length=40)),
+                ("weight", models.PositiveSmallIntegerField(default=1)),
+                (
+                    "cdsr",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_tokens",
+                        to="inventory.cdsr",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("cdsr", "token"), name="search_token_item_unique"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
@@ -0,0 +1,120 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:52
+
+import django.db.models.deletion
+import django.utils.timezone
+from datetime import datetime, time
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def open_ledger(apps, schema_editor):
+    """
+    An opening allocate entry for every existing allocation, dated the day
+    it was received, with balances counted down from each item's quantity.
+    """
+    DDSR = apps.get_model("inventory", "DDSR")
+    AllocationEntry = apps.get_model("inventory", "AllocationEntry")
+
+    allocations = (
+        DDSR.objects.filter(cdsr__isnull=False, department__isnull=False)
+        .order_by("cdsr_id", "date_of_receive", "ddsr_id")
+        .values_list("cdsr_id", "department_id", "accepted_product_quantity",
+                     "date_of_receive", "cdsr__product_quantity")
+    )
+    entries = []
+    balances = {}
+    for cdsr_id, department_id, quantity, received, product_quantity in allocations.iterator():
+        quantity = quantity or 0
+        balance = balances.get(cdsr_id, product_quantity or 0) - quantity
+        balances[cdsr_id] = balance
+        created_at = datetime.combine(received, time.min)
+        if settings.USE_TZ:
+            created_at = timezone.make_aware(created_at)
+        entries.append(AllocationEntry(
+            cdsr_id=cdsr_id,
+            department_id=department_id,
+            action="allocate",
+            quantity=quantity,
+            balance=balance,
+            created_at=created_at,
+        ))
+        if len(entries) == BATCH_SIZE:
+            AllocationEntry.objects.bulk_create(entries)
+            entries = []
+    AllocationEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_department"),
+        ("inventory", "0009_list_columns"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AllocationEntry",
+            fields=[
+                ("entry_id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("allocate", "Allocation"),
+                            ("deallocate", "Deallocation"),
+                            ("reallocate", "Reallocation"),
+                            ("transfer", "Transfer"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("quantity", models.IntegerField()),
+                ("balance", models.IntegerField()),
+                ("created_at", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "cdsr",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="ledger",
+                        to="inventory.cdsr",
+                    ),
+                ),
+                (
+                    "department",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="ledger",
+                        to="accounts.department",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="allocation_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["cdsr", "created_at"], name="ledger_item_created_idx"
+                    ),
+                    models.Index(
+                        fields=["department", "created_at"],
+                        name="ledger_dept_created_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
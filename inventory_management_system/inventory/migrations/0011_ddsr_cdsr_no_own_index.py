@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0010_allocation_ledger"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ddsr",
+            name="cdsr",
+            field=models.ForeignKey(
+                blank=True,
+                db_column="cdsr_table_id",
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="allocations",
+                to="inventory.cdsr",
+            ),
+        ),
+    ]
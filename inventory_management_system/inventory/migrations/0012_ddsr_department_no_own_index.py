@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_department"),
+        ("inventory", "0011_ddsr_cdsr_no_own_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="ddsr",
+            name="department",
+            field=models.ForeignKey(
+                blank=True,
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="allocations",
+                to="accounts.department",
+            ),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0003_department"),
+        ("inventory", "0012_ddsr_department_no_own_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="allocationentry",
+            name="cdsr",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="ledger",
+                to="inventory.cdsr",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="allocationentry",
+            name="department",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="ledger",
+                to="accounts.department",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="allocationentry",
+            index=models.Index(fields=["created_at"], name="ledger_created_idx"),
+        ),
+    ]
@@ -1,4 +1,11 @@
-from django.db import models
+import os
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+from accounts.models import Department
+from register_management.models import Register
 
 class CDSR(models.Model):
     cdsr_id = models.BigAutoField(primary_key=True)
@@ -18,29 +25,267 @@ class CDSR(models.Model):
     supplier = models.CharField(max_length=90, null=True, blank=True)
     total_cost = models.BigIntegerField(null=True, blank=True)
     writeoff_status = models.CharField(max_length=255, null=True, blank=True)
+    register = models.ForeignKey(
+        Register,
+        on_delete=models.PROTECT,
+        related_name="items",
+        null=True,
+        blank=True,
+    )
+
+    # Fields that feed the register counters; saves that touch none of them
+    # skip the counter bookkeeping.
+    COUNTER_FIELDS = {"cdsr_name", "register", "total_cost"}
+
+    class Meta:
+        indexes = [
+            # Register pages, register overview GROUP BY and ItemForm choices
+            models.Index(fields=["cdsr_name"], name="cdsr_name_idx"),
+            # Date range filter on inventory and register lists
+            models.Index(fields=["date_of_purchase"], name="cdsr_purchase_date_idx"),
+            # Yearly value on the admin dashboard
+            models.Index(fields=["purchase_year"], name="cdsr_purchase_year_idx"),
+            # Active item count on the admin dashboard
+            models.Index(fields=["writeoff_status"], name="cdsr_writeoff_idx"),
+            # Allocated / unallocated filter on the allocation list
+            models.Index(fields=["remaining_quantity"], name="cdsr_remaining_qty_idx"),
+        ]
+
+    @classmethod
+    def display_fields(cls):
+        """Column names shown in CDSR lists and CSV exports."""
+        # The register is already shown as cdsr_name
+        return [field.name for field in cls._meta.fields if field.name != "register"]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and not self.COUNTER_FIELDS & set(update_fields):
+            return super().save(*args, **kwargs)
+
+        if not self.cdsr_name and self.register_id is not None:
+            self.cdsr_name = self.register.name
+
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding and self.pk is not None:
+                previous = (
+                    CDSR.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("register_id", "total_cost", "cdsr_name")
+                    .first()
+                )
+
+            if previous is None or previous[2] != self.cdsr_name or self.register_id is None:
+                self.register = Register.for_name(self.cdsr_name)
+                if update_fields is not None:
+                    kwargs["update_fields"] = set(update_fields) | {"register"}
+
+            super().save(*args, **kwargs)
+
+            old_register, old_value = (previous[0], previous[1] or 0) if previous else (None, 0)
+            new_value = self.total_cost or 0
+            if previous is not None and old_register == self.register_id:
+                Register.adjust(self.register_id, value=new_value - old_value)
+            else:
+                Register.adjust(old_register, items=-1, value=-old_value)
+                Register.adjust(self.register_id, items=1, value=new_value)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = (
+                CDSR.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list("register_id", "total_cost")
+                .first()
+            )
+            result = super().delete(*args, **kwargs)
+            if previous is not None:
+                Register.adjust(previous[0], items=-1, value=-(previous[1] or 0))
+            return result
+
+def cdsr_column(field_name):
+    """Read-only DDSR attribute served from the related CDSR row."""
+    def getter(self):
+        return getattr(self.cdsr, field_name) if self.cdsr_id else None
+    return property(getter)
+
 
 class DDSR(models.Model):
     ddsr_id = models.BigAutoField(primary_key=True)
-    cdsr_name = models.CharField(max_length=255, null=True, blank=True)
     cdsr_no = models.IntegerField(null=True, blank=True)
     cdsr_page_no = models.IntegerField(null=True, blank=True)
-    cdsr_table_id = models.BigIntegerField(null=True, blank=True)
-    cost_unit = models.CharField(max_length=255, null=True, blank=True)
+    # No index of its own: ddsr_item_dept_receive_idx starts with cdsr
+    cdsr = models.ForeignKey(
+        CDSR,
+        on_delete=models.PROTECT,
+        related_name="allocations",
+        db_column="cdsr_table_id",
+        db_index=False,
+        null=True,
+        blank=True,
+    )
     date_of_receive = models.DateField(max_length=255, blank=True)
     ddsr_no = models.IntegerField(null=True, blank=True)
     ddsr_pg_no = models.IntegerField(null=True, blank=True)
-    department = models.CharField(max_length=255, null=True, blank=True)
-    product_category = models.CharField(max_length=255, null=True, blank=True)
-    product_description = models.CharField(max_length=255, null=True, blank=True)
+    # No index of its own: ddsr_dept_receive_idx starts with department
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.PROTECT,
+        related_name="allocations",
+        db_index=False,
+        null=True,
+        blank=True,
+    )
     product_quantity = models.IntegerField(null=True, blank=True)
     product_type = models.CharField(max_length=255, null=True, blank=True)
     accepted_product_quantity = models.IntegerField(null=True, blank=True)
-    supplier_name = models.CharField(max_length=255, null=True, blank=True)
-    total_cost = models.CharField(max_length=255, null=True, blank=True)
+    total_cost = models.BigIntegerField(null=True, blank=True)
     writeoff_status = models.CharField(max_length=255, null=True, blank=True)
     year_of_buy = models.CharField(max_length=255, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Department dashboard and department list date ranges
+            models.Index(fields=["department", "date_of_receive"], name="ddsr_dept_receive_idx"),
+            # Admin monthly series
+            models.Index(fields=["date_of_receive"], name="ddsr_receive_idx"),
+            # An item's allocations (allocate and deallocate forms)
+            models.Index(
+                fields=["cdsr", "department", "date_of_receive"],
+                name="ddsr_item_dept_receive_idx",
+            ),
+        ]
+
+    # CDSR columns that used to be copied onto every allocation and are now
+    # read through the join: {DDSR attribute: CDSR field}
+    JOINED_CDSR_FIELDS = {
+        "cdsr_name": "cdsr_name",
+        "product_category": "product_category",
+        "product_description": "product_description",
+        "supplier_name": "supplier",
+        "cost_unit": "single_cost",
+    }
+
+    # Foreign-key columns that are filtered and sorted by their name
+    NAMED_FOREIGN_KEYS = {
+        "department": "department__name",
+    }
+
+    cdsr_name = cdsr_column("cdsr_name")
+    product_category = cdsr_column("product_category")
+    product_description = cdsr_column("product_description")
+    supplier_name = cdsr_column("supplier")
+    cost_unit = cdsr_column("single_cost")
+
+    @classmethod
+    def display_fields(cls):
+        """Column names shown in DDSR lists and CSV exports."""
+        fields = [field.name for field in cls._meta.fields if field.name != "cdsr"]
+        return fields + list(cls.JOINED_CDSR_FIELDS)
+
+    @classmethod
+    def lookup_for(cls, field_name):
+        """ORM lookup path for a display column, following the CDSR join if needed."""
+        if field_name in cls.JOINED_CDSR_FIELDS:
+            return f"cdsr__{cls.JOINED_CDSR_FIELDS[field_name]}"
+        return cls.NAMED_FOREIGN_KEYS.get(field_name, field_name)
     
 
+class UnlinkedDDSR(models.Model):
+    """
+    A DDSR row that migration 0003 could not link to a CDSR item, with the
+    CDSR columns that used to be copied onto it and the item id it referred
+    to, if any. Kept so the row can be linked by hand; delete it once
+    the allocation's cdsr is set.
+    """
+    ddsr = models.OneToOneField(
+        DDSR,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="unlinked",
+    )
+    cdsr_table_id = models.BigIntegerField(null=True, blank=True)
+    cdsr_name = models.CharField(max_length=255, null=True, blank=True)
+    product_category = models.CharField(max_length=255, null=True, blank=True)
+    product_description = models.CharField(max_length=255, null=True, blank=True)
+    supplier_name = models.CharField(max_length=255, null=True, blank=True)
+    cost_unit = models.CharField(max_length=255, null=True, blank=True)
+
+    def __str__(self):
+        return f"DDSR {self.ddsr_id}: {self.product_description}"
+
+
+class AllocationEntry(models.Model):
+    """
+    One change to what a department holds of a CDSR item. Entries are only
+    ever added: DDSR rows show what is allocated now, the ledger how it got
+    there. `quantity` is the change to the department's holding, negative
+    when stock comes back, and `balance` the item's remaining_quantity
+    after the change.
+    """
+    ALLOCATE = "allocate"
+    DEALLOCATE = "deallocate"
+    REALLOCATE = "reallocate"
+    TRANSFER = "transfer"
+    ACTION_CHOICES = [
+        # Stock leaves the store for a department
+        (ALLOCATE, "Allocation"),
+        # Stock comes back to the store
+        (DEALLOCATE, "Deallocation"),
+        # An allocation is replaced by a new one (bulk allocation)
+        (REALLOCATE, "Reallocation"),
+        # Stock moves between departments (allocate form reallocation)
+        (TRANSFER, "Transfer"),
+    ]
+
+    entry_id = models.BigAutoField(primary_key=True)
+    # Neither key has an index of its own: the timeline indexes start with them
+    cdsr = models.ForeignKey(
+        CDSR,
+        on_delete=models.SET_NULL,
+        related_name="ledger",
+        db_index=False,
+        null=True,
+    )
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.PROTECT,
+        related_name="ledger",
+        db_index=False,
+    )
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
+    quantity = models.IntegerField()
+    balance = models.IntegerField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name="allocation_entries",
+        null=True,
+        blank=True,
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Per-item and per-department timelines, newest first
+            models.Index(fields=["cdsr", "created_at"], name="ledger_item_created_idx"),
+            models.Index(fields=["department", "created_at"], name="ledger_dept_created_idx"),
+            # Admin dashboard activity feed, newest first
+            models.Index(fields=["created_at"], name="ledger_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.quantity:+} {self.cdsr_id} -> {self.department_id}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Allocation ledger entries cannot be changed.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Allocation ledger entries cannot be deleted.")
+
+
 class ConsumeCDSR(models.Model):
     consume_cdsr_id = models.BigAutoField(primary_key=True)
     consume_cdsr_no = models.IntegerField(null=True, blank=True)
@@ -94,3 +339,113 @@ class WriteOff(models.Model):
 
     def __str__(self):
         return f"WriteOff {self.writeoff_id}: {self.product_name}"
+
+
+class DataVersion(models.Model):
+    """
+    Write counter of one table, bumped by every ORM write to it.
+
+    Anything derived from the inventory tables (export files, cached counts)
+    records the versions it was built from and is stale once they move.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} v{self.version}"
+
+
+class ExportJob(models.Model):
+    """A CSV export written to disk in the background for later download."""
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    job_id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+    )
+    name = models.CharField(max_length=255)
+    # Hash of the export query, its columns and the data versions it reads
+    signature = models.CharField(max_length=64, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    total_rows = models.IntegerField(null=True, blank=True)
+    rows_written = models.IntegerField(default=0)
+    file_size = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"ExportJob {self.job_id}: {self.name} ({self.status})"
+
+    @property
+    def file_path(self):
+        return os.path.join(settings.EXPORT_ROOT, f"{self.signature}.csv.gz")
+
+    @property
+    def is_finished(self):
+        return self.status in (self.DONE, self.FAILED)
+
+    @property
+    def progress(self):
+        if self.status == self.DONE:
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(99, int(self.rows_written * 100 / self.total_rows))
+
+
+class SearchToken(models.Model):
+    """
+    One word of a CDSR item's searchable text, for backends without a
+    FULLTEXT index (see inventory.search). `weight` is the summed weight of
+    the fields the word appears in.
+    """
+    # Indexed for the `token LIKE 'term%'` range scan of each search term
+    token = models.CharField(max_length=40, db_index=True)
+    # Indexed by the unique constraint below, which leads with it
+    cdsr = models.ForeignKey(
+        CDSR,
+        on_delete=models.CASCADE,
+        related_name="search_tokens",
+        db_index=False,
+    )
+    weight = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["cdsr", "token"], name="search_token_item_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.token} -> {self.cdsr_id}"
+
+
+class ListColumns(models.Model):
+    """The columns one user has chosen to see in one of the list views."""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="list_columns",
+    )
+    # A key of inventory.columns.LISTS
+    list_name = models.CharField(max_length=50)
+    columns = models.JSONField(default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "list_name"], name="list_columns_user_list_unique"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.list_name}: {', '.join(self.columns)}"
@@ -0,0 +1,115 @@
+"""
+Per-process cache of the ordered primary keys of a list query.
+
+Paging through a filtered, sorted list re-runs the same filter and sort for
+every page. With the ordered id list of the result cached, a later page is
+one primary-key fetch of its 50 rows. Entries are keyed by the query's SQL
+and checked against the data versions of the tables it reads, so any write
+to those tables invalidates them. Memory is bounded by the total number of
+ids held (RESULT_CACHE_MAX_IDS); the least recently used results are
+dropped first, and results above RESULT_CACHE_MAX_RESULT ids are not cached:
+the id fetch stops one past that limit, and a TOO_LARGE marker is cached in
+their place, so a large result costs one bounded query per data version and
+later pages go straight to keyset paging.
+"""
+import hashlib
+import json
+import threading
+from array import array
+from collections import OrderedDict
+
+from .counts import models_in
+from .data_version import current
+
+RESULT_CACHE_MAX_IDS = 2_000_000
+RESULT_CACHE_MAX_RESULT = 200_000
+
+# Cached in place of the ids of a result above max_result
+TOO_LARGE = ()
+
+
+class ResultCache:
+    """
+    LRU of {signature: (versions, ids)} holding at most `max_ids` ids. A
+    TOO_LARGE marker counts as one id.
+    """
+
+    def __init__(self, max_ids=RESULT_CACHE_MAX_IDS, max_result=RESULT_CACHE_MAX_RESULT):
+        self.max_ids = max_ids
+        self.max_result = max_result
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, signature, versions):
+        with self.lock:
+            entry = self.entries.get(signature)
+            if entry is None:
+                return None
+            if entry[0] != versions:
+                self.discard(signature)
+                return None
+            self.entries.move_to_end(signature)
+            return entry[1]
+
+    def put(self, signature, versions, ids):
+        """Cache `ids`, or TOO_LARGE when there are more than max_result."""
+        if len(ids) > self.max_result:
+            ids = TOO_LARGE
+        with self.lock:
+            self.discard(signature)
+            self.entries[signature] = (versions, ids)
+            self.size += weight(ids)
+            while self.size > self.max_ids:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= weight(evicted)
+
+    def discard(self, signature):
+        entry = self.entries.pop(signature, None)
+        if entry is not None:
+            self.size -= weight(entry[1])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+def weight(ids):
+    return len(ids) or 1
+
+
+result_cache = ResultCache()
+
+
+def result_signature(queryset):
+    sql, params = queryset.query.sql_with_params()
+    payload = json.dumps([queryset.db, sql, [str(param) for param in params]])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def result_ids(queryset):
+    """
+    Primary keys of the ordered `queryset`, from the cache while the tables
+    it reads are unchanged. None when the result is too large to cache.
+    """
+    # Keyed by the id query itself, so the columns a page loads do not matter
+    id_query = queryset.values_list("pk", flat=True)
+    signature = result_signature(id_query)
+    versions = current(*models_in(queryset))
+    ids = result_cache.get(signature, versions)
+    if ids is None:
+        # One id past the limit is enough to know the result is too large
+        ids = array("q", id_query[:result_cache.max_result + 1])
+        result_cache.put(signature, versions, ids)
+        if len(ids) > result_cache.max_result:
+            return None
+    elif ids is TOO_LARGE:
+        return None
+    return ids
+
+
+def rows_for(queryset, ids):
+    """Rows of `queryset` with the given primary keys, in the order given."""
+    rows = {row.pk: row for row in queryset.order_by().filter(pk__in=list(ids))}
+    return [rows[pk] for pk in ids if pk in rows]
@@ -0,0 +1,139 @@
+"""
+Search box for the CDSR and DDSR lists.
+
+One query is matched against an item's description, category, supplier,
+register and purchase authority. Every word of the query must start a word
+in one of those fields, and matches are ranked by which fields they hit.
+
+On MySQL this runs on the cdsr_search_ft FULLTEXT index in boolean mode.
+Other backends use SearchToken, a table with one row per distinct word of
+each item, kept up to date whenever an item's searchable fields are saved
+(and filled for existing items by `manage.py rebuild_search_index`). Each
+term is an index range scan on SearchToken.token instead of a LIKE '%x%'
+scan of every item; `manage.py benchmark_search` compares the two.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import FloatField, OuterRef, Q, Subquery, Sum
+from django.db.models.expressions import RawSQL
+
+from .models import CDSR, SearchToken
+
+# Searchable CDSR fields and how much a word found in each adds to the rank.
+SEARCH_FIELDS = {
+    "product_description": 3,
+    "product_category": 2,
+    "supplier": 2,
+    "cdsr_name": 1,
+    "purchase_authority": 1,
+}
+
+FULLTEXT_INDEX = "cdsr_search_ft"
+
+TOKEN_MAX_LENGTH = 40
+
+# Words beyond this many in one query are ignored.
+MAX_TERMS = 8
+
+WORD = re.compile(r"\w+")
+
+
+def uses_fulltext():
+    return connection.vendor == "mysql"
+
+
+def words(text):
+    """Lowercased words of `text`, cut to the length of a SearchToken."""
+    return [word[:TOKEN_MAX_LENGTH] for word in WORD.findall((text or "").lower())]
+
+
+def search_terms(query):
+    """Distinct words of a search box query, in the order typed."""
+    return list(dict.fromkeys(words(query)))[:MAX_TERMS]
+
+
+def item_tokens(values):
+    """{word: weight} for a mapping of searchable field name to its text."""
+    tokens = {}
+    for field, weight in SEARCH_FIELDS.items():
+        for word in set(words(values.get(field))):
+            tokens[word] = tokens.get(word, 0) + weight
+    return tokens
+
+
+def index_items(items):
+    """Replace the SearchToken rows of the given CDSR items."""
+    items = list(items)
+    with transaction.atomic():
+        SearchToken.objects.filter(cdsr__in=[item.pk for item in items]).delete()
+        SearchToken.objects.bulk_create([
+            SearchToken(cdsr_id=item.pk, token=token, weight=weight)
+            for item in items
+            for token, weight in item_tokens(
+                {field: getattr(item, field) for field in SEARCH_FIELDS}
+            ).items()
+        ], batch_size=1000)
+
+
+def reindex_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or uses_fulltext():
+        return
+    if update_fields is not None and not set(SEARCH_FIELDS) & set(update_fields):
+        return
+    index_items([instance])
+
+
+def prefix_match(lookup, term):
+    """Q for values of `lookup` starting with `term`, as an index range scan."""
+    if connection.vendor == "sqlite":
+        # SQLite's LIKE is case-insensitive and cannot use the index; every
+        # word starting with `term` sorts between it and term + U+10FFFF
+        return Q(**{f"{lookup}__gte": term, f"{lookup}__lt": term + "\U0010ffff"})
+    return Q(**{f"{lookup}__startswith": term})
+
+
+def fulltext_search(queryset, terms, cdsr_path):
+    boolean_query = " ".join(f"+{term}*" for term in terms)
+    score = RawSQL(
+        f"MATCH ({', '.join(SEARCH_FIELDS)}) AGAINST (%s IN BOOLEAN MODE)",
+        [boolean_query],
+        output_field=FloatField(),
+    )
+    if not cdsr_path:
+        return queryset.annotate(search_rank=score).filter(search_rank__gt=0)
+
+    ranked = CDSR.objects.annotate(rank=score).filter(rank__gt=0)
+    return queryset.filter(**{f"{cdsr_path}__in": ranked.values("pk")}).annotate(
+        search_rank=Subquery(ranked.filter(pk=OuterRef(cdsr_path)).values("rank")[:1])
+    )
+
+
+def token_search(queryset, terms, cdsr_path):
+    item = cdsr_path or "pk"
+    token = f"{cdsr_path}__search_tokens" if cdsr_path else "search_tokens"
+    any_term = Q()
+    for term in terms:
+        # One semi-join per term keeps only items matching every term
+        queryset = queryset.filter(**{f"{item}__in": SearchToken.objects.filter(
+            prefix_match("token", term)
+        ).values("cdsr_id")})
+        any_term |= prefix_match(f"{token}__token", term)
+    # Filtering before annotating limits the sum to the matched words
+    return queryset.filter(any_term).annotate(search_rank=Sum(f"{token}__weight"))
+
+
+def search(queryset, query, cdsr_path=None):
+    """
+    Restrict `queryset` to items matching the search box `query` and
+    annotate each row with `search_rank` (higher is better).
+
+    `cdsr_path` is the lookup from the queryset's model to CDSR (e.g.
+    "cdsr" for DDSR), or None for a CDSR queryset.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset
+    if uses_fulltext():
+        return fulltext_search(queryset, terms, cdsr_path)
+    return token_search(queryset, terms, cdsr_path)
@@ -55,4 +55,4 @@ def sum_list(value):
     try:
         return sum(float(x) for x in value)
     except (ValueError, TypeError):
-        return 0
\ No newline at end of file
+        return 0
@@ -1,3 +1,756 @@
-from django.test import TestCase
+import gzip
+import re
+import tempfile
+from datetime import date, datetime
+from importlib import import_module
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .activity_feed import recent_activity_page
+from .dashboard_stats import (
+    admin_dashboard_stats,
+    department_dashboard_stats,
+    month_starts,
+    monthly_series,
+)
+from accounts.models import Department
+
+from .columns import chosen_columns
+from .counts import EXACT_COUNT_LIMIT, CachedCountPaginator, cached_count
+from .data_version import current
+from .filter_spec import CDSR_FILTERS, DDSR_FILTERS
+from .keyset import keyset_page
+from .list_table import headers, row_tuples
+from .models import CDSR, DDSR, AllocationEntry, ExportJob, ListColumns, SearchToken
+from .result_cache import TOO_LARGE, ResultCache, result_cache, result_ids
+from .search import search
+
+# Session, user, four dashboard aggregates, the paginated activity feed
+# (count and page) and the session save.
+ADMIN_DASHBOARD_QUERY_BUDGET = 12
+
+
+def create_cdsr(**kwargs):
+    values = {
+        "cdsr_name": "C/S DSR/CC",
+        "date_of_purchase": date(2025, 1, 10),
+        "product_category": "Computer",
+        "product_description": "Desktop",
+        "product_quantity": 10,
+        "remaining_quantity": 10,
+        "single_cost": 100,
+        "total_cost": 1000,
+        "purchase_year": "2025",
+    }
+    values.update(kwargs)
+    return CDSR.objects.create(**values)
+
+
+def department(name):
+    return Department.objects.get_or_create(name=name)[0]
+
+
+def create_ddsr(cdsr, department_name, quantity, date_of_receive):
+    return DDSR.objects.create(
+        cdsr=cdsr,
+        date_of_receive=date_of_receive,
+        department=department(department_name),
+        accepted_product_quantity=quantity,
+        total_cost=quantity * cdsr.single_cost,
+    )
+
+
+class DashboardStatsTests(TestCase):
+    def test_month_starts_crosses_year_boundary(self):
+        self.assertEqual(
+            month_starts(3, today=date(2025, 2, 14)),
+            [date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)],
+        )
+
+    def test_monthly_series_counts_each_calendar_month(self):
+        cdsr = create_cdsr()
+        create_ddsr(cdsr, "Library", 1, date(2024, 12, 31))
+        create_ddsr(cdsr, "Library", 1, date(2025, 1, 1))
+        create_ddsr(cdsr, "Office", 1, date(2025, 1, 20))
+        create_ddsr(cdsr, "Office", 1, date(2024, 11, 30))
+
+        with self.assertNumQueries(1):
+            labels, data = monthly_series(
+                DDSR.objects.all(), "date_of_receive", months=3, today=date(2025, 2, 14)
+            )
+
+        self.assertEqual(labels, ["December", "January", "February"])
+        self.assertEqual(data, [1, 2, 0])
+
+    def test_admin_dashboard_stats_query_count(self):
+        cdsr = create_cdsr()
+        for day in range(1, 6):
+            create_ddsr(cdsr, "Library", 1, date(2025, 3, day))
+        Department.choices()  # department names come from the cached lookup
+
+        with self.assertNumQueries(4):
+            stats = admin_dashboard_stats(today=date(2025, 3, 20))
+
+        self.assertEqual(stats["total_items"], 1)
+        self.assertEqual(stats["total_value"], 1000)
+        self.assertEqual(stats["monthly_allocations"], 5)
+        self.assertEqual(stats["department_labels"], ["Library"])
+        self.assertEqual(stats["monthly_data"][-1], 5)
+
+    def test_department_dashboard_stats_runs_one_query(self):
+        cdsr = create_cdsr()
+        printer = create_cdsr(product_category="Printer")
+        create_ddsr(cdsr, "Library", 2, date(2025, 3, 15))
+        create_ddsr(cdsr, "Library", 3, date(2023, 1, 1))
+        create_ddsr(printer, "Library", 1, date(2025, 1, 5))
+        create_ddsr(printer, "Office", 9, date(2025, 3, 1))
+
+        library = department("Library")
+        with self.assertNumQueries(1):
+            stats = department_dashboard_stats(library, today=date(2025, 3, 20))
+
+        self.assertEqual(stats["total_items"], 3)
+        self.assertEqual(stats["total_quantity"], 6)
+        self.assertEqual(stats["total_value"], 600)
+        self.assertEqual(stats["recent_allocations"], 1)
+        self.assertEqual(stats["value_percent"], 100.0)
+        self.assertEqual(stats["category_labels"], ["Computer", "Printer"])
+        self.assertEqual(stats["category_data"], [2, 1])
+        self.assertEqual(stats["monthly_data"], [0, 0, 0, 0, 1, 0, 1])
+
+    def test_legacy_cost_strings_are_parsed(self):
+        migration = import_module("inventory.migrations.0002_ddsr_numeric_total_cost")
+        self.assertEqual(migration.parse_cost("47966"), 47966)
+        self.assertEqual(migration.parse_cost(" 1,200.40 "), 1200)
+        self.assertIsNone(migration.parse_cost("NULL"))
+        self.assertIsNone(migration.parse_cost("n/a"))
+
+
+class ActivityFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.item = create_cdsr()
+        self.other_item = create_cdsr(product_description="Printer")
+        self.record(self.item, "Library", AllocationEntry.ALLOCATE, 5, 1)
+        self.record(self.item, "Library", AllocationEntry.DEALLOCATE, -2, 5)
+        self.record(self.item, "Library", AllocationEntry.TRANSFER, -1, 9)
+        self.record(self.item, "Office", AllocationEntry.TRANSFER, 1, 9)
+        self.record(self.other_item, "Library", AllocationEntry.REALLOCATE, 4, 12)
+
+    def record(self, item, department_name, action, quantity, day):
+        AllocationEntry.objects.create(
+            cdsr=item, department=department(department_name), action=action,
+            quantity=quantity, balance=0,
+            created_at=timezone.make_aware(datetime(2025, 1, day, 12)),
+        )
+
+    def test_feed_reads_the_ledger_newest_first(self):
+        create_ddsr(self.item, "Library", 3, date(2025, 2, 1))  # not a ledger entry
+
+        page, actions = recent_activity_page(1, per_page=10)
+        self.assertEqual(page.paginator.count, 5)
+        self.assertEqual(
+            [(action["date"], action["action_type"], action["department"], action["quantity"]) for action in actions],
+            [
+                ("2025-01-12", "reallocation", "Library", 4),
+                ("2025-01-09", "transfer", "Office", 1),
+                ("2025-01-09", "transfer", "Library", 1),
+                ("2025-01-05", "deallocation", "Library", 2),
+                ("2025-01-01", "allocation", "Library", 5),
+            ],
+        )
+        self.assertEqual(actions[0]["item_name"], "Printer")
+
+    def test_later_pages_cost_no_extra_queries_per_row(self):
+        Department.choices()  # department names come from the cached lookup
+        with self.assertNumQueries(2):
+            page, actions = recent_activity_page(2, per_page=2)
+        self.assertEqual(page.number, 2)
+        self.assertEqual(len(actions), 2)
+
+
+class AdminDashboardQueryBudgetTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(self.admin)
+
+    def test_admin_dashboard_stays_within_query_budget(self):
+        today = date.today()
+        for index in range(30):
+            cdsr = create_cdsr(product_description=f"Item {index}")
+            create_ddsr(cdsr, "Library", 1, today)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("inventory:admin_dashboard"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), ADMIN_DASHBOARD_QUERY_BUDGET)
+
+
+class DepartmentInventoryListTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="library@example.com", password="secret", department=department("Library")
+        )
+        self.client.force_login(self.user)
+        for index in range(5):
+            cdsr = create_cdsr(product_description=f"Shelf {index}", supplier="Acme")
+            create_ddsr(cdsr, "Library", 1, date(2025, 1, index + 1))
+        create_ddsr(create_cdsr(product_description="Lamp"), "Library", 1, date(2025, 2, 1))
+
+    def test_joined_columns_are_filterable_without_per_row_queries(self):
+        url = reverse("inventory:department_inventory_list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {
+                "filter_field": "product_description",
+                "filter_value": "shelf",
+                "sort_by": "supplier_name",
+            })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["items"]), 5)
+        self.assertContains(response, "Shelf 4")
+        self.assertNotContains(response, "Lamp")
+        cdsr_lookups = [q for q in queries if 'FROM "inventory_cdsr"' in q["sql"]]
+        self.assertEqual(cdsr_lookups, [])
+
+
+    def test_csv_export_streams_joined_columns(self):
+        url = reverse("inventory:department_inventory_list")
+        response = self.client.get(url, {"export": "csv", "sort_by": "ddsr_id"})
+
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertIn("Product Description", lines[0])
+        self.assertIn("Shelf 0", lines[1])
+        self.assertIn("Library", lines[1])
+
+    def test_csv_export_can_be_gzipped(self):
+        url = reverse("inventory:department_inventory_list")
+        plain = self.client.get(url, {"export": "csv"})
+        packed = self.client.get(url, {"export": "csv", "compress": "gzip"})
+
+        self.assertEqual(packed["Content-Type"], "application/gzip")
+        self.assertIn('.csv.gz"', packed["Content-Disposition"])
+        self.assertEqual(
+            gzip.decompress(b"".join(packed.streaming_content)),
+            b"".join(plain.streaming_content),
+        )
+
+
+class ListColumnsTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+        self.admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(self.admin)
+        self.item = create_cdsr(product_description="Projector", supplier="Acme Supplies")
+        create_ddsr(self.item, "Library", 2, date(2025, 2, 1))
+
+    def choose(self, list_name, columns):
+        return self.client.post(
+            reverse("inventory:list_columns", args=[list_name]),
+            {"columns": columns, "next": "/inventory/inventory-list/?sort_by=supplier"},
+        )
+
+    def test_chosen_columns_are_stored_per_user_in_list_order(self):
+        response = self.choose("inventory", ["supplier", "product_description", "no_such_column"])
+
+        self.assertRedirects(response, "/inventory/inventory-list/?sort_by=supplier", fetch_redirect_response=False)
+        self.assertEqual(chosen_columns(self.admin, "inventory"), ["product_description", "supplier"])
+        other = get_user_model().objects.create_user(email="other@example.com", password="secret")
+        self.assertEqual(chosen_columns(other, "inventory"), CDSR.display_fields())
+
+        self.choose("inventory", [])
+        self.assertFalse(ListColumns.objects.exists())
+
+    def test_list_loads_and_renders_only_the_chosen_columns(self):
+        self.choose("inventory", ["product_description", "single_cost"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("inventory:inventory_list"), {"sort_by": "supplier"})
+        item_queries = [query["sql"] for query in queries if '"inventory_cdsr"."product_description"' in query["sql"]]
+
+        self.assertEqual(response.context["columns"], ["product_description", "single_cost"])
+        self.assertEqual(response.context["rows"], [(self.item, ("Projector", "100"))])
+        self.assertContains(response, "Projector")
+        self.assertNotContains(response, "Acme Supplies")
+        self.assertEqual(len(item_queries), 1)
+        self.assertNotIn('"inventory_cdsr"."supplier",', item_queries[0])
+
+    def test_department_list_projects_joined_columns(self):
+        user = get_user_model().objects.create_user(
+            email="library@example.com", password="secret", department=department("Library")
+        )
+        self.client.force_login(user)
+        self.choose("department_inventory", ["department", "supplier_name"])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("inventory:department_inventory_list"))
+        ddsr_queries = [query["sql"] for query in queries if 'FROM "inventory_ddsr"' in query["sql"]]
+
+        self.assertEqual(response.context["rows"][0][1], ("Library", "Acme Supplies"))
+        self.assertEqual(len(ddsr_queries), 1)
+        self.assertNotIn("product_description", ddsr_queries[0])
+
+
+class ListTableTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+
+    def test_cells_match_what_the_template_rendered(self):
+        item = create_cdsr(product_description="Chairs <pair>", supplier=None)
+        template = Template("{% load custom_filters %}{% for field in fields %}[{{ item|dict_key:field }}]{% endfor %}")
+        fields = CDSR.display_fields()
+
+        expected = template.render(Context({"item": item, "fields": fields}))
+        cells = row_tuples([item], fields)[0][1]
+        self.assertEqual("".join(f"[{cell}]" for cell in cells), expected)
+
+    def test_headers_and_page_links_keep_the_list_query(self):
+        request = RequestFactory().get("/", {
+            "sort_by": "supplier", "order": "asc", "filter_field": "supplier",
+            "filter_value": "a&b", "page": "2",
+        })
+        supplier = [header for header in headers(request, ["supplier", "cdsr_no"], "supplier", "asc")]
+
+        self.assertEqual(supplier[0], ("Supplier", "?sort_by=supplier&order=desc&filter_field=supplier&filter_value=a%26b", "up"))
+        self.assertEqual(supplier[1][1:], ("?sort_by=cdsr_no&order=asc&filter_field=supplier&filter_value=a%26b", None))
+
+        for index in range(60):
+            create_cdsr(product_description=f"Desk {index}")
+        response = self.client.get(reverse("inventory:inventory_list"), {
+            "filter_field": "product_description", "filter_value": "desk", "page": "1",
+        })
+        self.assertEqual(response.context["list_query"], "filter_field=product_description&filter_value=desk")
+        self.assertContains(response, 'href="?page=2&filter_field=product_description&amp;filter_value=desk"')
+
+
+class FilterSpecTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+        self.cheap = create_cdsr(product_description="Pen", single_cost=5, date_of_purchase=date(2024, 3, 1))
+        self.mid = create_cdsr(product_description="Pencil box", single_cost=50, date_of_purchase=date(2025, 1, 1))
+        self.dear = create_cdsr(product_description="Printer", single_cost=500, date_of_purchase=date(2025, 6, 1))
+
+    def matches(self, field, value):
+        condition, errors = CDSR_FILTERS.filters([field], [value])
+        self.assertEqual(errors, [])
+        return sorted(CDSR.objects.filter(condition).values_list("pk", flat=True))
+
+    def test_numbers_compile_to_exact_and_range_lookups(self):
+        self.assertEqual(self.matches("single_cost", "50"), [self.mid.pk])
+        self.assertEqual(self.matches("single_cost", "10..500"), [self.mid.pk, self.dear.pk])
+        self.assertEqual(self.matches("single_cost", "..50"), [self.cheap.pk, self.mid.pk])
+        self.assertEqual(self.matches("single_cost", ">50"), [self.dear.pk])
+        self.assertEqual(self.matches("date_of_purchase", ">=2025-01-01"), [self.mid.pk, self.dear.pk])
+
+    def test_text_modes(self):
+        self.assertEqual(self.matches("product_description", "pen"), [self.cheap.pk, self.mid.pk])
+        self.assertEqual(self.matches("product_description", "=pen"), [self.cheap.pk])
+        self.assertEqual(self.matches("product_description", "pri*"), [self.dear.pk])
+
+        condition, _ = CDSR_FILTERS.filters(["single_cost"], ["50"])
+        self.assertNotIn("LIKE", str(CDSR.objects.filter(condition).query))
+
+    def test_unknown_columns_and_bad_values_are_reported(self):
+        condition, errors = CDSR_FILTERS.filters(
+            ["register__name", "single_cost", "date_of_purchase"], ["x", "cheap", "2025-13-01"]
+        )
+        self.assertEqual(condition, Q())
+        self.assertEqual(len(errors), 3)
+        self.assertEqual(CDSR_FILTERS.order_by("password", "desc"), ("-cdsr_id", "Cannot sort by unknown column: password"))
+
+    def test_joined_ddsr_columns_use_their_cdsr_type(self):
+        self.assertEqual(DDSR_FILTERS.columns["cost_unit"], ("cdsr__single_cost", "integer"))
+        self.assertEqual(DDSR_FILTERS.columns["department"], ("department__name", "text"))
+        self.assertEqual(DDSR_FILTERS.order_by("supplier_name"), ("cdsr__supplier", None))
+
+    def test_list_view_reports_invalid_filters_instead_of_failing(self):
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse("inventory:inventory_list"), {
+            "filter_field": ["nonexistent", "single_cost"],
+            "filter_value": ["x", "500"],
+            "sort_by": "nonexistent",
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item.pk for item in response.context["items"]], [self.dear.pk])
+        self.assertContains(response, "Unknown column: nonexistent")
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+        # Repeated and missing suppliers exercise the pk tiebreaker and NULLs
+        suppliers = ["Acme", None, "Zenith", "Acme", None, "Bolt", "Acme"]
+        for index in range(21):
+            create_cdsr(
+                product_description=f"Item {index}",
+                supplier=suppliers[index % len(suppliers)],
+            )
+
+    def walk(self, order_by, per_page=4):
+        pages = [keyset_page(CDSR.objects.all(), order_by, None, per_page)]
+        while pages[-1].has_next():
+            pages.append(keyset_page(CDSR.objects.all(), order_by, pages[-1].next_cursor, per_page))
+        return pages
+
+    def test_pages_follow_the_sort_order_with_ties_and_nulls(self):
+        for order_by in ["cdsr_id", "-cdsr_id", "supplier", "-supplier"]:
+            pages = self.walk(order_by)
+            walked = [item.pk for page in pages for item in page]
+            expected = [item.pk for item in keyset_page(CDSR.objects.all(), order_by, None, 100)]
+            self.assertEqual(walked, expected, order_by)
+            self.assertEqual(len(walked), 21)
+            self.assertFalse(pages[0].has_previous())
+
+    def test_previous_cursor_returns_the_earlier_page(self):
+        pages = self.walk("-supplier")
+        for earlier, later in zip(pages, pages[1:]):
+            previous = keyset_page(CDSR.objects.all(), "-supplier", later.previous_cursor, 4)
+            self.assertEqual([item.pk for item in previous], [item.pk for item in earlier])
+
+    def test_deep_pages_use_no_count_or_offset(self):
+        cursor = self.walk("supplier")[-2].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            page = keyset_page(CDSR.objects.all(), "supplier", cursor, 4)
+
+        self.assertEqual(len(page), 1)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("COUNT(", queries[0]["sql"])
+        self.assertNotIn("OFFSET", queries[0]["sql"])
+
+    def test_list_view_ignores_tampered_cursor(self):
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+        url = reverse("inventory:inventory_list")
+
+        response = self.client.get(url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["items"]), 21)
+
+        response = self.client.get(url, {"page": "1"})
+        self.assertEqual(response.context["items"].paginator.count, 21)
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+        self.url = reverse("inventory:inventory_list")
+        for index in range(120):
+            create_cdsr(product_description=f"Desk {index}", single_cost=index % 7)
+
+    def test_least_recently_used_results_are_evicted_by_id_budget(self):
+        cache = ResultCache(max_ids=5, max_result=4)
+        cache.put("a", (1,), [1, 2, 3])
+        cache.put("b", (1,), [4, 5])
+        self.assertEqual(cache.get("a", (1,)), [1, 2, 3])
+        cache.put("c", (1,), [6, 7])
+        self.assertIsNone(cache.get("b", (1,)))
+        self.assertEqual(cache.size, 5)
+        cache.put("d", (1,), [1, 2, 3, 4, 5])
+        self.assertIs(cache.get("d", (1,)), TOO_LARGE)
+        self.assertIsNone(cache.get("a", (2,)))
+
+    def test_later_pages_fetch_only_their_rows(self):
+        params = {"sort_by": "single_cost", "order": "desc", "filter_field": "product_description", "filter_value": "desk"}
+        first = self.client.get(self.url, params).context["items"]
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url, {**params, "cursor": first.next_cursor}).context["items"]
+        item_queries = [query["sql"] for query in queries if '"inventory_cdsr"' in query["sql"]]
+        third = self.client.get(self.url, {**params, "cursor": second.next_cursor}).context["items"]
+        back = self.client.get(self.url, {**params, "cursor": second.previous_cursor}).context["items"]
+
+        walked = [item.pk for page in (first, second, third) for item in page]
+        expected = list(
+            CDSR.objects.order_by("-single_cost", "-cdsr_id").values_list("pk", flat=True)
+        )
+        self.assertEqual(walked, expected)
+        self.assertEqual([item.pk for item in back], [item.pk for item in first])
+        self.assertEqual(len(item_queries), 1)
+        self.assertNotIn("LIKE", item_queries[0])
+
+    def test_results_over_the_limit_are_given_up_after_one_bounded_fetch(self):
+        queryset = CDSR.objects.order_by("-single_cost", "-cdsr_id")
+        with mock.patch.object(result_cache, "max_result", 50):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertIsNone(result_ids(queryset))
+        id_queries = [query["sql"] for query in queries if 'FROM "inventory_cdsr"' in query["sql"]]
+        self.assertEqual(len(id_queries), 1)
+        self.assertIn("LIMIT 51", id_queries[0])
+
+        # Later pages skip the id fetch until the table changes
+        with mock.patch.object(result_cache, "max_result", 50):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertIsNone(result_ids(queryset))
+            self.assertFalse([query for query in queries if 'FROM "inventory_cdsr"' in query["sql"]])
+
+            with self.captureOnCommitCallbacks(execute=True):
+                create_cdsr(product_description="Desk 120")
+            with CaptureQueriesContext(connection) as queries:
+                self.assertIsNone(result_ids(queryset))
+            self.assertEqual(len([query for query in queries if 'FROM "inventory_cdsr"' in query["sql"]]), 1)
+
+    def test_writes_invalidate_cached_results(self):
+        self.assertEqual(self.client.get(self.url, {"page": "3"}).context["items"].paginator.count, 120)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_cdsr(product_description="Desk 120")
+        self.assertEqual(self.client.get(self.url, {"page": "3"}).context["items"].paginator.count, 121)
+
+
+class CachedCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        for index in range(3):
+            create_cdsr(product_description=f"Chair {index}")
+        create_cdsr(product_description="Table")
+        self.versions = current(CDSR)
+
+    def test_count_is_cached_until_the_table_changes(self):
+        chairs = CDSR.objects.filter(product_description__icontains="chair")
+        self.assertEqual(cached_count(chairs), (3, False))
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(cached_count(chairs), (3, False))
+        self.assertFalse(any("COUNT(" in query["sql"] for query in queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_cdsr(product_description="Chair 3")
+        self.assertEqual(cached_count(chairs), (4, False))
+
+    def test_versions_are_bumped_only_when_the_write_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_cdsr(product_description="Chair 3")
+            self.assertEqual(current(CDSR), self.versions)
+        self.assertEqual(len(callbacks), 1)
+        callbacks[0]()
+        self.assertEqual(current(CDSR), (self.versions[0] + 1,))
+
+    def test_large_estimates_replace_the_exact_count(self):
+        with mock.patch("inventory.counts.estimated_count", return_value=EXACT_COUNT_LIMIT + 1):
+            self.assertEqual(cached_count(CDSR.objects.all()), (EXACT_COUNT_LIMIT + 1, True))
+
+    def test_numbered_pages_count_without_annotations(self):
+        items = CDSR.objects.annotate(
+            has_allocations=Exists(DDSR.objects.filter(cdsr=OuterRef("pk")))
+        ).order_by("cdsr_id")
+        paginator = CachedCountPaginator(items, 2, count_queryset=CDSR.objects.all())
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(paginator.num_pages, 2)
+        counts = [query["sql"] for query in queries if "COUNT(" in query["sql"]]
+        self.assertEqual(len(counts), 1)
+        self.assertNotIn("inventory_ddsr", counts[0])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        result_cache.clear()
+        self.projector = create_cdsr(
+            product_description="Epson projector", product_category="Electronics", supplier="Vision Traders"
+        )
+        self.screen = create_cdsr(
+            product_description="Projection screen", product_category="Furniture", supplier="Vision Traders"
+        )
+        self.chair = create_cdsr(
+            product_description="Office chair", product_category="Furniture",
+            cdsr_name="Projector Room Register",
+        )
+
+    def matches(self, query):
+        return [item.pk for item in search(CDSR.objects.all(), query).order_by("-search_rank", "pk")]
+
+    def test_every_term_must_prefix_a_word(self):
+        self.assertEqual(self.matches("proj"), [self.projector.pk, self.screen.pk, self.chair.pk])
+        self.assertEqual(self.matches("vision proj"), [self.projector.pk, self.screen.pk])
+        self.assertEqual(self.matches("furniture chair"), [self.chair.pk])
+        self.assertEqual(self.matches("jector"), [])
+
+    def test_description_matches_rank_above_register_matches(self):
+        ranks = {item.pk: item.search_rank for item in search(CDSR.objects.all(), "projector")}
+        self.assertGreater(ranks[self.projector.pk], ranks[self.chair.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.chair.product_description = "Office stool"
+        self.chair.save()
+        self.assertEqual(self.matches("stool"), [self.chair.pk])
+        self.assertEqual(self.matches("chair"), [])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.chair.remaining_quantity = 5
+            self.chair.save(update_fields=["remaining_quantity"])
+        self.assertFalse(any("inventory_searchtoken" in query["sql"] for query in queries))
+
+        self.chair.delete()
+        self.assertFalse(SearchToken.objects.filter(cdsr_id=self.chair.pk).exists())
+
+    def test_list_views_search_and_page_by_rank(self):
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+        url = reverse("inventory:inventory_list")
+
+        response = self.client.get(url, {"q": "epson vision"})
+        self.assertEqual([item.pk for item in response.context["items"]], [self.projector.pk])
+
+        for index in range(60):
+            create_cdsr(product_description=f"Vision mixer {index}")
+        first = self.client.get(url, {"q": "vision"}).context["items"]
+        second = self.client.get(url, {"q": "vision", "cursor": first.next_cursor}).context["items"]
+        self.assertEqual(len(first) + len(second), 62)
+        self.assertFalse({item.pk for item in first} & {item.pk for item in second})
+
+    def test_department_list_searches_allocated_items(self):
+        user = get_user_model().objects.create_user(
+            email="physics@example.com", password="secret", department=department("Physics")
+        )
+        create_ddsr(self.projector, "Physics", 1, date(2025, 2, 1))
+        create_ddsr(self.chair, "Physics", 1, date(2025, 2, 1))
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("inventory:department_inventory_list"), {"q": "epson"})
+        self.assertEqual([item.cdsr_id for item in response.context["items"]], [self.projector.pk])
+
+    def test_rebuild_command_indexes_bulk_loaded_items(self):
+        CDSR.objects.bulk_create([CDSR(
+            product_description="Bulk loaded lathe",
+            date_of_purchase=date(2025, 1, 1),
+            remaining_quantity=1,
+        )])
+        self.assertEqual(self.matches("lathe"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(len(self.matches("lathe")), 1)
+
+
+@override_settings(EXPORT_JOB_WORKERS=0)
+class ExportJobTests(TestCase):
+    def setUp(self):
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        settings_override = override_settings(EXPORT_ROOT=export_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = get_user_model().objects.create_user(
+            email="library@example.com", password="secret", department=department("Library")
+        )
+        self.client.force_login(self.user)
+        self.item = create_cdsr(product_description="Shelf")
+        create_ddsr(self.item, "Library", 2, date(2025, 1, 1))
+        self.url = reverse("inventory:department_inventory_list")
+
+    def start_export(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(self.url, {"export": "csv", "background": "1"})
+        self.assertEqual(response.status_code, 302)
+        return ExportJob.objects.latest("job_id")
+
+    def test_background_export_matches_streamed_export(self):
+        job = self.start_export()
+        self.assertEqual((job.status, job.total_rows, job.rows_written), (ExportJob.DONE, 1, 1))
+
+        status = self.client.get(reverse("inventory:export_status", args=[job.job_id]))
+        self.assertContains(status, reverse("inventory:download_export", args=[job.job_id]))
+
+        download = self.client.get(reverse("inventory:download_export", args=[job.job_id]))
+        streamed = self.client.get(self.url, {"export": "csv"})
+        self.assertEqual(
+            gzip.decompress(b"".join(download.streaming_content)),
+            b"".join(streamed.streaming_content),
+        )
+
+    def test_identical_export_is_reused_until_data_changes(self):
+        first = self.start_export()
+        self.assertEqual(self.start_export(), first)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            create_ddsr(self.item, "Library", 1, date(2025, 2, 1))
+        second = self.start_export()
+        self.assertNotEqual(second.signature, first.signature)
+        self.assertEqual(second.total_rows, 2)
+
+    def test_download_supports_range_requests(self):
+        job = self.start_export()
+        url = reverse("inventory:download_export", args=[job.job_id])
+        whole = b"".join(self.client.get(url).streaming_content)
+
+        partial = self.client.get(url, HTTP_RANGE="bytes=10-")
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial["Content-Range"], f"bytes 10-{len(whole) - 1}/{len(whole)}")
+        self.assertEqual(b"".join(partial.streaming_content), whole[10:])
+
+        stale = self.client.get(url, HTTP_RANGE="bytes=10-", HTTP_IF_RANGE='"other"')
+        self.assertEqual(stale.status_code, 200)
+
+        beyond = self.client.get(url, HTTP_RANGE=f"bytes={len(whole)}-")
+        self.assertEqual(beyond.status_code, 416)
+
+    def test_jobs_are_private_to_their_user(self):
+        job = self.start_export()
+        other = get_user_model().objects.create_user(
+            email="office@example.com", password="secret", department=department("Office")
+        )
+        self.client.force_login(other)
+        response = self.client.get(reverse("inventory:export_status", args=[job.job_id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class IndexReportCommandTests(TestCase):
+    def test_report_lists_every_declared_index(self):
+        out = StringIO()
+        call_command("index_report", stdout=out)
+        report = out.getvalue()
+        for model in (CDSR, DDSR, AllocationEntry):
+            for index in model._meta.indexes:
+                self.assertIn(index.name, report)
+
+    def test_register_queries_match_the_register_views(self):
+        create_cdsr(cdsr_name="C/S DSR/M&E")
+        out = StringIO()
+        call_command("index_report", stdout=out)
+        cdsr_report = out.getvalue().split("inventory_ddsr")[0]
+
+        register_index = re.search(r"(inventory_cdsr_register_id_\w+)\n(.*)", cdsr_report)
+        self.assertIn("register_inventory_list (register items)", register_index.group(2))
+        self.assertIn("register_management_register", out.getvalue())
+
+    def test_item_column_is_indexed_only_by_the_composite_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, DDSR._meta.db_table)
+        indexes = [info["columns"] for info in constraints.values() if info["index"] and "cdsr_table_id" in info["columns"]]
+        self.assertEqual(indexes, [["cdsr_table_id", "department_id", "date_of_receive"]])
+
+    def test_department_column_is_indexed_only_by_the_composite_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, DDSR._meta.db_table)
+        indexes = [info["columns"] for info in constraints.values() if info["index"] and info["columns"][0] == "department_id"]
+        self.assertEqual(indexes, [["department_id", "date_of_receive"]])
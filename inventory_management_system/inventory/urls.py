@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import admin_dashboard, department_dashboard, add_item, inventory_list, department_inventory_list, edit_item, delete_item
+from .views import admin_dashboard, department_dashboard, add_item, inventory_list, department_inventory_list, edit_item, delete_item, list_columns, export_status, download_export
 app_name = 'inventory'
 
 urlpatterns = [
@@ -8,7 +8,10 @@ urlpatterns = [
     path('add-item/', add_item, name='add_item'),  # ✅ New URL
     path('inventory-list/', inventory_list, name='inventory_list'),  # ✅ New URL
     path('department/inventory/', department_inventory_list, name='department_inventory_list'),
+    path('list-columns/<str:list_name>/', list_columns, name='list_columns'),
     path('edit-item/<int:cdsr_id>/', edit_item, name='edit_item'),
     path('delete-item/<int:cdsr_id>/', delete_item, name='delete_item'),
+    path('exports/<int:job_id>/', export_status, name='export_status'),
+    path('exports/<int:job_id>/download/', download_export, name='download_export'),
      
 ]
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
 import pymysql
 pymysql.install_as_MySQLdb()
@@ -152,6 +153,12 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 AUTH_USER_MODEL = 'accounts.CustomUser'
 
+# Background CSV exports: files are written here by a pool of worker threads
+# (0 runs each export inline) and kept for EXPORT_JOB_RETENTION.
+EXPORT_ROOT = os.path.join(BASE_DIR, "exports")
+EXPORT_JOB_WORKERS = 2
+EXPORT_JOB_RETENTION = timedelta(days=1)
+
 
 TIME_ZONE = 'Asia/Kolkata'
 USE_TZ = True                                                                                                                                   
@@ -159,6 +166,27 @@ USE_I18N = True
 USE_L10N = True
 
 
+# Inactivity logout (accounts.activity): the user row's last_activity is
+# written at most every LAST_ACTIVITY_WRITE_INTERVAL, and the device locks
+# of users idle past the timeout are released every INACTIVITY_SWEEP_INTERVAL.
+INACTIVITY_TIMEOUT = timedelta(minutes=10)
+LAST_ACTIVITY_WRITE_INTERVAL = timedelta(seconds=60)
+INACTIVITY_SWEEP_INTERVAL = timedelta(minutes=5)
+
+# Single-device registry (accounts.devices): FileDeviceStore shares the
+# holders between the worker processes of one host; MemoryDeviceStore suits
+# a single process. The user row is the durable copy either way.
+DEVICE_STORE = {
+    "BACKEND": "accounts.devices.FileDeviceStore",
+    "LOCATION": os.path.join(BASE_DIR, "devices"),
+}
+
+# Sessions (accounts.sessions) are read through the cache and written only
+# when they change or SESSION_REFRESH_FRACTION of their age has passed;
+# expired rows are deleted every SESSION_CLEANUP_INTERVAL.
+SESSION_ENGINE = "accounts.sessions"
+SESSION_REFRESH_FRACTION = 0.1
+SESSION_CLEANUP_INTERVAL = timedelta(hours=1)
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 SESSION_SAVE_EVERY_REQUEST = True
 
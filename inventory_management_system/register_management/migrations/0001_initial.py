@@ -0,0 +1,22 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Register",
+            fields=[
+                ("register_id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("item_count", models.IntegerField(default=0)),
+                ("total_value", models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -1,3 +1,59 @@
+from django.core.cache import cache
 from django.db import models
+from django.db.models import F
 
-# Create your models here.
+REGISTER_CHOICES_CACHE_KEY = "register_management:register_choices"
+REGISTER_CHOICES_TIMEOUT = 300
+
+
+class Register(models.Model):
+    """
+    A stock register (e.g. "C/S DSR/M&E") with running totals of its items.
+
+    `item_count` and `total_value` are maintained by CDSR.save() and
+    CDSR.delete() inside the same transaction as the item change, so the
+    register overview never has to aggregate the CDSR table.
+    """
+    register_id = models.BigAutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    item_count = models.IntegerField(default=0)
+    total_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def choices(cls):
+        """
+        (name, name) pairs of every register ordered by name, served from the
+        cache under the cached Register data version, so a register added or
+        removed by any worker process replaces the choices of every process
+        within seconds, usually without a query.
+        """
+        # Imported here: inventory.models imports this module
+        from inventory.data_version import cached_version
+
+        key = f"{REGISTER_CHOICES_CACHE_KEY}:{cached_version(cls)}"
+        choices = cache.get(key)
+        if choices is None:
+            choices = [(name, name) for name in cls.objects.order_by("name").values_list("name", flat=True) if name]
+            cache.set(key, choices, REGISTER_CHOICES_TIMEOUT)
+        return choices
+
+    @classmethod
+    def for_name(cls, name):
+        """Return the register called `name`, creating it if needed."""
+        if not name:
+            return None
+        register, _ = cls.objects.get_or_create(name=name)
+        return register
+
+    @classmethod
+    def adjust(cls, register_id, items=0, value=0):
+        """Atomically shift a register's counters by the given deltas."""
+        if register_id is None or (not items and not value):
+            return
+        cls.objects.filter(pk=register_id).update(
+            item_count=F("item_count") + items,
+            total_value=F("total_value") + value,
+        )
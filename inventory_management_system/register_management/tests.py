@@ -1,3 +1,121 @@
+from datetime import date
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory.forms import ItemForm
+from inventory.models import CDSR
+from .models import Register
+
+
+def create_item(register_name="C/S DSR/CC", total_cost=1000, **kwargs):
+    values = {
+        "cdsr_name": register_name,
+        "date_of_purchase": date(2025, 1, 10),
+        "product_category": "Computer",
+        "product_description": "Desktop",
+        "product_quantity": 10,
+        "remaining_quantity": 10,
+        "single_cost": 100,
+        "total_cost": total_cost,
+        "purchase_year": "2025",
+    }
+    values.update(kwargs)
+    return CDSR.objects.create(**values)
+
+
+class RegisterCounterTests(TestCase):
+    def test_item_save_links_register_and_updates_counters(self):
+        first = create_item(total_cost=1000)
+        create_item(total_cost=500)
+
+        register = Register.objects.get(name="C/S DSR/CC")
+        self.assertEqual(first.register, register)
+        self.assertEqual((register.item_count, register.total_value), (2, 1500))
+
+        first.total_cost = 1200
+        first.save()
+        register.refresh_from_db()
+        self.assertEqual((register.item_count, register.total_value), (2, 1700))
+
+    def test_moving_and_deleting_items_keeps_counters_in_sync(self):
+        item = create_item(total_cost=1000)
+        create_item("C/S DSR/M&E", total_cost=300)
+
+        item.cdsr_name = "C/S DSR/M&E"
+        item.save()
+        old = Register.objects.get(name="C/S DSR/CC")
+        new = Register.objects.get(name="C/S DSR/M&E")
+        self.assertEqual((old.item_count, old.total_value), (0, 0))
+        self.assertEqual((new.item_count, new.total_value), (2, 1300))
+
+        item.delete()
+        new.refresh_from_db()
+        self.assertEqual((new.item_count, new.total_value), (1, 300))
+
+    def test_saves_that_skip_counter_fields_do_not_touch_registers(self):
+        item = create_item()
+        item.remaining_quantity = 4
+        with CaptureQueriesContext(connection) as queries:
+            item.save(update_fields=["remaining_quantity"])
+        register_queries = [q for q in queries if "register_management_register" in q["sql"]]
+        self.assertEqual(register_queries, [])
+
+
+class RegisterViewTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(user)
+
+    def test_empty_register_is_listed_without_placeholder_items(self):
+        self.client.post(
+            reverse("register_management:add_register"),
+            {"register_name": "C/S DSR/Semi C R"},
+        )
+        self.assertFalse(CDSR.objects.exists())
+
+        response = self.client.get(reverse("register_management:manage_stock_by_register"))
+        self.assertEqual(
+            response.context["registers"],
+            [{"name": "C/S DSR/Semi C R", "item_count": 0, "total_value": "0.00"}],
+        )
+
+    def test_register_with_items_cannot_be_deleted(self):
+        create_item()
+        self.client.post(
+            reverse("register_management:delete_register", args=["C/S DSR/CC"])
+        )
+        self.assertTrue(Register.objects.filter(name="C/S DSR/CC").exists())
+
+
+class RegisterChoicesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Register.objects.create(name="C/S DSR/M&E")
+        Register.objects.create(name="C/S DSR/CC")
+
+    def test_item_form_reads_register_choices_from_the_cache(self):
+        ItemForm()
+        with CaptureQueriesContext(connection) as queries:
+            form = ItemForm()
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(
+            list(form.fields["cdsr_name"].choices),
+            [("", "Select Register"), ("C/S DSR/CC", "C/S DSR/CC"), ("C/S DSR/M&E", "C/S DSR/M&E")],
+        )
+
+    def test_adding_and_deleting_registers_refreshes_the_choices(self):
+        Register.choices()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_item("C/S DSR/Furniture")
+        self.assertIn(("C/S DSR/Furniture", "C/S DSR/Furniture"), Register.choices())
 
-# Create your tests here.
+        with self.captureOnCommitCallbacks(execute=True):
+            Register.objects.get(name="C/S DSR/CC").delete()
+        self.assertNotIn(("C/S DSR/CC", "C/S DSR/CC"), Register.choices())
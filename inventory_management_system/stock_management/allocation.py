@@ -0,0 +1,272 @@
+"""
+Allocation of CDSR stock to departments.
+
+All changes to allocations and to CDSR.remaining_quantity go through this
+module, inside one transaction per request, so a failure part way through
+leaves no partial state behind. The CDSR rows involved are locked with
+select_for_update before anything is read from them, always ahead of their
+allocations, and remaining_quantity is only ever changed by a conditional
+F() update that refuses to take it below zero. Two admins working on the
+same item therefore queue up instead of overwriting each other's stock.
+Every change is also recorded in the allocation ledger (see ledger.py).
+`manage.py stress_allocations` runs parallel allocators against a few
+items and checks that no stock is lost or oversubscribed.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.utils.timezone import now
+
+from accounts.models import Department
+from inventory.data_version import bump, coalesced
+from inventory.models import CDSR, DDSR, AllocationEntry
+
+from .ledger import Ledger
+
+
+class AllocationError(ValueError):
+    """A change the stock or the existing allocations cannot satisfy; args are the messages."""
+
+
+def new_allocation(item, department_id, quantity, ddsr_no, ddsr_pg_no):
+    """Unsaved DDSR row allocating `quantity` of `item` to a department."""
+    return DDSR(
+        cdsr=item,
+        cdsr_no=item.cdsr_no,
+        cdsr_page_no=item.cdsr_pg_no,
+        date_of_receive=now(),
+        ddsr_no=ddsr_no,
+        ddsr_pg_no=ddsr_pg_no,
+        department_id=department_id,
+        product_quantity=item.product_quantity,
+        product_type=item.product_type,
+        accepted_product_quantity=quantity,
+        total_cost=quantity * (item.single_cost or 0),
+        year_of_buy=item.purchase_year,
+    )
+
+
+def lock_items(cdsr_ids):
+    """{cdsr_id: CDSR} for the given ids, locked for the rest of the transaction."""
+    return {item.pk: item for item in CDSR.objects.select_for_update().filter(pk__in=cdsr_ids).order_by("pk")}
+
+
+def lock_allocations(**filters):
+    """{ddsr_id: DDSR} matching `filters`, locked; take the item locks first."""
+    return {
+        allocation.pk: allocation
+        for allocation in DDSR.objects.select_for_update().filter(**filters).order_by("pk")
+    }
+
+
+def adjust_remaining(deltas):
+    """
+    Add each {item: delta} to the item's remaining quantity in the database,
+    in one UPDATE, unless that would take any of them below zero.
+    """
+    deltas = {item: delta for item, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    guard = Q()
+    for item, delta in deltas.items():
+        guard |= Q(pk=item.pk, remaining_quantity__gte=-delta)
+    updated = CDSR.objects.filter(guard).update(remaining_quantity=F("remaining_quantity") + Case(
+        *(When(pk=item.pk, then=Value(delta)) for item, delta in deltas.items()),
+        output_field=IntegerField(),
+    ))
+    if updated != len(deltas):
+        short = ", ".join(item.product_description for item, delta in deltas.items() if delta < 0)
+        raise AllocationError(f"Not enough stock of {short} left to allocate.")
+    for item, delta in deltas.items():
+        item.remaining_quantity += delta
+
+
+def take_from(allocation, quantity, item):
+    """Reduce a locked allocation by `quantity`, deleting it when nothing is left."""
+    if quantity == allocation.accepted_product_quantity:
+        allocation.delete()
+    else:
+        allocation.accepted_product_quantity -= quantity
+        allocation.total_cost = allocation.accepted_product_quantity * (item.single_cost or 0)
+        allocation.save()
+
+
+def allocate(cdsr_id, lines, reallocate_from=None, user=None):
+    """
+    Allocate one CDSR item to departments.
+
+    `lines` are (department_id, quantity, ddsr_no, ddsr_pg_no) tuples. With
+    `reallocate_from`, a {ddsr_id: quantity} of the item's allocations to
+    take the stock from, the new allocations may not exceed what is taken;
+    otherwise they come out of the item's remaining quantity. Raises
+    AllocationError, with nothing changed, if the request cannot be met.
+    `user` is recorded in the ledger.
+    """
+    total = sum(quantity for _, quantity, _, _ in lines)
+    with transaction.atomic():
+        item = lock_items([cdsr_id]).get(cdsr_id)
+        if item is None:
+            raise AllocationError(f"Item {cdsr_id} no longer exists.")
+        allocations = lock_allocations(cdsr_id=cdsr_id)
+
+        errors = []
+        if any(quantity <= 0 for _, quantity, _, _ in lines):
+            errors.append("Every allocation needs a positive quantity.")
+        returned = 0
+        for ddsr_id, quantity in (reallocate_from or {}).items():
+            allocation = allocations.get(ddsr_id)
+            if allocation is None:
+                errors.append(f"Allocation {ddsr_id} no longer exists.")
+            elif quantity > allocation.accepted_product_quantity:
+                department = Department.name_for(allocation.department_id)
+                errors.append(f"Cannot reallocate more than allocated quantity from {department}")
+            returned += quantity
+        if reallocate_from is not None and total > returned:
+            errors.append("Cannot reallocate more than the selected quantities.")
+        elif total - returned > item.remaining_quantity:
+            errors.append("Cannot allocate more than available remaining quantity.")
+        if errors:
+            raise AllocationError(*errors)
+
+        ledger = Ledger(user)
+        action = AllocationEntry.ALLOCATE if reallocate_from is None else AllocationEntry.TRANSFER
+        for ddsr_id, quantity in (reallocate_from or {}).items():
+            ledger.record(action, item, allocations[ddsr_id].department_id, -quantity)
+            take_from(allocations[ddsr_id], quantity, item)
+        for department_id, quantity, _, _ in lines:
+            ledger.record(action, item, department_id, quantity)
+        DDSR.objects.bulk_create([
+            new_allocation(item, department_id, quantity, ddsr_no, ddsr_pg_no)
+            for department_id, quantity, ddsr_no, ddsr_pg_no in lines
+        ])
+        adjust_remaining({item: returned - total})
+        ledger.save()
+        # bulk_create() and update() send no signals
+        bump(CDSR, DDSR)
+    return item
+
+
+def deallocate(quantities, cdsr_id=None, user=None):
+    """
+    Return stock from allocations, given as {ddsr_id: quantity}, to their
+    items; limited to one item's allocations when `cdsr_id` is given.
+    Raises AllocationError, with nothing changed, if any quantity is more
+    than its allocation holds. The allocations are read, emptied ones
+    deleted, the rest updated and every item's stock returned in one query
+    each, however many items are involved. `user` is recorded in the
+    ledger.
+    """
+    with transaction.atomic():
+        filters = {"pk__in": quantities}
+        if cdsr_id is not None:
+            filters["cdsr_id"] = cdsr_id
+        cdsr_ids = set(DDSR.objects.filter(**filters).values_list("cdsr_id", flat=True))
+        items = lock_items(cdsr_ids)
+        allocations = lock_allocations(**filters)
+
+        errors = []
+        for ddsr_id, quantity in quantities.items():
+            allocation = allocations.get(ddsr_id)
+            if allocation is None or allocation.cdsr_id not in items:
+                errors.append(f"Error processing deallocation for allocation {ddsr_id}")
+            elif quantity <= 0 or quantity > allocation.accepted_product_quantity:
+                department = Department.name_for(allocation.department_id)
+                errors.append(f"Cannot deallocate more than allocated quantity from {department}")
+        if errors:
+            raise AllocationError(*errors)
+
+        ledger = Ledger(user)
+        emptied, reduced, returned = [], [], {}
+        for ddsr_id, quantity in quantities.items():
+            allocation = allocations[ddsr_id]
+            item = items[allocation.cdsr_id]
+            ledger.record(AllocationEntry.DEALLOCATE, item, allocation.department_id, -quantity)
+            if quantity == allocation.accepted_product_quantity:
+                emptied.append(ddsr_id)
+            else:
+                allocation.accepted_product_quantity -= quantity
+                allocation.total_cost = allocation.accepted_product_quantity * (item.single_cost or 0)
+                reduced.append(allocation)
+            returned[item] = returned.get(item, 0) + quantity
+
+        with coalesced():
+            DDSR.objects.filter(pk__in=emptied).delete()
+            DDSR.objects.bulk_update(reduced, ["accepted_product_quantity", "total_cost"])
+            adjust_remaining(returned)
+            ledger.save()
+            # bulk_update() and update() send no signals
+            bump(CDSR, DDSR)
+
+
+def allocate_in_bulk(department_id, lines, user=None):
+    """
+    Allocate several CDSR items to one department.
+
+    `lines` are (cdsr_id, quantity, ddsr_no, ddsr_pg_no) tuples. As the bulk
+    form always has, an item's earliest existing allocation is returned to
+    stock and replaced by the new one. The selected items are locked and
+    read in one query, their allocations in another, and the writes are
+    batched, so the number of queries does not grow with the number of
+    items. Returns (cdsr_id, error) for each line in order, with error None
+    for lines that were applied. `user` is recorded in the ledger.
+    """
+    cdsr_ids = [cdsr_id for cdsr_id, _, _, _ in lines]
+    results = []
+    with transaction.atomic():
+        items = lock_items(cdsr_ids)
+        replaced = {}
+        for allocation in DDSR.objects.filter(cdsr_id__in=items).order_by("ddsr_id"):
+            replaced.setdefault(allocation.cdsr_id, allocation)
+
+        ledger = Ledger(user)
+        created, updated = [], []
+        remaining = {}
+        for cdsr_id, quantity, ddsr_no, ddsr_pg_no in lines:
+            item = items.get(cdsr_id)
+            if item is None:
+                results.append((cdsr_id, f"Item {cdsr_id} no longer exists."))
+                continue
+            if quantity <= 0:
+                results.append((cdsr_id, f"Enter a positive quantity for {item.product_description}."))
+                continue
+
+            previous = replaced.pop(cdsr_id, None)
+            available = remaining.get(cdsr_id, item.remaining_quantity) + (
+                previous.accepted_product_quantity if previous else 0
+            )
+            if quantity > available:
+                results.append((cdsr_id, (
+                    f"Cannot allocate {quantity} units for {item.product_description}. "
+                    f"Only {available} available."
+                )))
+                continue
+
+            if previous:
+                ledger.record(AllocationEntry.REALLOCATE, item, previous.department_id,
+                              -previous.accepted_product_quantity)
+                ledger.record(AllocationEntry.REALLOCATE, item, department_id, quantity)
+            else:
+                ledger.record(AllocationEntry.ALLOCATE, item, department_id, quantity)
+
+            allocation = new_allocation(item, department_id, quantity, ddsr_no, ddsr_pg_no)
+            if previous:
+                # The replaced allocation's row is reused for the new one
+                allocation.pk = previous.pk
+                updated.append(allocation)
+            else:
+                created.append(allocation)
+            remaining[cdsr_id] = available - quantity
+            results.append((cdsr_id, None))
+
+        if remaining:
+            DDSR.objects.bulk_create(created)
+            DDSR.objects.bulk_update(updated, [
+                field.name for field in DDSR._meta.concrete_fields if not field.primary_key
+            ])
+            adjust_remaining({
+                items[cdsr_id]: left - items[cdsr_id].remaining_quantity
+                for cdsr_id, left in remaining.items()
+            })
+            ledger.save()
+            # Bulk writes send no signals
+            bump(CDSR, DDSR)
+    return results
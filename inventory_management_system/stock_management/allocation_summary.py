@@ -0,0 +1,36 @@
+"""
+Allocation summaries for the rows on one page of cdsr_allocation_list.
+
+The summaries are read after pagination with a single DDSR query limited to
+the CDSR ids on the page and joined into strings in Python, so no per-row
+subquery or database-specific GROUP_CONCAT is needed.
+"""
+from inventory.models import DDSR
+
+
+def allocation_summaries(cdsr_ids):
+    """Map each CDSR id with allocations to "Department (qty), ..." text."""
+    rows = (
+        DDSR.objects.filter(cdsr_id__in=cdsr_ids)
+        .values_list("cdsr_id", "department__name", "accepted_product_quantity")
+        .distinct()
+        .order_by("cdsr_id", "department__name", "accepted_product_quantity")
+    )
+    parts = {}
+    for cdsr_id, department_name, quantity in rows:
+        parts.setdefault(cdsr_id, []).append(f"{department_name} ({quantity})")
+    return {cdsr_id: ", ".join(names) for cdsr_id, names in parts.items()}
+
+
+def attach_allocation_summaries(page):
+    """
+    Set is_fully_allocated, allocated_departments and has_allocations on
+    each CDSR in `page`, as the allocation list template expects.
+    """
+    items = list(page)
+    summaries = allocation_summaries([item.cdsr_id for item in items])
+    for item in items:
+        item.is_fully_allocated = item.remaining_quantity == 0
+        item.allocated_departments = summaries.get(item.cdsr_id)
+        item.has_allocations = item.cdsr_id in summaries
+    return page
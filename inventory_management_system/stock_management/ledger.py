@@ -0,0 +1,82 @@
+"""
+Append-only ledger of allocation changes.
+
+Every allocate, deallocate, reallocate and transfer made through
+stock_management.allocation is written here as AllocationEntry rows, in the
+same transaction and with one bulk insert per request. Allocations that are
+reduced or deleted keep their history, and each entry carries the item's
+running balance, so the timelines below are range reads over the
+(cdsr, created_at) and (department, created_at) indexes instead of being
+reconstructed from the DDSR rows that are left. The item and department
+history pages of stock_management.views read them, and the admin
+dashboard's activity feed (inventory.activity_feed) reads the whole ledger
+newest first.
+"""
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory.models import AllocationEntry
+
+
+class Ledger:
+    """The entries of one allocation request, saved together."""
+
+    def __init__(self, user=None):
+        self.user = user if user is not None and user.is_authenticated else None
+        self.entries = []
+        self.balances = {}
+
+    def record(self, action, item, department_id, quantity):
+        """
+        Record `quantity` more (or, negative, less) of `item` held by the
+        department. Call before the item's remaining_quantity is changed.
+        """
+        balance = self.balances.get(item.pk, item.remaining_quantity) - quantity
+        self.balances[item.pk] = balance
+        self.entries.append(AllocationEntry(
+            cdsr_id=item.pk,
+            department_id=department_id,
+            action=action,
+            quantity=quantity,
+            balance=balance,
+            user=self.user,
+        ))
+
+    def save(self):
+        AllocationEntry.objects.bulk_create(self.entries)
+
+
+def history_range(since, until):
+    """
+    [since, until) datetimes for the YYYY-MM-DD dates `since` and `until`,
+    both included; None for a date that is missing or invalid.
+    """
+    def start_of(value, days=0):
+        try:
+            day = parse_date(value or "")
+        except ValueError:
+            day = None
+        if day is None:
+            return None
+        return timezone.make_aware(datetime.combine(day + timedelta(days=days), time.min))
+
+    return start_of(since), start_of(until, days=1)
+
+
+def timeline(queryset, since=None, until=None):
+    """Entries of `queryset` newest first, limited to [since, until)."""
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(created_at__lt=until)
+    return queryset.order_by("-created_at", "-entry_id")
+
+
+def item_timeline(cdsr_id, since=None, until=None):
+    return timeline(AllocationEntry.objects.filter(cdsr_id=cdsr_id), since, until)
+
+
+def department_timeline(department_id, since=None, until=None):
+    return timeline(AllocationEntry.objects.filter(department_id=department_id), since, until)
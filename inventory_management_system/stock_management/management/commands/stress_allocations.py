@@ -0,0 +1,184 @@
+"""
+Stress test of stock_management.allocation under concurrent use.
+
+The command creates --items CDSR items and a few departments, then starts
+--workers threads that each run --operations random allocations,
+reallocations and deallocations against those same items at once. Refused
+requests (AllocationError) are expected; database lock errors, deadlocks
+and SQLite's "database is locked", are retried. Afterwards every item must
+still balance: remaining_quantity not below zero, remaining plus
+everything allocated equal to product_quantity, and the item's ledger
+adding up to what is allocated and ending on its remaining quantity. The
+items, their allocations and ledger entries, and the departments and
+register it created are deleted again; the items go through CDSR.delete()
+so the register counters are given back.
+
+    python manage.py stress_allocations
+    python manage.py stress_allocations --items 2 --workers 16 --operations 200
+"""
+import random
+import threading
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+
+from accounts.models import Department
+from inventory.models import CDSR, DDSR, AllocationEntry
+from register_management.models import Register
+from stock_management.allocation import AllocationError, allocate, deallocate
+
+DEPARTMENT_NAMES = ["Stress Test A", "Stress Test B", "Stress Test C"]
+REGISTER_NAME = "Stress Test Register"
+MAX_RETRIES = 50
+
+
+def seed_items(count, quantity):
+    """Insert `count` unallocated CDSR items of `quantity` units each."""
+    return [
+        CDSR.objects.create(
+            cdsr_name=REGISTER_NAME,
+            cdsr_no=number,
+            cdsr_pg_no=1,
+            date_of_purchase=date(2025, 1, 1),
+            product_category="Stress Test",
+            product_description=f"Stress test item {number}",
+            product_quantity=quantity,
+            remaining_quantity=quantity,
+            single_cost=100,
+            total_cost=quantity * 100,
+            purchase_year="2025",
+        )
+        for number in range(count)
+    ]
+
+
+def random_operation(rng, item_ids, department_ids):
+    """A callable making one random change to one of the items."""
+    cdsr_id = rng.choice(item_ids)
+    allocations = list(
+        DDSR.objects.filter(cdsr_id=cdsr_id).values_list("ddsr_id", "accepted_product_quantity")
+    )
+    kind = rng.choice(["allocate", "allocate", "reallocate", "deallocate"]) if allocations else "allocate"
+    lines = [(rng.choice(department_ids), rng.randint(1, 5), None, None)]
+    if kind == "allocate":
+        return lambda: allocate(cdsr_id, lines)
+    ddsr_id, allocated = rng.choice(allocations)
+    # Deliberately sometimes more than is allocated, to exercise refusals
+    quantity = rng.randint(1, allocated + 1)
+    if kind == "reallocate":
+        lines = [(rng.choice(department_ids), quantity, None, None)]
+        return lambda: allocate(cdsr_id, lines, reallocate_from={ddsr_id: quantity})
+    return lambda: deallocate({ddsr_id: quantity}, cdsr_id=cdsr_id)
+
+
+def imbalances(item_ids):
+    """Description of every item whose stock no longer adds up."""
+    allocated = dict(
+        DDSR.objects.filter(cdsr_id__in=item_ids)
+        .values_list("cdsr_id")
+        .annotate(total=Sum("accepted_product_quantity"))
+    )
+    ledger = dict(
+        AllocationEntry.objects.filter(cdsr_id__in=item_ids)
+        .values_list("cdsr_id")
+        .annotate(total=Sum("quantity"))
+    )
+    problems = []
+    for item in CDSR.objects.filter(pk__in=item_ids).order_by("pk"):
+        total = allocated.get(item.pk, 0)
+        if item.remaining_quantity < 0 or item.remaining_quantity + total != item.product_quantity:
+            problems.append(
+                f"{item.product_description}: {item.remaining_quantity} remaining + {total} allocated "
+                f"!= {item.product_quantity}"
+            )
+        last = item.ledger.order_by("-entry_id").values_list("balance", flat=True).first()
+        if ledger.get(item.pk, 0) != total or last not in (None, item.remaining_quantity):
+            problems.append(
+                f"{item.product_description}: ledger records {ledger.get(item.pk, 0)} allocated "
+                f"ending on {last} remaining"
+            )
+    return problems
+
+
+class Command(BaseCommand):
+    help = "Run parallel allocations against the same items and check stock is conserved."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=3,
+                            help="Items the workers compete for.")
+        parser.add_argument("--quantity", type=int, default=50,
+                            help="Units of each item.")
+        parser.add_argument("--workers", type=int, default=8,
+                            help="Concurrent threads.")
+        parser.add_argument("--operations", type=int, default=100,
+                            help="Operations per thread.")
+        parser.add_argument("--seed", type=int, default=None,
+                            help="Random seed, for a repeatable mix of operations.")
+
+    def handle(self, *args, **options):
+        departments = [Department.objects.get_or_create(name=name) for name in DEPARTMENT_NAMES]
+        department_ids = [department.pk for department, _ in departments]
+        register_existed = Register.objects.filter(name=REGISTER_NAME).exists()
+        item_ids = [item.pk for item in seed_items(options["items"], options["quantity"])]
+        counts = {"applied": 0, "refused": 0, "retried": 0, "failed": 0}
+        counts_lock = threading.Lock()
+
+        def count(outcome):
+            with counts_lock:
+                counts[outcome] += 1
+
+        def worker(seed):
+            rng = random.Random(seed)
+            try:
+                for _ in range(options["operations"]):
+                    for attempt in range(MAX_RETRIES):
+                        try:
+                            random_operation(rng, item_ids, department_ids)()
+                            count("applied")
+                        except AllocationError:
+                            count("refused")
+                        except OperationalError:
+                            count("retried")
+                            time.sleep(rng.uniform(0, 0.005 * (attempt + 1)))
+                            continue
+                        break
+                    else:
+                        count("failed")
+            finally:
+                connection.close()
+
+        seed = options["seed"] if options["seed"] is not None else random.randrange(2**32)
+        threads = [threading.Thread(target=worker, args=(seed + number,)) for number in range(options["workers"])]
+        started = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+            problems = imbalances(item_ids)
+        finally:
+            DDSR.objects.filter(cdsr_id__in=item_ids).delete()
+            AllocationEntry.objects.filter(cdsr_id__in=item_ids).delete()
+            for item in CDSR.objects.filter(pk__in=item_ids):
+                item.delete()
+            if not register_existed:
+                Register.objects.filter(name=REGISTER_NAME).delete()
+            for department, created in departments:
+                if created:
+                    department.delete()
+
+        self.stdout.write(
+            f"{options['workers']} workers x {options['operations']} operations on {len(item_ids)} items "
+            f"in {elapsed:.2f}s (seed {seed})"
+        )
+        self.stdout.write(
+            f"applied {counts['applied']}, refused {counts['refused']}, "
+            f"retried {counts['retried']}, gave up {counts['failed']}"
+        )
+        if problems:
+            raise CommandError("Stock not conserved:\n" + "\n".join(problems))
+        self.stdout.write(self.style.SUCCESS("Stock conserved on every item."))
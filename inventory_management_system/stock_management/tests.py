@@ -1,3 +1,412 @@
-from django.test import TestCase
+from datetime import date
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Department
+from inventory.models import CDSR, DDSR, AllocationEntry
+from register_management.models import Register
+
+from .ledger import department_timeline, item_timeline
+
+
+def create_item(description, quantity=10, remaining_quantity=10):
+    return CDSR.objects.create(
+        cdsr_name="C/S DSR/CC",
+        date_of_purchase=date(2025, 1, 10),
+        product_category="Computer",
+        product_description=description,
+        product_quantity=quantity,
+        remaining_quantity=remaining_quantity,
+        single_cost=100,
+        total_cost=quantity * 100,
+        purchase_year="2025",
+    )
+
+
+def allocate(item, department_name, quantity):
+    return DDSR.objects.create(
+        cdsr=item,
+        date_of_receive=date(2025, 2, 1),
+        department=Department.objects.get_or_create(name=department_name)[0],
+        accepted_product_quantity=quantity,
+        total_cost=quantity * item.single_cost,
+    )
+
+
+class AllocationListTests(TestCase):
+    def setUp(self):
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+        self.url = reverse("stock_management:cdsr_allocation_list")
+
+        self.full = create_item("Projector", quantity=5, remaining_quantity=0)
+        allocate(self.full, "Physics", 3)
+        allocate(self.full, "Chemistry", 2)
+        self.partial = create_item("Laptop")
+        allocate(self.partial, "Library", 4)
+        self.free = create_item("Printer")
+
+    def test_page_shows_allocation_summaries(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        items = {item.cdsr_id: item for item in response.context["cdsr_items"]}
+        self.assertEqual(items[self.full.cdsr_id].allocated_departments, "Chemistry (2), Physics (3)")
+        self.assertTrue(items[self.full.cdsr_id].is_fully_allocated)
+        self.assertTrue(items[self.partial.cdsr_id].has_allocations)
+        self.assertFalse(items[self.free.cdsr_id].has_allocations)
+        self.assertContains(response, "Not Allocated")
+
+        numbered = self.client.get(self.url, {"page": "1"})
+        self.assertContains(numbered, "Chemistry (2), Physics (3)")
+
+    def test_allocated_filter(self):
+        allocated = self.client.get(self.url, {"allocated_filter": "allocated"})
+        unallocated = self.client.get(self.url, {"allocated_filter": "unallocated"})
+
+        self.assertEqual([item.cdsr_id for item in allocated.context["cdsr_items"]], [self.full.cdsr_id])
+        self.assertEqual(
+            [item.cdsr_id for item in unallocated.context["cdsr_items"]],
+            [self.partial.cdsr_id, self.free.cdsr_id],
+        )
+
+    def test_search_box(self):
+        response = self.client.get(self.url, {"q": "laptop"})
+
+        self.assertEqual([item.cdsr_id for item in response.context["cdsr_items"]], [self.partial.cdsr_id])
+        self.assertEqual(response.context["cdsr_items"][0].allocated_departments, "Library (4)")
+
+    def test_summaries_take_one_query_per_page(self):
+        for index in range(20):
+            allocate(create_item(f"Chair {index}"), "Library", 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        ddsr_queries = [query for query in queries if "inventory_ddsr" in query["sql"]]
+        self.assertEqual(len(ddsr_queries), 1)
+
+
+class BulkAllocateTests(TestCase):
+    def setUp(self):
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+        self.library = Department.objects.get_or_create(name="Library")[0]
+
+    def post(self, items, quantity):
+        return self.client.post(reverse("stock_management:bulk_allocate"), {
+            "department": self.library.department_id,
+            "selected_items": [item.cdsr_id for item in items],
+            "accepted_product_quantity": [quantity] * len(items),
+            "ddsr_no": ["7"] * len(items),
+            "ddsr_pg_no": ["3"] * len(items),
+        })
+
+    def test_items_are_allocated_and_failures_reported_per_item(self):
+        fresh = create_item("Laptop")
+        reallocated = create_item("Projector", quantity=5, remaining_quantity=2)
+        allocate(reallocated, "Physics", 3)
+        short = create_item("Printer", quantity=4, remaining_quantity=4)
+
+        response = self.post([fresh, reallocated, short], 5)
+
+        messages = [str(message) for message in response.wsgi_request._messages]
+        self.assertEqual(messages, [
+            "Cannot allocate 5 units for Printer. Only 4 available.",
+            "2 selected item(s) allocated to Library successfully.",
+        ])
+        fresh.refresh_from_db()
+        reallocated.refresh_from_db()
+        short.refresh_from_db()
+        self.assertEqual((fresh.remaining_quantity, reallocated.remaining_quantity, short.remaining_quantity), (5, 0, 4))
+        self.assertEqual(
+            list(reallocated.allocations.values_list("department__name", "accepted_product_quantity", "ddsr_no")),
+            [("Library", 5, 7)],
+        )
+        self.assertFalse(short.allocations.exists())
+
+    def test_query_count_does_not_grow_with_the_selection(self):
+        def allocation_queries(count):
+            items = [create_item(f"Chair {index}") for index in range(count)]
+            for item in items[::2]:
+                allocate(item, "Physics", 1)
+            Department.choices()
+            with CaptureQueriesContext(connection) as queries:
+                self.post(items, 2)
+            return len(queries)
+
+        self.assertEqual(allocation_queries(3), allocation_queries(30))
+        self.assertEqual(DDSR.objects.filter(department=self.library).count(), 33)
+
+
+class AllocationServiceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+        self.item = create_item("Laptop", quantity=10, remaining_quantity=6)
+        self.physics = allocate(self.item, "Physics", 3)
+        self.chemistry = allocate(self.item, "Chemistry", 1)
+        self.library = Department.objects.get_or_create(name="Library")[0]
+
+    def messages(self, response):
+        return [str(message) for message in response.wsgi_request._messages]
+
+    def test_allocation_takes_stock_from_remaining(self):
+        response = self.client.post(reverse("stock_management:allocate_form", args=[self.item.cdsr_id]), {
+            "allocation_type": "new",
+            "departments[]": [self.library.department_id],
+            "ddsr_nos[]": ["4"],
+            "ddsr_pg_nos[]": ["2"],
+            "quantities[]": ["5"],
+        })
+
+        self.assertRedirects(response, reverse("stock_management:cdsr_allocation_list"), fetch_redirect_response=False)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.remaining_quantity, 1)
+        self.assertEqual(
+            list(self.item.allocations.order_by("ddsr_id").values_list("department__name", "accepted_product_quantity")),
+            [("Physics", 3), ("Chemistry", 1), ("Library", 5)],
+        )
+
+    def test_refused_reallocation_changes_nothing(self):
+        response = self.client.post(reverse("stock_management:allocate_form", args=[self.item.cdsr_id]), {
+            "allocation_type": "reallocation",
+            "reallocation_from": [self.physics.ddsr_id],
+            f"reallocation_quantity_{self.physics.ddsr_id}": "2",
+            "departments[]": [self.library.department_id],
+            "ddsr_nos[]": [""],
+            "ddsr_pg_nos[]": [""],
+            "quantities[]": ["3"],
+        })
+
+        self.assertRedirects(
+            response, reverse("stock_management:allocate_form", args=[self.item.cdsr_id]),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(self.messages(response), ["Cannot reallocate more than the selected quantities."])
+        self.physics.refresh_from_db()
+        self.item.refresh_from_db()
+        self.assertEqual((self.physics.accepted_product_quantity, self.item.remaining_quantity), (3, 6))
+
+    def test_deallocation_is_all_or_nothing(self):
+        response = self.client.post(reverse("stock_management:bulk_deallocate"), {
+            f"deallocation_quantity_{self.physics.ddsr_id}": "3",
+            f"deallocation_quantity_{self.chemistry.ddsr_id}": "2",
+        })
+        self.assertEqual(self.messages(response), ["Cannot deallocate more than allocated quantity from Chemistry"])
+        self.assertEqual(self.item.allocations.count(), 2)
+
+        self.client.post(reverse("stock_management:bulk_deallocate"), {
+            f"deallocation_quantity_{self.physics.ddsr_id}": "3",
+            f"deallocation_quantity_{self.chemistry.ddsr_id}": "1",
+        })
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.remaining_quantity, 10)
+        self.assertFalse(self.item.allocations.exists())
+
+
+
+class BulkDeallocateTests(TestCase):
+    def setUp(self):
+        admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(admin)
+
+    def allocated_items(self, count):
+        """Items of 10 units with 4 allocated to Physics and 2 to Library."""
+        items, allocations = [], []
+        for index in range(count):
+            item = create_item(f"Chair {index}", remaining_quantity=4)
+            items.append(item)
+            allocations.append((allocate(item, "Physics", 4), allocate(item, "Library", 2)))
+        return items, allocations
+
+    def test_confirm_page_lists_allocations_of_the_selected_items(self):
+        (item, unselected), _ = self.allocated_items(2)
+        bare = create_item("Printer")
+
+        response = self.client.post(reverse("stock_management:bulk_deallocate_confirm"), {
+            "selected_items": [item.cdsr_id, bare.cdsr_id],
+        })
+
+        entries = response.context["items_with_allocations"]
+        self.assertEqual([entry["cdsr_item"] for entry in entries], [item])
+        self.assertEqual(
+            [(allocation.department.name, allocation.accepted_product_quantity) for allocation in entries[0]["allocations"]],
+            [("Physics", 4), ("Library", 2)],
+        )
+
+    def test_deallocations_are_applied_together(self):
+        items, allocations = self.allocated_items(2)
+
+        self.client.post(reverse("stock_management:bulk_deallocate"), {
+            f"deallocation_quantity_{allocations[0][0].ddsr_id}": "4",
+            f"deallocation_quantity_{allocations[0][1].ddsr_id}": "1",
+            f"deallocation_quantity_{allocations[1][1].ddsr_id}": "2",
+        })
+
+        for item in items:
+            item.refresh_from_db()
+        self.assertEqual([item.remaining_quantity for item in items], [9, 6])
+        self.assertEqual(
+            list(DDSR.objects.order_by("ddsr_id").values_list("cdsr_id", "accepted_product_quantity", "total_cost")),
+            [(items[0].cdsr_id, 1, 100), (items[1].cdsr_id, 4, 400)],
+        )
+
+    def test_query_counts_do_not_grow_with_the_selection(self):
+        def deallocation_queries(count):
+            items, allocations = self.allocated_items(count)
+            with CaptureQueriesContext(connection) as confirm:
+                self.client.post(reverse("stock_management:bulk_deallocate_confirm"), {
+                    "selected_items": [item.cdsr_id for item in items],
+                })
+            confirm_queries = len(confirm)
+            posted = {}
+            for physics, library in allocations:
+                posted[f"deallocation_quantity_{physics.ddsr_id}"] = "4"
+                posted[f"deallocation_quantity_{library.ddsr_id}"] = "1"
+            with CaptureQueriesContext(connection) as apply:
+                self.client.post(reverse("stock_management:bulk_deallocate"), posted)
+            return confirm_queries, len(apply)
+
+        self.assertEqual(deallocation_queries(3), deallocation_queries(30))
+        self.assertFalse(CDSR.objects.exclude(remaining_quantity=9).exists())
+
+
+
+class AllocationLedgerTests(TestCase):
+    def setUp(self):
+        self.admin = get_user_model().objects.create_user(
+            email="admin@example.com", password="secret", role="admin"
+        )
+        self.client.force_login(self.admin)
+        self.item = create_item("Laptop")
+        self.library = Department.objects.get_or_create(name="Library")[0]
+        self.physics = Department.objects.get_or_create(name="Physics")[0]
+
+    def allocate_form(self, department, quantity, **extra):
+        return self.client.post(reverse("stock_management:allocate_form", args=[self.item.cdsr_id]), {
+            "allocation_type": "new",
+            "departments[]": [department.department_id],
+            "ddsr_nos[]": [""],
+            "ddsr_pg_nos[]": [""],
+            "quantities[]": [str(quantity)],
+            **extra,
+        })
+
+    def test_every_change_is_recorded_with_a_running_balance(self):
+        self.allocate_form(self.library, 5)
+        library = self.item.allocations.get()
+        self.allocate_form(self.physics, 3, **{
+            "allocation_type": "reallocation",
+            "reallocation_from": [library.ddsr_id],
+            f"reallocation_quantity_{library.ddsr_id}": "3",
+        })
+        physics = self.item.allocations.get(department=self.physics)
+        self.client.post(reverse("stock_management:bulk_deallocate"), {
+            f"deallocation_quantity_{physics.ddsr_id}": "1",
+        })
+
+        self.assertEqual(
+            list(item_timeline(self.item.cdsr_id).values_list("action", "department__name", "quantity", "balance")),
+            [
+                ("deallocate", "Physics", -1, 6),
+                ("transfer", "Physics", 3, 5),
+                ("transfer", "Library", -3, 8),
+                ("allocate", "Library", 5, 5),
+            ],
+        )
+        self.assertEqual(
+            list(department_timeline(self.library.department_id).values_list("quantity", flat=True)), [-3, 5]
+        )
+        self.assertFalse(AllocationEntry.objects.exclude(user=self.admin).exists())
+
+    def test_bulk_allocation_records_the_replaced_allocation(self):
+        allocate(self.item, "Physics", 4)
+        CDSR.objects.filter(pk=self.item.pk).update(remaining_quantity=6)
+
+        self.client.post(reverse("stock_management:bulk_allocate"), {
+            "department": self.library.department_id,
+            "selected_items": [self.item.cdsr_id],
+            "accepted_product_quantity": ["7"],
+            "ddsr_no": [""],
+            "ddsr_pg_no": [""],
+        })
+
+        self.assertEqual(
+            list(item_timeline(self.item.cdsr_id).values_list("action", "department__name", "quantity", "balance")),
+            [("reallocate", "Library", 7, 3), ("reallocate", "Physics", -4, 10)],
+        )
+
+    def test_history_pages_read_the_ledger_by_item_and_department(self):
+        other = create_item("Projector")
+        self.allocate_form(self.library, 5)
+        self.client.post(reverse("stock_management:bulk_allocate"), {
+            "department": self.physics.department_id,
+            "selected_items": [other.cdsr_id],
+            "accepted_product_quantity": ["2"],
+            "ddsr_no": [""],
+            "ddsr_pg_no": [""],
+        })
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("stock_management:item_history", args=[self.item.cdsr_id]))
+        entries = response.context["entries"]
+        self.assertEqual([(entry.department.name, entry.quantity) for entry in entries], [("Library", 5)])
+        self.assertFalse([query for query in queries if '"inventory_ddsr"' in query["sql"]])
+
+        response = self.client.get(reverse("stock_management:department_history", args=[self.physics.department_id]))
+        self.assertEqual([entry.cdsr_id for entry in response.context["entries"]], [other.cdsr_id])
+        self.assertContains(response, "Projector")
+
+        today = timezone.localdate(AllocationEntry.objects.latest("created_at").created_at)
+        before = {"until": str(today.replace(year=today.year - 1))}
+        response = self.client.get(reverse("stock_management:item_history", args=[self.item.cdsr_id]), before)
+        self.assertEqual(list(response.context["entries"]), [])
+        response = self.client.get(reverse("stock_management:item_history", args=[self.item.cdsr_id]), {"since": str(today)})
+        self.assertEqual(len(response.context["entries"]), 1)
+        self.assertEqual(
+            self.client.get(reverse("stock_management:department_history", args=[999])).status_code, 404
+        )
+
+    def test_entries_cannot_be_changed_or_deleted(self):
+        self.allocate_form(self.library, 5)
+        entry = AllocationEntry.objects.get()
+
+        entry.quantity = 50
+        with self.assertRaises(ValueError):
+            entry.save()
+        with self.assertRaises(ValueError):
+            entry.delete()
+
+
+class AllocationStressTests(TransactionTestCase):
+    def test_parallel_allocations_conserve_stock(self):
+        output = StringIO()
+        call_command("stress_allocations", items=2, workers=4, operations=15, seed=1, stdout=output)
+
+        self.assertIn("Stock conserved on every item.", output.getvalue())
+        self.assertFalse(CDSR.objects.exists())
+        self.assertFalse(Register.objects.exists())
+
+    def test_cleanup_gives_back_the_counters_of_an_existing_register(self):
+        Register.objects.create(name="Stress Test Register")
+        call_command("stress_allocations", items=2, workers=2, operations=5, seed=1, stdout=StringIO())
+
+        register = Register.objects.get()
+        self.assertEqual((register.item_count, register.total_value), (0, 0))
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import cdsr_allocation_list , allocate_form , bulk_allocate_confirm , bulk_allocate, deallocate_form, bulk_deallocate, bulk_deallocate_confirm 
+from .views import cdsr_allocation_list , allocate_form , bulk_allocate_confirm , bulk_allocate, deallocate_form, bulk_deallocate, bulk_deallocate_confirm, item_history, department_history
 
 app_name = 'stock_management'
 
@@ -11,4 +11,6 @@ urlpatterns = [
     path('deallocate/<int:cdsr_id>/', deallocate_form, name='deallocate_form'),
     path('bulk-deallocate/', bulk_deallocate, name='bulk_deallocate'),
     path('bulk-deallocate/confirm/', bulk_deallocate_confirm, name='bulk_deallocate_confirm'),
+    path("allocation/<int:cdsr_id>/history/", item_history, name="item_history"),
+    path("allocation/department/<int:department_id>/history/", department_history, name="department_history"),
 ]
\ No newline at end of file
@@ -1,15 +1,24 @@
 from django.shortcuts import render , get_object_or_404 , redirect
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, OuterRef, Subquery, Case, When, Value, BooleanField, Exists, Func, CharField , F
 from inventory.decorators import role_required
 from inventory.models import CDSR, DDSR
+from inventory.keyset import paginate
+from inventory.list_table import list_query
+from inventory.search import search
+from inventory.filter_spec import CDSR_FILTERS
+from .allocation import AllocationError, allocate, allocate_in_bulk, deallocate
+from .allocation_summary import attach_allocation_summaries
+from .ledger import department_timeline, history_range, item_timeline
+from accounts.models import Department
 from django.http import HttpResponseRedirect
 from django.urls import reverse
-from django.core.paginator import Paginator
-from django.utils.timezone import now
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.http import Http404
 # Create your views here.
 
+HISTORY_PAGE_SIZE = 25
+
 def redirect_with_no_cache(url_name, *args, **kwargs):
     """
     Utility function to redirect with cache control headers to prevent browser back button
@@ -23,19 +32,6 @@ def redirect_with_no_cache(url_name, *args, **kwargs):
     response['Clear-Site-Data'] = '"cache", "cookies", "storage"'
     return response
 
-from django.db.models import Value, F, CharField
-from django.db.models.functions import Concat
-
-class GroupConcat(Func):
-    function = 'GROUP_CONCAT'
-    template = "%(function)s(%(distinct)s%(expressions)s SEPARATOR %(separator)s)"
-    output_field = CharField()
-
-    def __init__(self, expression, distinct=False, separator=', ', **extra):
-        super().__init__(expression, **extra)
-        self.extra['distinct'] = 'DISTINCT ' if distinct else ''
-        self.extra['separator'] = f"'{separator}'"
-
 @login_required
 @role_required(allowed_roles=['admin'])
 def cdsr_allocation_list(request):
@@ -43,58 +39,38 @@ def cdsr_allocation_list(request):
     filter_fields = request.GET.getlist("filter_field")
     filter_values = request.GET.getlist("filter_value")
 
-    # Initial QuerySet: Start with CDSR filtering and annotations
-    filter_queries = Q()
-    for field, value in zip(filter_fields, filter_values):
-        if field and value:
-            filter_queries &= Q(**{f"{field}__icontains": value})
+    # Initial QuerySet: Start with CDSR filtering
+    filter_queries, filter_errors = CDSR_FILTERS.filters(filter_fields, filter_values)
+    for error in filter_errors:
+        messages.error(request, error)
 
-    # Efficient query without select_related (since there's no ForeignKey relationship)
     cdsr_items = CDSR.objects.filter(filter_queries)
 
-    # Add annotations for 'is_fully_allocated' and 'allocated_departments'
-    cdsr_items = cdsr_items.annotate(
-    is_fully_allocated=Case(
-        When(remaining_quantity=0, then=Value(True)),
-        default=Value(False),
-        output_field=BooleanField(),
-    ),
-    allocated_departments=Subquery(
-        DDSR.objects.filter(cdsr_table_id=OuterRef('cdsr_id'))
-        .values('cdsr_table_id')
-        .annotate(
-            departments=GroupConcat(
-                Concat(F('department'), Value(' ('), F('accepted_product_quantity'), Value(')')),
-                distinct=True,
-                separator=', '
-            )
-        )
-        .values('departments')[:1]
-    ),
-    has_allocations=Exists(
-        DDSR.objects.filter(cdsr_table_id=OuterRef('cdsr_id'))
-    ),
-    )   
-    
-    # Handle the allocation filter condition (allocated/unallocated)
+    # Handle the allocation filter condition (allocated/unallocated) on the
+    # indexed remaining_quantity column
     allocated_filter = request.GET.get("allocated_filter")
     if allocated_filter == "allocated":
-        cdsr_items = cdsr_items.filter(is_fully_allocated=True)
+        cdsr_items = cdsr_items.filter(remaining_quantity=0)
     elif allocated_filter == "unallocated":
-        cdsr_items = cdsr_items.filter(is_fully_allocated=False)
+        cdsr_items = cdsr_items.exclude(remaining_quantity=0)
 
-    # Pagination: Apply pagination after filtering and annotating
-    paginator = Paginator(cdsr_items, 50)
-    page_number = request.GET.get("page")
-    cdsr_item_list = paginator.get_page(page_number)
+    # Search box across description, category, supplier, register and authority
+    query = request.GET.get("q", "").strip()
+    order_by = "cdsr_id"
+    if query:
+        cdsr_items = search(cdsr_items, query)
+        order_by = "-search_rank"
+
+    # Pagination first, then the allocation summaries for this page only
+    cdsr_item_list = attach_allocation_summaries(paginate(request, cdsr_items, order_by))
 
     # Pass the necessary context to the template
     return render(request, "stock_management/allocation_list.html", {
         "cdsr_items": cdsr_item_list,
-        "fields": [field.name for field in CDSR._meta.fields],  # Get all column names
-        "filter_fields": filter_fields,
-        "filter_values": filter_values,
+        "fields": CDSR.display_fields(),  # Get all column names
+        "list_query": list_query(request),
         "allocated_filter": allocated_filter,
+        "query": query,
     })
 
 
@@ -102,86 +78,57 @@ def cdsr_allocation_list(request):
 @role_required(allowed_roles=['admin'])
 def allocate_form(request, cdsr_id):
     cdsr_item = get_object_or_404(CDSR, cdsr_id=cdsr_id)
-    existing_allocations = DDSR.objects.filter(cdsr_table_id=cdsr_id)
-    total_allocated = sum(alloc.accepted_product_quantity for alloc in existing_allocations)
-    true_remaining = cdsr_item.product_quantity - total_allocated
 
     if request.method == "POST":
         departments = request.POST.getlist("departments[]")
-        ddsr_nos = request.POST.getlist("ddsr_nos[]")
-        ddsr_pg_nos = request.POST.getlist("ddsr_pg_nos[]")
-        quantities = [int(qty) for qty in request.POST.getlist("quantities[]")]
         allocation_type = request.POST.get("allocation_type")
-        reallocation_from = request.POST.getlist("reallocation_from")
 
-        total_quantity = sum(quantities)
+        names = Department.names()
+        if not all(Department.name_for(department, names) for department in departments):
+            messages.error(request, "Please select a valid department for every allocation.")
+            return redirect_with_no_cache("stock_management:allocate_form", cdsr_id=cdsr_id)
 
-        if allocation_type == "new" and total_quantity > true_remaining:
-            messages.error(request, "Cannot allocate more than available remaining quantity.")
+        try:
+            lines = [
+                (department, int(quantity), int(ddsr_no) if ddsr_no else None, int(ddsr_pg_no) if ddsr_pg_no else None)
+                for department, ddsr_no, ddsr_pg_no, quantity in zip(
+                    departments,
+                    request.POST.getlist("ddsr_nos[]"),
+                    request.POST.getlist("ddsr_pg_nos[]"),
+                    request.POST.getlist("quantities[]"),
+                )
+            ]
+            reallocate_from = None
+            if allocation_type == "reallocation":
+                reallocate_from = {}
+                for alloc_id in request.POST.getlist("reallocation_from"):
+                    realloc_qty = int(request.POST.get(f"reallocation_quantity_{alloc_id}") or 0)
+                    if realloc_qty > 0:
+                        reallocate_from[int(alloc_id)] = realloc_qty
+        except ValueError:
+            messages.error(request, "Please enter whole numbers for every quantity and DDSR number.")
+            return redirect_with_no_cache("stock_management:allocate_form", cdsr_id=cdsr_id)
+
+        # Locks the item and checks the stock inside one transaction
+        try:
+            allocate(cdsr_id, lines, reallocate_from, user=request.user)
+        except AllocationError as error:
+            for message in error.args:
+                messages.error(request, message)
             return redirect_with_no_cache("stock_management:allocate_form", cdsr_id=cdsr_id)
-        
-        elif allocation_type == "reallocation":
-            total_reallocated = 0
-            for alloc_id in reallocation_from:
-                realloc_qty = int(request.POST.get(f"reallocation_quantity_{alloc_id}", 0))
-                if realloc_qty > 0:
-                    existing_alloc = DDSR.objects.get(ddsr_id=alloc_id)
-                    
-                    if realloc_qty > existing_alloc.accepted_product_quantity:
-                        messages.error(request, f"Cannot reallocate more than allocated quantity from {existing_alloc.department}")
-                        return redirect_with_no_cache("inventory:allocate_form", cdsr_id=cdsr_id)
-                    
-                    total_reallocated += realloc_qty
-                    
-                    if realloc_qty < existing_alloc.accepted_product_quantity:
-                        existing_alloc.accepted_product_quantity -= realloc_qty
-                        existing_alloc.total_cost = existing_alloc.accepted_product_quantity * existing_alloc.cost_unit
-                        existing_alloc.save()
-                    else:
-                        existing_alloc.delete()
-
-            if total_quantity > total_reallocated:
-                messages.error(request, "Cannot reallocate more than the selected quantities.")
-                return redirect_with_no_cache("inventory:allocate_form", cdsr_id=cdsr_id)
-            
-            cdsr_item.remaining_quantity += total_reallocated
-
-        for department, ddsr_no, ddsr_pg_no, quantity in zip(departments, ddsr_nos, ddsr_pg_nos, quantities):
-            DDSR.objects.create(
-                cdsr_name=cdsr_item.cdsr_name,
-                cdsr_no=cdsr_item.cdsr_no,
-                cdsr_page_no=cdsr_item.cdsr_pg_no,
-                cdsr_table_id=cdsr_item.cdsr_id,
-                cost_unit=cdsr_item.single_cost,
-                date_of_receive=now(),
-                ddsr_no=ddsr_no,
-                ddsr_pg_no=ddsr_pg_no,
-                department=department,
-                product_quantity=cdsr_item.product_quantity,
-                product_category=cdsr_item.product_category,
-                product_description=cdsr_item.product_description,
-                product_type=cdsr_item.product_type,
-                accepted_product_quantity=quantity,
-                supplier_name=cdsr_item.supplier,
-                total_cost=quantity * cdsr_item.single_cost,
-                year_of_buy=cdsr_item.purchase_year
-            )
-
-        if allocation_type == "new":
-            cdsr_item.remaining_quantity -= total_quantity
-        else:  # reallocation
-            cdsr_item.remaining_quantity = (cdsr_item.remaining_quantity - total_quantity)
-        
-        cdsr_item.save()
 
         messages.success(request, "CDSR item allocated successfully to multiple departments.")
         return redirect_with_no_cache("stock_management:cdsr_allocation_list")
 
+    existing_allocations = cdsr_item.allocations.select_related('department')
+    total_allocated = sum(alloc.accepted_product_quantity for alloc in existing_allocations)
+    true_remaining = cdsr_item.product_quantity - total_allocated
     context = {
         "cdsr_item": cdsr_item,
         "existing_allocations": existing_allocations,
         "true_remaining": true_remaining,
-        "total_allocated": total_allocated
+        "total_allocated": total_allocated,
+        "departments": Department.choices()
     }
     return render(request, "stock_management/allocate_form.html", context)
 
@@ -195,7 +142,10 @@ def bulk_allocate_confirm(request):
             return redirect("stock_management:cdsr_allocation_list")
 
         selected_items = CDSR.objects.filter(cdsr_id__in=selected_ids)
-        return render(request, "stock_management/bulk_allocate_confirm.html", {"selected_items": selected_items})
+        return render(request, "stock_management/bulk_allocate_confirm.html", {
+            "selected_items": selected_items,
+            "departments": Department.choices()
+        })
 
     return redirect("stock_management:cdsr_allocation_list")
 
@@ -205,7 +155,8 @@ def bulk_allocate_confirm(request):
 def bulk_allocate(request):
     if request.method == "POST":
         selected_ids = request.POST.getlist("selected_items")
-        department = request.POST.get("department")
+        department_id = request.POST.get("department")
+        department = Department.name_for(department_id)
         accepted_quantities = request.POST.getlist("accepted_product_quantity")
         ddsr_nos = request.POST.getlist("ddsr_no")
         ddsr_pg_nos = request.POST.getlist("ddsr_pg_no")
@@ -218,43 +169,25 @@ def bulk_allocate(request):
             messages.warning(request, "Please select a department.")
             return redirect_with_no_cache("stock_management:bulk_allocate_confirm")
 
-        for cdsr_id, quantity, ddsr_no, ddsr_pg_no in zip(selected_ids, accepted_quantities, ddsr_nos, ddsr_pg_nos):
-            cdsr_item = get_object_or_404(CDSR, cdsr_id=cdsr_id)
-            quantity = int(quantity)
+        try:
+            lines = [
+                (int(cdsr_id), int(quantity), int(ddsr_no) if ddsr_no else None, int(ddsr_pg_no) if ddsr_pg_no else None)
+                for cdsr_id, quantity, ddsr_no, ddsr_pg_no
+                in zip(selected_ids, accepted_quantities, ddsr_nos, ddsr_pg_nos)
+            ]
+        except ValueError:
+            messages.error(request, "Please enter whole numbers for every quantity and DDSR number.")
+            return redirect_with_no_cache("stock_management:cdsr_allocation_list")
 
-            existing_allocation = DDSR.objects.filter(cdsr_table_id=cdsr_id).first()
-            if existing_allocation:
-                cdsr_item.remaining_quantity += existing_allocation.accepted_product_quantity
-                existing_allocation.delete()
+        # One transaction for all items; each item reports its own outcome
+        results = allocate_in_bulk(department_id, lines, user=request.user)
+        for _, error in results:
+            if error:
+                messages.error(request, error)
 
-            if quantity > cdsr_item.remaining_quantity:
-                messages.error(request, f"Cannot allocate {quantity} units for {cdsr_item.product_description}. Only {cdsr_item.remaining_quantity} available.")
-                continue
-
-            DDSR.objects.create(
-                cdsr_name=cdsr_item.cdsr_name,
-                cdsr_no=cdsr_item.cdsr_no,
-                cdsr_page_no=cdsr_item.cdsr_pg_no,
-                cdsr_table_id=cdsr_item.cdsr_id,
-                cost_unit=cdsr_item.single_cost,
-                date_of_receive=now(),
-                ddsr_no=ddsr_no,
-                ddsr_pg_no=ddsr_pg_no,
-                department=department,
-                product_quantity=cdsr_item.product_quantity,
-                product_category=cdsr_item.product_category,
-                product_description=cdsr_item.product_description,
-                product_type=cdsr_item.product_type,
-                accepted_product_quantity=quantity,
-                supplier_name=cdsr_item.supplier,
-                total_cost=quantity * cdsr_item.single_cost,
-                year_of_buy=cdsr_item.purchase_year
-            )
-
-            cdsr_item.remaining_quantity -= quantity
-            cdsr_item.save()
-
-        messages.success(request, f"Selected items allocated to {department} successfully.")
+        allocated = sum(1 for _, error in results if error is None)
+        if allocated:
+            messages.success(request, f"{allocated} selected item(s) allocated to {department} successfully.")
         return redirect_with_no_cache("stock_management:cdsr_allocation_list")
 
     return redirect_with_no_cache("stock_management:cdsr_allocation_list")  
@@ -264,42 +197,35 @@ def bulk_allocate(request):
 @role_required(allowed_roles=['admin'])
 def deallocate_form(request, cdsr_id):
     cdsr_item = get_object_or_404(CDSR, cdsr_id=cdsr_id)
-    existing_allocations = DDSR.objects.filter(cdsr_table_id=cdsr_id)
-    total_allocated = sum(alloc.accepted_product_quantity for alloc in existing_allocations)
 
     if request.method == "POST":
         selected_allocations = request.POST.getlist("deallocate_from")
         dealloc_quantities = []
         
         for alloc_id in selected_allocations:
-            qty = int(request.POST.get(f"deallocation_quantity_{alloc_id}", 0))
-            if qty > 0:
-                dealloc_quantities.append((alloc_id, qty))
+            try:
+                qty = int(request.POST.get(f"deallocation_quantity_{alloc_id}") or 0)
+                if qty > 0:
+                    dealloc_quantities.append((int(alloc_id), qty))
+            except ValueError:
+                continue
 
         if not dealloc_quantities:
             messages.error(request, "Please select at least one allocation to deallocate.")
             return redirect_with_no_cache("stock_management:deallocate_form", cdsr_id=cdsr_id)
 
-        for alloc_id, qty in dealloc_quantities:
-            allocation = DDSR.objects.get(ddsr_id=alloc_id)
-            
-            if qty > allocation.accepted_product_quantity:
-                messages.error(request, f"Cannot deallocate more than allocated quantity from {allocation.department}")
-                continue
-
-            if qty == allocation.accepted_product_quantity:
-                allocation.delete()
-            else:
-                allocation.accepted_product_quantity -= qty
-                allocation.total_cost = allocation.accepted_product_quantity * allocation.cost_unit
-                allocation.save()
-
-            cdsr_item.remaining_quantity += qty
-            cdsr_item.save()
+        try:
+            deallocate(dict(dealloc_quantities), cdsr_id=cdsr_id, user=request.user)
+        except AllocationError as error:
+            for message in error.args:
+                messages.error(request, message)
+            return redirect_with_no_cache("stock_management:deallocate_form", cdsr_id=cdsr_id)
 
         messages.success(request, "Successfully deallocated selected quantities.")
         return redirect_with_no_cache("stock_management:cdsr_allocation_list")
 
+    existing_allocations = cdsr_item.allocations.select_related('department')
+    total_allocated = sum(alloc.accepted_product_quantity for alloc in existing_allocations)
     context = {
         "cdsr_item": cdsr_item,
         "existing_allocations": existing_allocations,
@@ -316,15 +242,19 @@ def bulk_deallocate_confirm(request):
             messages.warning(request, "No items selected for deallocation.")
             return redirect("stock_management:cdsr_allocation_list")
 
-        items_with_allocations = []
-        for cdsr_id in selected_ids:
-            cdsr_item = get_object_or_404(CDSR, cdsr_id=cdsr_id)
-            allocations = DDSR.objects.filter(cdsr_table_id=cdsr_id)
-            if allocations.exists():
-                items_with_allocations.append({
-                    'cdsr_item': cdsr_item,
-                    'allocations': allocations
-                })
+        # Two queries whatever the selection: the items, then all their allocations
+        selected_items = CDSR.objects.in_bulk(selected_ids)
+        allocations_by_item = {}
+        for allocation in (
+            DDSR.objects.filter(cdsr_id__in=selected_items).select_related('department').order_by('ddsr_id')
+        ):
+            allocations_by_item.setdefault(allocation.cdsr_id, []).append(allocation)
+
+        items_with_allocations = [
+            {'cdsr_item': cdsr_item, 'allocations': allocations_by_item[cdsr_item.cdsr_id]}
+            for cdsr_item in selected_items.values()
+            if cdsr_item.cdsr_id in allocations_by_item
+        ]
 
         if not items_with_allocations:
             messages.warning(request, "None of the selected items have any allocations.")
@@ -345,7 +275,7 @@ def bulk_deallocate(request):
         for key, value in request.POST.items():
             if key.startswith('deallocation_quantity_'):
                 try:
-                    alloc_id = key.split('_')[-1]
+                    alloc_id = int(key.split('_')[-1])
                     qty = int(value)
                     if qty > 0:
                         deallocations[alloc_id] = qty
@@ -356,30 +286,55 @@ def bulk_deallocate(request):
             messages.error(request, "No valid deallocations specified.")
             return redirect_with_no_cache("stock_management:cdsr_allocation_list")
 
-        for alloc_id, qty in deallocations.items():
-            try:
-                allocation = DDSR.objects.get(ddsr_id=alloc_id)
-                cdsr_item = CDSR.objects.get(cdsr_id=allocation.cdsr_table_id)
+        try:
+            deallocate(deallocations, user=request.user)
+        except AllocationError as error:
+            for message in error.args:
+                messages.error(request, message)
+            return redirect_with_no_cache("stock_management:cdsr_allocation_list")
 
-                if qty > allocation.accepted_product_quantity:
-                    messages.error(request, f"Cannot deallocate more than allocated quantity from {allocation.department} for {cdsr_item.cdsr_name}")
-                    continue
+        messages.success(request, "Successfully processed bulk deallocations.")
+        return redirect_with_no_cache("stock_management:cdsr_allocation_list")
 
-                if qty == allocation.accepted_product_quantity:
-                    allocation.delete()
-                else:
-                    allocation.accepted_product_quantity -= qty
-                    allocation.total_cost = allocation.accepted_product_quantity * allocation.cost_unit
-                    allocation.save()
+    return redirect_with_no_cache("stock_management:cdsr_allocation_list")
+
+
+def render_history(request, entries, title, **context):
+    """A page of ledger entries, optionally limited to ?since=&until= dates."""
+    since, until = history_range(request.GET.get("since"), request.GET.get("until"))
+    page = Paginator(
+        entries(since, until).select_related("cdsr", "department", "user"), HISTORY_PAGE_SIZE
+    ).get_page(request.GET.get("page"))
+    return render(request, "stock_management/allocation_history.html", {
+        "title": title,
+        "entries": page,
+        "since": request.GET.get("since", ""),
+        "until": request.GET.get("until", ""),
+        "list_query": list_query(request),
+        **context,
+    })
 
-                cdsr_item.remaining_quantity += qty
-                cdsr_item.save()
 
-            except (DDSR.DoesNotExist, CDSR.DoesNotExist):
-                messages.error(request, f"Error processing deallocation for allocation {alloc_id}")
-                continue
+@login_required
+@role_required(allowed_roles=['admin'])
+def item_history(request, cdsr_id):
+    cdsr_item = get_object_or_404(CDSR, cdsr_id=cdsr_id)
+    return render_history(
+        request,
+        lambda since, until: item_timeline(cdsr_id, since, until),
+        f"Allocation history of {cdsr_item.product_description}",
+        cdsr_item=cdsr_item,
+    )
 
-        messages.success(request, "Successfully processed bulk deallocations.")
-        return redirect_with_no_cache("stock_management:cdsr_allocation_list")
 
-    return redirect_with_no_cache("stock_management:cdsr_allocation_list")
\ No newline at end of file
+@login_required
+@role_required(allowed_roles=['admin'])
+def department_history(request, department_id):
+    name = Department.name_for(department_id)
+    if name is None:
+        raise Http404("No such department")
+    return render_history(
+        request,
+        lambda since, until: department_timeline(department_id, since, until),
+        f"Allocation history of {name}",
+    )